@@ -1,30 +1,63 @@
-from fastapi import FastAPI, HTTPException
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException
 from routes.user import user_router
 from routes.donation import donation_router
 from routes.donation_chat import donation_chat_router
 from fastapi.middleware.cors import CORSMiddleware
 from routes.chat_websocket import chat_websocket_router
 from routes.statistics import statistics_router
-from datetime import datetime, timedelta
+from routes.metrics import metrics_router
+from datetime import timedelta
 import jwt
 from sqlalchemy.exc import SQLAlchemyError
-from config.db import conn
+from config.db import DBConnection, dispose_engines, get_conn, get_engine, init_engines
+from config.log import configure_logging, shutdown_logging
 from models.user import users
 from pydantic import BaseModel
-
-
-app = FastAPI()
-
-SECRET_KEY = "fsdfsdfsdfsdfs"
-
-# Crear un token JWT
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-        to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
-    return encoded_jwt
+from starlette.concurrency import run_in_threadpool
+from utils.broadcast import broadcast
+from utils.chat_message_writer import chat_message_writer
+from utils.read_receipts import read_receipt_buffer
+from utils.auth import create_access_token, decode_token
+from utils.passwords import verify_password
+from utils.metrics import TimingMiddleware
+from utils.rate_limit import RateLimitMiddleware, rate_limiter
+from utils.responses import FastJSONResponse
+
+
+# Aplicar las migraciones al arrancar solo si se pide explícitamente (útil en desarrollo);
+# en producción se ejecuta `python -m migrations upgrade` antes de levantar los workers
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Registros estructurados escritos desde un hilo aparte (LOG_LEVEL, LOG_FORMAT)
+    configure_logging()
+    # Crear el engine sin abrir conexiones: el worker queda listo sin ir a la base de datos
+    init_engines()
+    if DB_MIGRATE_ON_STARTUP:
+        from migrations import runner
+        await run_in_threadpool(runner.upgrade, get_engine())
+    # Conectar el backend de difusión del chat y el de límites de solicitudes (memoria o Redis)
+    await broadcast.connect()
+    await rate_limiter.connect()
+    # Guardado diferido de los mensajes del chat; al apagar se guarda todo lo pendiente
+    await chat_message_writer.start()
+    # Confirmaciones de lectura agrupadas en un UPDATE por rango cada pocos instantes
+    await read_receipt_buffer.start()
+    yield
+    await read_receipt_buffer.stop()
+    await chat_message_writer.stop()
+    await rate_limiter.disconnect()
+    await broadcast.disconnect()
+    await dispose_engines()
+    # Escribir los registros que queden en la cola antes de salir
+    shutdown_logging()
+
+# Las respuestas se serializan con orjson en lugar del encoder JSON estándar
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Esquema para la solicitud de login
 class LoginRequest(BaseModel):
@@ -40,22 +73,33 @@ class LoginRequest(BaseModel):
 
 # Ruta para generar un token
 @app.post("/generate_token")
-async def generate_token(request: LoginRequest):
+async def generate_token(request: LoginRequest, conn: DBConnection = Depends(get_conn)):
     try:
         # Verificar si el usuario existe en la base de datos
-        user_query = conn.execute(users.select().where(users.c.email == request.email)).fetchone()
+        user_query = (await conn.execute(users.select().where(users.c.email == request.email))).fetchone()
         if not user_query:
             raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-        # Verificar si la contraseña coincide
+        # Verificar la contraseña con bcrypt en el pool de hashes, sin bloquear el event loop
         user = dict(user_query._mapping)
-        if user["password"] != request.password:  # Comparación sencilla de contraseñas
+        password_ok, new_hash = await verify_password(request.password, user["password"])
+        if not password_ok:
             raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-        # Generar el token
+        # Filas antiguas (texto plano o menos rondas): guardar el hash actualizado
+        if new_hash:
+            await conn.execute(
+                users.update()
+                .where(users.c.user_id == user["user_id"], users.c.password == user["password"])
+                .values(password=new_hash)
+            )
+            await conn.commit()
+
+        # Generar el token; incluye el user_id para que las rutas protegidas no consulten la base
         access_token_expires = timedelta(minutes=30)  # Duración del token
         access_token = create_access_token(
-            data={"sub": user["email"], "role": user["role"]}, expires_delta=access_token_expires
+            data={"sub": user["email"], "user_id": user["user_id"], "role": user["role"]},
+            expires_delta=access_token_expires,
         )
 
         # Incluir el user_id en la respuesta
@@ -65,6 +109,8 @@ async def generate_token(request: LoginRequest):
             "user_id": user["user_id"],  # Incluyendo el user_id
         }
 
+    except HTTPException:
+        raise  # Credenciales incorrectas: se responde 401, no 500
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail="Error en la base de datos") from e
     except Exception as e:
@@ -79,13 +125,21 @@ class TokenRequest(BaseModel):
 @app.post("/verify_token")
 async def verify_token(request: TokenRequest):
     try:
-        payload = jwt.decode(request.token, SECRET_KEY, algorithms=["HS256"])
+        payload = decode_token(request.token)
         return {"message": "Token válido", "data": payload}
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Token inválido")
 
+# Límite de solicitudes por cliente en las rutas de escritura (antes que CORS, para
+# que las respuestas 429 también lleven los encabezados CORS)
+app.add_middleware(RateLimitMiddleware)
+
+# Medición de cada petición (latencia y consultas SQL) para Server-Timing y /metrics;
+# va por fuera del límite de solicitudes para medir también las respuestas 429
+app.add_middleware(TimingMiddleware)
+
 # Configuración de CORS
 app.add_middleware(
     CORSMiddleware,
@@ -101,6 +155,7 @@ app.include_router(donation_router, tags=["donations"])
 app.include_router(donation_chat_router, tags=["donation_chats"])
 app.include_router(chat_websocket_router, tags=["chat_websocket"])
 app.include_router(statistics_router, tags=["statistics"])
+app.include_router(metrics_router, tags=["metrics"])
 
 
 if __name__ == '__main__':
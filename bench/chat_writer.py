@@ -0,0 +1,116 @@
+# bench/chat_writer.py
+"""
+Mensajes por segundo al guardar los mensajes del chat: un INSERT y un COMMIT por
+mensaje (como antes del guardado diferido) frente a los lotes de ChatMessageWriter.
+
+Uso:
+    python -m bench.chat_writer [--messages 5000] [--senders 10] [--async]
+
+Usa una base SQLite temporal; con --async las conexiones usan aiosqlite (DB_ASYNC).
+SQLite admite un solo escritor a la vez, así que con muchos `--senders` el modo por
+mensaje agota el pool esperando su turno; en MySQL las cifras absolutas son otras.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+import config.db as db
+from bench.common import temporary_database
+from models.chat_message import chat_messages
+from models.donation import donations
+from models.donation_chat import donation_chats
+from models.user import users
+from utils.chat_message_writer import CHAT_FLUSH_INTERVAL, CHAT_FLUSH_SIZE, ChatMessageWriter
+
+
+def add_chat(engine):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": 1, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": 2, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert().values(
+            donation_id=1, donor_id=1, receiver_id=2, description="Donación", status="pendiente",
+            created_at=datetime(2024, 1, 1),
+        ))
+        conn.execute(donation_chats.insert().values(
+            donation_chat_id=1, donation_id=1, creator_id=1, created_at=datetime(2024, 1, 1),
+        ))
+
+
+def message_row(index: int) -> dict:
+    return {
+        "donation_chat_id": 1,
+        "sender_id": 1,
+        "receiver_id": 2,
+        "message_value": f"Mensaje {index}",
+        "sent_time": datetime.now().replace(microsecond=0),
+        "is_read": False,
+        "client_message_id": f"bench-{index}",
+    }
+
+
+async def send_messages(count: int, senders: int, save):
+    # Cada tarea simula una conexión del websocket que recibe su parte de los mensajes
+    async def sender(indexes):
+        for index in indexes:
+            await save(message_row(index))
+
+    await asyncio.gather(*(sender(range(start, count, senders)) for start in range(senders)))
+
+
+async def per_message_insert(count: int, senders: int) -> float:
+    async def save(row):
+        async with db.db_connection(record_writes=False) as conn:
+            await conn.execute(chat_messages.insert().values(row))
+            await conn.commit()
+
+    started = time.perf_counter()
+    await send_messages(count, senders, save)
+    return time.perf_counter() - started
+
+
+async def batched_flush(count: int, senders: int) -> float:
+    writer = ChatMessageWriter(CHAT_FLUSH_SIZE, CHAT_FLUSH_INTERVAL)
+
+    async def save(row):
+        writer.add(row)
+        await asyncio.sleep(0)  # Ceder el event loop, como entre dos frames recibidos
+
+    started = time.perf_counter()
+    await writer.start()
+    await send_messages(count, senders, save)
+    await writer.stop()  # Guarda lo que quede pendiente
+    return time.perf_counter() - started
+
+
+def saved_messages(engine) -> int:
+    with engine.begin() as conn:
+        count = conn.execute(select(func.count()).select_from(chat_messages)).scalar()
+        conn.execute(chat_messages.delete())
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--senders", type=int, default=10)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    args = parser.parse_args()
+
+    with temporary_database(args.use_async) as engine:
+        add_chat(engine)
+        print(f"{'modo':<22}{'mensajes':>10}{'segundos':>10}{'mensajes/s':>12}")
+        for name, run in (("INSERT por mensaje", per_message_insert), ("lotes (flush)", batched_flush)):
+            elapsed = asyncio.run(run(args.messages, args.senders))
+            saved = saved_messages(engine)
+            assert saved == args.messages, f"{name}: se guardaron {saved} de {args.messages} mensajes"
+            print(f"{name:<22}{saved:>10}{elapsed:>10.2f}{saved / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench/cold_start.py
+"""
+Tiempo de arranque en frío de un worker: un proceso nuevo que importa `app` y ejecuta el
+arranque de la app (lifespan), con la base ya migrada. Con --ref se mide además el código
+de otras revisiones de git (p. ej. antes y después de crear los engines de forma perezosa).
+
+Uso:
+    python -m bench.cold_start [--runs 5] [--ref REVISION ...] [--database-url URL]
+
+Por defecto usa una base SQLite temporal; con --database-url se mide contra otra base
+(p. ej. mysql+pymysql://...), que debe tener el esquema creado.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+
+from bench.common import temporary_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en el proceso nuevo: la última línea es el resultado en JSON
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.app):
+    ready = time.perf_counter()
+print("COLD_START " + json.dumps({"import": imported - started, "startup": ready - imported}))
+"""
+
+
+@contextmanager
+def source_tree(ref: str):
+    """
+    Extraer la revisión `ref` del repositorio en un directorio temporal.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        archive = subprocess.run(["git", "-C", ROOT, "archive", ref], check=True, capture_output=True).stdout
+        with tempfile.TemporaryFile() as tar_file:
+            tar_file.write(archive)
+            tar_file.seek(0)
+            with tarfile.open(fileobj=tar_file) as tar:
+                tar.extractall(directory)
+        yield directory
+
+
+def cold_start(source: str, database_url: str) -> dict:
+    env = {**os.environ, "DATABASE_URL": database_url, "LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=source, env=env, capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - started
+    line = [line for line in result.stdout.splitlines() if line.startswith("COLD_START ")][-1]
+    return {**json.loads(line[len("COLD_START "):]), "total": total}
+
+
+def measure(name: str, source: str, database_url: str, runs: int):
+    try:
+        samples = [cold_start(source, database_url) for _ in range(runs)]
+    except subprocess.CalledProcessError as e:
+        # P. ej. código que se conecta al importar, con la base inaccesible
+        errors = [line for line in e.stderr.splitlines() if "Error" in line] or e.stderr.splitlines()[-1:]
+        print(f"{name:<24}no arrancó: {errors[-1][:100]}")
+        return
+    medians = {key: statistics.median(sample[key] for sample in samples) for key in ("import", "startup", "total")}
+    print(f"{name:<24}{medians['import'] * 1000:>12.0f}{medians['startup'] * 1000:>12.0f}{medians['total'] * 1000:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", action="append", default=[], help="revisión de git a comparar (se puede repetir)")
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    database = nullcontext() if args.database_url else temporary_database()
+    with database:
+        import config.db as db
+
+        database_url = args.database_url or db.DATABASE_URL
+        print(f"{'código (mediana ms)':<24}{'import':>12}{'arranque':>12}{'proceso':>12}")
+        for ref in args.ref:
+            with source_tree(ref) as source:
+                measure(ref, source, database_url, args.runs)
+        measure("actual", ROOT, database_url, args.runs)
+
+
+if __name__ == "__main__":
+    main()
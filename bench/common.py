@@ -0,0 +1,45 @@
+# bench/common.py
+
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import config.db as db
+from migrations import runner
+
+
+@contextmanager
+def temporary_database(use_async: bool = False):
+    """
+    Apuntar la app a una base SQLite temporal con todas las migraciones aplicadas
+    (con `use_async`, las conexiones usan aiosqlite como en el modo DB_ASYNC).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        db.DATABASE_URL = f"sqlite:///{path}"
+        db.ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{path}"
+        db.DB_ASYNC = use_async
+        db.DB_READ_URLS = []
+        engine = db.get_engine()
+        # SQLite admite un solo escritor: las conexiones esperan su turno en vez de fallar
+        event.listen(engine, "connect", wait_for_lock)
+        runner.upgrade(engine)
+        try:
+            yield engine
+        finally:
+            if db._async_engine is not None:
+                db._async_engine.sync_engine.dispose()
+                db._async_engine = None
+            engine.dispose()
+            db._engine = None
+
+
+def wait_for_lock(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA busy_timeout = 60000")
+
+
+def percentile(values: list, percent: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1] if len(values) > 1 else values[0]
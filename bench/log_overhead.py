@@ -0,0 +1,100 @@
+# bench/log_overhead.py
+"""
+Costo por mensaje del chat de los registros en el hilo que atiende la petición: los
+print() de depuración que había antes frente a config.log (QueueHandler + SampledLogger).
+
+Uso:
+    python -m bench.log_overhead [--messages 100000] [--sample-rate 0.01]
+
+La salida (stdout) se descarta en un archivo temporal. Se mide el tiempo de las llamadas
+y, aparte, el total incluyendo el vaciado de la cola por el hilo del QueueListener.
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+import config.log as log
+from config.log import SampledLogger, configure_logging, shutdown_logging
+
+MESSAGE = {
+    "donation_chat_id": 1,
+    "sender_id": 2,
+    "receiver_id": 3,
+    "message_value": "x" * 200,
+    "sent_time": "2024-01-01 10:00:00",
+    "is_read": False,
+}
+
+
+def print_message(message: dict):
+    # Los print() que hacía el websocket por cada mensaje antes de config.log
+    print(f"Mensaje recibido: {message}")
+    print("llamando a save_message_to_db")
+    print("Encolando el mensaje para guardarlo en la base de datos...")
+    print(f"Datos del mensaje: {message}")
+    print("Mensaje enviado a los clientes conectados")
+
+
+def log_message(message_logger, message: dict):
+    # Lo que registra hoy save_message_to_db: solo IDs y longitud, con muestreo
+    message_logger.debug(
+        "Mensaje del chat encolado para guardarlo",
+        extra={
+            "donation_chat_id": message["donation_chat_id"],
+            "sender_id": message["sender_id"],
+            "message_length": len(message["message_value"]),
+        },
+    )
+
+
+def time_prints(count: int) -> tuple:
+    started = time.perf_counter()
+    for _ in range(count):
+        print_message(MESSAGE)
+    elapsed = time.perf_counter() - started
+    sys.stdout.flush()
+    return elapsed, time.perf_counter() - started
+
+
+def time_logging(count: int, level: str, sample_rate: float) -> tuple:
+    log.LOG_LEVEL = level
+    configure_logging()
+    message_logger = SampledLogger(logging.getLogger("bench.messages"), rate=sample_rate)
+    started = time.perf_counter()
+    for _ in range(count):
+        log_message(message_logger, MESSAGE)
+    elapsed = time.perf_counter() - started
+    shutdown_logging()  # Espera a que el listener escriba lo encolado
+    return elapsed, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = []
+    stdout = sys.stdout
+    with tempfile.TemporaryFile("w") as output:
+        sys.stdout = output
+        try:
+            results.append(("print() por mensaje", time_prints(args.messages)))
+            results.append(("logging a INFO (debug descartado)", time_logging(args.messages, "INFO", args.sample_rate)))
+            results.append((
+                f"logging a DEBUG (muestra {args.sample_rate:g})",
+                time_logging(args.messages, "DEBUG", args.sample_rate),
+            ))
+        finally:
+            sys.stdout = stdout
+
+    print(f"{'camino':<38}{'us/mensaje':>12}{'con vaciado':>14}")
+    for name, (calls, total) in results:
+        print(f"{name:<38}{calls / args.messages * 1e6:>12.2f}{total / args.messages * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
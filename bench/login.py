@@ -0,0 +1,102 @@
+# bench/login.py
+"""
+Prueba de carga de /generate_token: latencias p50/p99 de inicios de sesión concurrentes
+y retraso máximo del event loop mientras bcrypt verifica las contraseñas.
+
+Uso:
+    python -m bench.login [--logins 64] [--concurrency 16]
+
+La app corre en este proceso (httpx con ASGITransport) sobre una base SQLite temporal,
+sin límites de solicitudes. BCRYPT_ROUNDS y PASSWORD_HASH_WORKERS se toman del entorno,
+igual que en el servidor. Cada inicio de sesión conserva su conexión mientras espera a
+bcrypt, así que la concurrencia no debe superar el pool (15 conexiones con SQLite;
+DB_POOL_SIZE + DB_MAX_OVERFLOW con MySQL).
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+# Los límites por ruta se leen al importar la app: sin ellos todas las solicitudes pasan
+os.environ["RATE_LIMIT_RULES"] = ""
+
+from app import app  # noqa: E402
+from bench.common import percentile, temporary_database  # noqa: E402
+from models.user import users  # noqa: E402
+from utils.passwords import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, pwd_context  # noqa: E402
+
+PASSWORD = "contraseña-de-prueba"
+
+
+def add_users(engine, count: int):
+    # Un solo hash para todos: calcular uno por usuario tardaría más que la prueba
+    password_hash = pwd_context.hash(PASSWORD)
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"name": f"Usuario {index}", "email": f"user{index}@example.com", "password": password_hash, "role": "user"}
+            for index in range(count)
+        ])
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    # Cuánto tarda de más en despertar una espera corta: lo que el loop estuvo bloqueado
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_logins(count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login(client, index):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/generate_token", json={"email": f"user{index}@example.com", "password": PASSWORD})
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await asyncio.gather(*(login(client, index) for index in range(count)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return latencies, elapsed, await lag_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with temporary_database() as engine:
+        add_users(engine, args.logins)
+        latencies, elapsed, worst_lag = asyncio.run(run_logins(args.logins, args.concurrency))
+
+    # Referencia: lo que bloquearía el loop una verificación hecha en línea
+    started = time.perf_counter()
+    pwd_context.verify(PASSWORD, pwd_context.hash(PASSWORD))
+    inline = (time.perf_counter() - started) / 2
+
+    print(f"BCRYPT_ROUNDS={BCRYPT_ROUNDS} PASSWORD_HASH_WORKERS={PASSWORD_HASH_WORKERS} CPUs={os.cpu_count()}")
+    for label, value in (
+        ("inicios de sesión", f"{args.logins} ({args.concurrency} a la vez) en {elapsed:.2f} s"),
+        ("inicios de sesión/s", f"{args.logins / elapsed:.2f}"),
+        ("latencia p50 / p99", f"{percentile(latencies, 50):.3f} s / {percentile(latencies, 99):.3f} s"),
+        ("retraso máximo del loop", f"{worst_lag * 1000:.1f} ms"),
+        ("una verificación en línea", f"{inline * 1000:.1f} ms"),
+    ):
+        print(f"{label + ':':<28}{value}")
+
+
+if __name__ == "__main__":
+    main()
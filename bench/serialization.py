@@ -0,0 +1,68 @@
+# bench/serialization.py
+"""
+Costo por fila de serializar una respuesta con 10k mensajes del chat (filas reales de
+SQLAlchemy): el camino anterior (diccionarios, jsonable_encoder y json de la biblioteca
+estándar) frente a FastJSONResponse (orjson) y rows_response.
+
+Uso:
+    python -m bench.serialization [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from bench.chat_writer import add_chat, message_row
+from bench.common import temporary_database
+from models.chat_message import chat_messages
+from utils.responses import FastJSONResponse, rows_response
+
+
+def load_rows(engine, count: int) -> list:
+    add_chat(engine)
+    with engine.begin() as conn:
+        conn.execute(chat_messages.insert(), [message_row(index) for index in range(count)])
+    with engine.connect() as conn:
+        return conn.execute(chat_messages.select().order_by(chat_messages.c.message_id)).fetchall()
+
+
+def stdlib_json(rows) -> bytes:
+    # Antes: un diccionario por fila, jsonable_encoder recorre todo y json.dumps serializa
+    return JSONResponse(jsonable_encoder([dict(row._mapping) for row in rows])).body
+
+
+def orjson_dicts(rows) -> bytes:
+    return FastJSONResponse([dict(row._mapping) for row in rows]).body
+
+
+def orjson_rows(rows) -> bytes:
+    return rows_response(rows).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with temporary_database() as engine:
+        rows = load_rows(engine, args.rows)
+
+    # Los tres caminos deben producir el mismo JSON
+    assert json.loads(stdlib_json(rows)) == json.loads(orjson_dicts(rows)) == json.loads(orjson_rows(rows))
+
+    print(f"{'camino':<42}{'us/fila':>10}{'ms/respuesta':>14}")
+    for name, serialize in (
+        ("dicts + jsonable_encoder + json", stdlib_json),
+        ("dicts + orjson (FastJSONResponse)", orjson_dicts),
+        ("rows_response (orjson)", orjson_rows),
+    ):
+        best = min(timeit.repeat(lambda: serialize(rows), number=1, repeat=args.repeat))
+        print(f"{name:<42}{best / len(rows) * 1e6:>10.2f}{best * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
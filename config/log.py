@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Nivel mínimo de los registros (DEBUG, INFO, WARNING, ERROR); por debajo de este nivel
+# las llamadas al logger se descartan sin construir el mensaje
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Formato de salida: "json" (una línea por registro) o "text" para desarrollo
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fracción de los eventos de alto volumen (p. ej. cada mensaje del chat) que se registra
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Atributos propios de LogRecord; el resto vienen de `extra=` y se agregan como campos
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatea cada registro como una línea JSON con los campos pasados en `extra=`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger para eventos de alto volumen: registra solo una fracción de los eventos por
+    debajo de WARNING (las advertencias y errores siempre). La muestra se decide antes
+    de construir el registro, así los eventos descartados casi no cuestan nada.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float = LOG_SAMPLE_RATE):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level: int) -> bool:
+        if not self.logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or random.random() < self.rate
+
+    def process(self, msg, kwargs):
+        # Conservar el `extra=` de cada llamada (LoggerAdapter lo reemplazaría por el suyo)
+        return msg, kwargs
+
+
+class RawQueueHandler(QueueHandler):
+    """
+    Encola el registro tal cual: el mensaje, sus argumentos y la traza de una excepción
+    se formatean en el hilo del QueueListener, no en el de la petición.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # La cola es del mismo proceso: no hace falta volver el registro serializable
+        return record
+
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging():
+    """
+    Enviar los registros a una cola: la petición solo encola el registro y un hilo
+    aparte (QueueListener) lo formatea y lo escribe en stdout.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = RawQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Escribir lo que quede en la cola y detener el hilo de salida.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
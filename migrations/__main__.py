@@ -0,0 +1,34 @@
+# migrations/__main__.py
+"""
+Crear o actualizar el esquema de la base de datos (ya no se hace al importar los modelos).
+
+Uso:
+    python -m migrations upgrade
+    python -m migrations downgrade [revision]
+    python -m migrations backfill-rollups   (reconstruye los resúmenes mensuales)
+"""
+
+import sys
+
+from config.db import get_engine
+from migrations import runner
+from utils.rollups import backfill_rollups
+
+
+def main(argv: list):
+    command = argv[0] if argv else "upgrade"
+    if command == "upgrade":
+        runner.upgrade(get_engine())
+    elif command == "downgrade":
+        runner.downgrade(get_engine(), argv[1] if len(argv) > 1 else None)
+    elif command == "backfill-rollups":
+        # Todo en una transacción: las lecturas nunca ven los resúmenes vacíos
+        with get_engine().begin() as conn:
+            backfill_rollups(conn)
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+# migrations/m0000_initial_schema.py
+"""
+Esquema inicial: crea las tablas que aún no existan (antes esto se hacía con
+meta.create_all(engine) al importar cada modelo). Solo crea las tablas: los índices
+secundarios los agregan 0001 y 0003, y las columnas nuevas las migraciones posteriores.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, String, Table, inspect
+from sqlalchemy.schema import CreateTable
+
+revision = "0000"
+down_revision = None
+
+# Copia de las tablas de models/ tal como estaban en esta revisión: los cambios
+# posteriores de los modelos van en sus propias migraciones
+initial_meta = MetaData()
+
+users = Table(
+    "users", initial_meta,
+    Column("user_id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(255), nullable=False),
+    Column("phone_number", String(20), nullable=True),
+    Column("email", String(255), nullable=False, unique=True),
+    Column("password", String(255), nullable=True),
+    Column("address", String(255), nullable=True),
+    Column("role", String(50), nullable=False),
+)
+
+charity_profiles = Table(
+    "charity_profile", initial_meta,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("social_profile", String(255), nullable=True),
+    Column("description", String(500), nullable=True),
+)
+
+donations = Table(
+    "donations", initial_meta,
+    Column("donation_id", Integer, primary_key=True),
+    Column("donor_id", Integer),
+    Column("receiver_id", Integer),
+    Column("description", String(255)),
+    Column("status", String(50)),
+    Column("created_at", DateTime),
+)
+
+donated_foods = Table(
+    "donated_food", initial_meta,
+    Column("donated_food_id", Integer, primary_key=True, autoincrement=True),
+    Column("donation_id", Integer, ForeignKey("donations.donation_id"), nullable=False),
+    Column("category", String(255), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("unit_of_measure", String(50), nullable=False),
+    Column("expiration_date", Date, nullable=False),
+)
+
+donation_chats = Table(
+    "donation_chat", initial_meta,
+    Column("donation_chat_id", Integer, primary_key=True, autoincrement=True),
+    Column("donation_id", Integer, ForeignKey("donations.donation_id"), nullable=False, unique=True),
+    Column("creator_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("created_at", DateTime, default=datetime.now, nullable=False),
+)
+
+chat_messages = Table(
+    "chat_message", initial_meta,
+    Column("message_id", Integer, primary_key=True, autoincrement=True),
+    Column("donation_chat_id", Integer, ForeignKey("donation_chat.donation_chat_id"), nullable=False),
+    Column("sender_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("receiver_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("message_value", String(1000), nullable=False),
+    Column("sent_time", DateTime, nullable=False),
+    Column("is_read", Boolean, default=False, nullable=False),
+)
+
+# En orden de creación según las claves foráneas
+INITIAL_TABLES = [users, charity_profiles, donations, donated_foods, donation_chats, chat_messages]
+
+
+def upgrade(conn):
+    existing = set(inspect(conn).get_table_names())
+    for table in INITIAL_TABLES:
+        if table.name not in existing:
+            conn.execute(CreateTable(table))
+
+
+def downgrade(conn):
+    for table in reversed(INITIAL_TABLES):
+        table.drop(conn, checkfirst=True)
@@ -0,0 +1,38 @@
+# migrations/m0001_route_indexes.py
+"""
+Índices secundarios que necesitan las consultas de las rutas (ver las
+definiciones en models/).
+"""
+
+from migrations.runner import frozen_index
+
+revision = "0001"
+down_revision = "0000"
+
+# (tabla, índice, columnas) tal como quedaron en esta revisión
+ROUTE_INDEXES = [
+    ("donations", "ix_donations_created_at", ["created_at"]),
+    ("donations", "ix_donations_donor_id", ["donor_id"]),
+    ("donations", "ix_donations_receiver_id", ["receiver_id"]),
+    ("donations", "ix_donations_status_donor_created", ["status", "donor_id", "created_at"]),
+    ("donated_food", "ix_donated_food_donation_id", ["donation_id"]),
+    ("donated_food", "ix_donated_food_unit_category", ["unit_of_measure", "category", "quantity"]),
+    ("chat_message", "ix_chat_message_chat_sent_time", ["donation_chat_id", "sent_time"]),
+    ("chat_message", "ix_chat_message_receiver_id", ["receiver_id"]),
+    ("chat_message", "ix_chat_message_sender_id", ["sender_id"]),
+    ("donation_chat", "ix_donation_chat_creator_id", ["creator_id"]),
+]
+
+
+def route_indexes():
+    return [frozen_index(*definition) for definition in ROUTE_INDEXES]
+
+
+def upgrade(conn):
+    for index in route_indexes():
+        index.create(conn, checkfirst=True)
+
+
+def downgrade(conn):
+    for index in reversed(route_indexes()):
+        index.drop(conn, checkfirst=True)
@@ -0,0 +1,24 @@
+# migrations/m0002_monthly_rollups.py
+"""
+Tablas de resúmenes mensuales para las estadísticas (ver models/monthly_rollup.py),
+cargadas a partir del historial existente.
+"""
+
+from models.monthly_rollup import donation_monthly_rollup, food_monthly_rollup
+from utils.rollups import backfill_rollups
+
+revision = "0002"
+down_revision = "0001"
+
+ROLLUP_TABLES = [donation_monthly_rollup, food_monthly_rollup]
+
+
+def upgrade(conn):
+    for table in ROLLUP_TABLES:
+        table.create(conn, checkfirst=True)
+    backfill_rollups(conn)
+
+
+def downgrade(conn):
+    for table in reversed(ROLLUP_TABLES):
+        table.drop(conn, checkfirst=True)
@@ -0,0 +1,22 @@
+# migrations/m0003_chat_message_id_index.py
+"""
+Índice (donation_chat_id, message_id) para leer los mensajes de un chat a partir
+de un message_id (reconexión del websocket y ventanas `after`/`before`).
+"""
+
+from migrations.runner import frozen_index
+
+revision = "0003"
+down_revision = "0002"
+
+
+def chat_message_id_index():
+    return frozen_index("chat_message", "ix_chat_message_chat_message_id", ["donation_chat_id", "message_id"])
+
+
+def upgrade(conn):
+    chat_message_id_index().create(conn, checkfirst=True)
+
+
+def downgrade(conn):
+    chat_message_id_index().drop(conn, checkfirst=True)
@@ -0,0 +1,31 @@
+# migrations/m0004_chat_client_message_id.py
+"""
+Columna `client_message_id` en chat_message: identifica los mensajes enviados por el
+websocket antes de que el guardado diferido les asigne un message_id.
+"""
+
+from sqlalchemy import inspect, text
+
+from migrations.runner import frozen_index
+
+revision = "0004"
+down_revision = "0003"
+
+
+def client_message_id_index():
+    return frozen_index(
+        "chat_message", "uq_chat_message_client_message_id", ["donation_chat_id", "client_message_id"], unique=True
+    )
+
+
+def upgrade(conn):
+    # Las bases creadas cuando 0000 usaba las tablas de models/ ya tienen la columna
+    columns = {column["name"] for column in inspect(conn).get_columns("chat_message")}
+    if "client_message_id" not in columns:
+        conn.execute(text("ALTER TABLE chat_message ADD COLUMN client_message_id VARCHAR(36) NULL"))
+    client_message_id_index().create(conn, checkfirst=True)
+
+
+def downgrade(conn):
+    client_message_id_index().drop(conn, checkfirst=True)
+    conn.execute(text("ALTER TABLE chat_message DROP COLUMN client_message_id"))
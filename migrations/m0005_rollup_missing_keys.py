@@ -0,0 +1,24 @@
+# migrations/m0005_rollup_missing_keys.py
+"""
+Recargar los resúmenes mensuales para incluir las donaciones sin fecha o sin estado,
+que la carga de la 0002 omitía (se cuentan bajo la clave vacía, ver utils/rollups.py).
+"""
+
+from sqlalchemy import or_
+
+from models.monthly_rollup import donation_monthly_rollup, food_monthly_rollup
+from utils.rollups import MISSING_KEY, backfill_rollups
+
+revision = "0005"
+down_revision = "0004"
+
+
+def upgrade(conn):
+    backfill_rollups(conn)
+
+
+def downgrade(conn):
+    conn.execute(donation_monthly_rollup.delete().where(
+        or_(donation_monthly_rollup.c.month == MISSING_KEY, donation_monthly_rollup.c.status == MISSING_KEY)
+    ))
+    conn.execute(food_monthly_rollup.delete().where(food_monthly_rollup.c.month == MISSING_KEY))
@@ -0,0 +1,76 @@
+# migrations/runner.py
+
+import importlib
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Index, Integer, String, DateTime, MetaData, select
+
+# Migraciones en orden de aplicación (cada módulo define revision, upgrade y downgrade)
+MIGRATIONS = [
+    "migrations.m0000_initial_schema",
+    "migrations.m0001_route_indexes",
+    "migrations.m0002_monthly_rollups",
+    "migrations.m0003_chat_message_id_index",
+    "migrations.m0004_chat_client_message_id",
+    "migrations.m0005_rollup_missing_keys",
+]
+
+# Tabla propia para registrar qué revisiones ya se aplicaron
+migrations_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migrations_meta,
+    Column("revision", String(32), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def frozen_index(table_name: str, name: str, columns: list, unique: bool = False) -> Index:
+    """
+    Índice definido solo con nombres (sin usar las tablas de models/), para que una
+    migración ya aplicada no cambie de significado cuando cambie un modelo.
+    """
+    table = Table(table_name, MetaData(), *[Column(column, Integer) for column in columns])
+    return Index(name, *[table.c[column] for column in columns], unique=unique)
+
+
+def load_migrations():
+    return [importlib.import_module(name) for name in MIGRATIONS]
+
+
+def applied_revisions(conn) -> set:
+    migrations_meta.create_all(conn)
+    return set(conn.execute(select(schema_migrations.c.revision)).scalars().all())
+
+
+def upgrade(engine):
+    """
+    Aplicar en orden las migraciones pendientes, cada una en su propia transacción.
+    """
+    with engine.connect() as conn:
+        applied = applied_revisions(conn)
+        conn.commit()
+        for migration in load_migrations():
+            if migration.revision in applied:
+                continue
+            print(f"Aplicando migración {migration.revision} ({migration.__name__})")
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(revision=migration.revision, applied_at=datetime.now()))
+            conn.commit()
+
+
+def downgrade(engine, target_revision: str = None):
+    """
+    Revertir las migraciones aplicadas posteriores a `target_revision` (todas si es None).
+    """
+    with engine.connect() as conn:
+        applied = applied_revisions(conn)
+        conn.commit()
+        for migration in reversed(load_migrations()):
+            if migration.revision == target_revision:
+                break
+            if migration.revision not in applied:
+                continue
+            print(f"Revirtiendo migración {migration.revision} ({migration.__name__})")
+            migration.downgrade(conn)
+            conn.execute(schema_migrations.delete().where(schema_migrations.c.revision == migration.revision))
+            conn.commit()
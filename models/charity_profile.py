@@ -1,7 +1,7 @@
 # models/charity_profile.py
 
 from sqlalchemy import Table, Column, Integer, String, ForeignKey
-from config.db import meta, engine
+from config.db import meta
 from models.user import users  # Importamos la tabla de usuario para la clave foránea
 
 # Definir la tabla `charity_profile`
@@ -12,6 +12,3 @@ charity_profiles = Table(
     Column("social_profile", String(255), nullable=True),
     Column("description", String(500), nullable=True),
 )
-
-# Crear la tabla en la base de datos
-meta.create_all(engine)
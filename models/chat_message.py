@@ -1,5 +1,5 @@
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, Boolean
-from config.db import meta, engine
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, DateTime, Boolean, Index
+from config.db import meta
 
 chat_messages = Table(
     "chat_message", meta,
@@ -9,8 +9,14 @@ chat_messages = Table(
     Column("receiver_id", Integer, ForeignKey("users.user_id"), nullable=False),
     Column("message_value", String(1000), nullable=False),
     Column("sent_time", DateTime, nullable=False),
-    Column("is_read", Boolean, default=False, nullable=False)
+    Column("is_read", Boolean, default=False, nullable=False),
+    # ID asignado por el cliente (o el servidor) al enviar por el websocket, antes de tener message_id
+    Column("client_message_id", String(36), nullable=True),
+    # Índices según las consultas de las rutas
+    Index("ix_chat_message_chat_sent_time", "donation_chat_id", "sent_time"),  # mensajes de un chat en orden
+    Index("ix_chat_message_chat_message_id", "donation_chat_id", "message_id"),  # mensajes desde un message_id
+    Index("ix_chat_message_sender_id", "sender_id"),  # delete_user
+    Index("ix_chat_message_receiver_id", "receiver_id"),  # delete_user
+    # Un reenvío con el mismo client_message_id no duplica el mensaje; también resuelve sus message_id
+    Index("uq_chat_message_client_message_id", "donation_chat_id", "client_message_id", unique=True),
 )
-
-# Crear la tabla en la base de datos (si aún no existe)
-meta.create_all(engine)
\ No newline at end of file
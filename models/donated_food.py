@@ -1,7 +1,7 @@
 # models/donated_food.py
 
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, Date
-from config.db import meta, engine
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, Date, Index
+from config.db import meta
 from models.donation import donations # Importar la tabla donation para la clave foránea
 
 # Definir la tabla `donated_food`
@@ -12,8 +12,8 @@ donated_foods = Table(
     Column("category", String(255), nullable=False),
     Column("quantity", Integer, nullable=False),
     Column("unit_of_measure", String(50), nullable=False),
-    Column("expiration_date", Date, nullable=False)
+    Column("expiration_date", Date, nullable=False),
+    # Índices según las consultas de las rutas
+    Index("ix_donated_food_donation_id", "donation_id"),  # alimentos de una o varias donaciones
+    Index("ix_donated_food_unit_category", "unit_of_measure", "category", "quantity"),  # estadísticas (cubriente)
 )
-
-# Crear la tabla en la base de datos
-meta.create_all(engine)
\ No newline at end of file
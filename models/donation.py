@@ -1,7 +1,7 @@
 # models/donation.py
 
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, Boolean, DateTime
-from config.db import meta, engine
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, Boolean, DateTime, Index
+from config.db import meta
 from models.user import users  # Importamos la tabla users para las claves foráneas
 
 # Definir la tabla `donation`
@@ -14,7 +14,9 @@ donations = Table(
     Column("description", String(255)),
     Column("status", String(50)),
     Column("created_at", DateTime),  # Verifica que esta columna exista
+    # Índices según las consultas de las rutas (InnoDB agrega la clave primaria al final de cada índice)
+    Index("ix_donations_donor_id", "donor_id"),  # get_my_donations, delete_user
+    Index("ix_donations_receiver_id", "receiver_id"),  # get_received_donations, delete_user
+    Index("ix_donations_created_at", "created_at"),  # reportes por rango de fechas
+    Index("ix_donations_status_donor_created", "status", "donor_id", "created_at"),  # estadísticas (cubriente)
 )
-
-# Crear la tabla en la base de datos
-meta.create_all(engine)
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy import Table, Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Table, Column, Integer, ForeignKey, DateTime, Index
 from datetime import datetime
-from config.db import meta, engine
+from config.db import meta
 
 # Definir la tabla `donation_chat`
 donation_chats = Table(
@@ -8,8 +8,7 @@ donation_chats = Table(
     Column("donation_chat_id", Integer, primary_key=True, autoincrement=True),
     Column("donation_id", Integer, ForeignKey("donations.donation_id"), nullable=False, unique=True),
     Column("creator_id", Integer, ForeignKey("users.user_id"), nullable=False),
-    Column("created_at", DateTime, default=datetime.now, nullable=False) 
+    Column("created_at", DateTime, default=datetime.now, nullable=False),
+    # `donation_id` ya tiene un índice único; este cubre los chats creados por un usuario
+    Index("ix_donation_chat_creator_id", "creator_id"),
 )
-
-# Crear la tabla en la base de datos
-meta.create_all(engine)
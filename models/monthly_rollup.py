@@ -0,0 +1,25 @@
+# models/monthly_rollup.py
+
+from sqlalchemy import Table, Column, Integer, String
+from config.db import meta
+
+# Resúmenes mensuales precalculados para las estadísticas por rango de fechas.
+# Se mantienen en la misma transacción que cada escritura (ver utils/rollups.py)
+# y se pueden reconstruir con `python -m migrations backfill-rollups`.
+
+# Cantidad de donaciones por mes ("YYYY-MM", según created_at) y estado
+donation_monthly_rollup = Table(
+    "donation_monthly_rollup", meta,
+    Column("month", String(7), primary_key=True),
+    Column("status", String(50), primary_key=True),
+    Column("donations_count", Integer, nullable=False, default=0),
+)
+
+# Cantidad de alimentos donados por mes de la donación, categoría y unidad de medida
+food_monthly_rollup = Table(
+    "food_monthly_rollup", meta,
+    Column("month", String(7), primary_key=True),
+    Column("category", String(255), primary_key=True),
+    Column("unit_of_measure", String(50), primary_key=True),
+    Column("total_quantity", Integer, nullable=False, default=0),
+)
@@ -1,7 +1,7 @@
 # models/user.py
 
 from sqlalchemy import Table, Column, Integer, String
-from config.db import meta, engine
+from config.db import meta
 
 # Definir la tabla `user`
 users = Table(
@@ -14,6 +14,3 @@ users = Table(
     Column("address", String(255), nullable=True),
     Column("role", String(50), nullable=False)
 )
-
-# Crear la tabla en la base de datos
-meta.create_all(engine)
@@ -1,96 +1,339 @@
 # routes/chat_websocket.py
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, status
-from sqlalchemy.exc import SQLAlchemyError
-from config.db import conn
-from models.chat_message import chat_messages
-from typing import List, Dict
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import List, Dict, Optional
 from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from config.db import db_connection
+from config.log import SampledLogger
+from routes.donation_chat import message_window_query, split_message_window
+from utils.broadcast import broadcast
+from utils.chat_message_writer import chat_message_writer
+from utils.rate_limit import client_identity, parse_budget, rate_limiter
+from utils.read_receipts import read_receipt_buffer
+import asyncio
+import json
+import logging
+import os
 import pytz
+import uuid
 
 chat_websocket_router = APIRouter()
 
-# Diccionario para almacenar clientes conectados a cada chat
-active_connections: Dict[int, List[WebSocket]] = {}
+logger = logging.getLogger(__name__)
+# Eventos por mensaje (alto volumen): solo se registra una muestra (LOG_SAMPLE_RATE)
+message_logger = SampledLogger(logging.getLogger(f"{__name__}.messages"))
+
+# Configuración del envío a cada cliente (se puede ajustar con variables de entorno)
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "100"))  # Mensajes pendientes por cliente
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", "10"))  # Segundos máximos por envío
+# Qué hacer si la cola de un cliente lento se llena: "drop_oldest", "drop_newest" o "disconnect"
+CHAT_OVERFLOW_POLICY = os.getenv("CHAT_OVERFLOW_POLICY", "drop_oldest")
+
+# Máximo de mensajes reenviados al reconectar con `since_message_id`; si faltan más,
+# el cliente recibe un aviso y pide el resto por REST con `after`
+CHAT_REPLAY_LIMIT = int(os.getenv("CHAT_REPLAY_LIMIT", "200"))
+
+# Límites de frames recibidos ("cantidad/segundos"): por conexión y por cliente (usuario o IP)
+# en todas sus conexiones; tras CHAT_WS_MAX_VIOLATIONS frames rechazados seguidos se cierra el socket
+CHAT_WS_CONNECTION_BUDGET = parse_budget(os.getenv("CHAT_WS_CONNECTION_RATE_LIMIT", "20/10"))
+CHAT_WS_CLIENT_BUDGET = parse_budget(os.getenv("CHAT_WS_CLIENT_RATE_LIMIT", "60/10"))
+CHAT_WS_MAX_VIOLATIONS = int(os.getenv("CHAT_WS_MAX_VIOLATIONS", "10"))
+
+# Código de cierre para clientes que no consumen sus mensajes a tiempo (1013: Try Again Later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+# Código de cierre para clientes que superan el límite de frames (1008: Policy Violation)
+RATE_LIMIT_CLOSE_CODE = 1008
+
+
+class ChatClient:
+    """
+    Cliente conectado a un chat con su propia cola de salida acotada, vaciada por
+    una tarea independiente: un cliente lento no frena la entrega a los demás.
+    Con `hold=True` los mensajes en vivo se retienen hasta `release()`, mientras se
+    reenvía el historial pendiente de una reconexión.
+    """
+
+    def __init__(self, websocket: WebSocket, donation_chat_id: int, hold: bool = False):
+        self.websocket = websocket
+        self.donation_chat_id = donation_chat_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHAT_SEND_QUEUE_SIZE)
+        self.held: Optional[List[str]] = [] if hold else None
+        self.connection_id = uuid.uuid4().hex
+        self.identity = client_identity(websocket.scope)
+        self.rate_violations = 0
+        self.writer_task = None if hold else asyncio.create_task(self._write_messages())
+        self.closed = False
+
+    async def send(self, message: str):
+        """
+        Encolar un mensaje ya serializado aplicando la política de desborde.
+        """
+        if self.closed:
+            return
+        if self.held is not None:
+            self.held.append(message)
+            return
+        if self.queue.full():
+            if CHAT_OVERFLOW_POLICY == "disconnect":
+                await self.close(SLOW_CLIENT_CLOSE_CODE)
+                return
+            if CHAT_OVERFLOW_POLICY == "drop_newest":
+                return
+            self.queue.get_nowait()  # drop_oldest: descartar el mensaje más antiguo
+        self.queue.put_nowait(message)
+
+    async def _write_messages(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), timeout=CHAT_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.closed:
+                return  # El socket se cerró mientras se enviaba (p. ej. por el límite de mensajes)
+            # Socket caído o demasiado lento: se cierra sin afectar a los demás clientes
+            logger.warning("Error al enviar al cliente del chat %s: %s", self.donation_chat_id, e)
+            await self.close(SLOW_CLIENT_CLOSE_CODE)
+
+    async def release(self, skip: set):
+        """
+        Empezar a enviar los mensajes en vivo, omitiendo los retenidos que ya se
+        reenviaron con el historial (`skip` contiene sus `client_message_id`).
+        """
+        held, self.held = self.held or [], None
+        self.writer_task = asyncio.create_task(self._write_messages())
+        for message in held:
+            if json.loads(message).get("client_message_id") not in skip:
+                await self.send(message)
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer_task is not None and self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # El socket ya estaba cerrado
+        await disconnect_from_chat(self)
+
+
+# Diccionario para almacenar los clientes conectados a cada chat en este proceso
+active_connections: Dict[int, List[ChatClient]] = {}
+
+# Canal del backend de difusión para cada chat
+def chat_channel(donation_chat_id: int) -> str:
+    return f"chat:{donation_chat_id}"
 
 # Función para conectar un cliente al chat especificado
-async def connect_to_chat(websocket: WebSocket, donation_chat_id: int):
+async def connect_to_chat(websocket: WebSocket, donation_chat_id: int, hold: bool = False) -> ChatClient:
     await websocket.accept()
+    client = ChatClient(websocket, donation_chat_id, hold)
     if donation_chat_id not in active_connections:
         active_connections[donation_chat_id] = []
-    active_connections[donation_chat_id].append(websocket)
+        # Primer cliente del chat en este proceso: escuchar los mensajes de otros workers
+        await broadcast.subscribe(chat_channel(donation_chat_id))
+    active_connections[donation_chat_id].append(client)
+    return client
 
 # Función para desconectar un cliente del chat
-async def disconnect_from_chat(websocket: WebSocket, donation_chat_id: int):
-    if donation_chat_id in active_connections:
-        active_connections[donation_chat_id].remove(websocket)
+async def disconnect_from_chat(client: ChatClient):
+    donation_chat_id = client.donation_chat_id
+    if donation_chat_id in active_connections and client in active_connections[donation_chat_id]:
+        active_connections[donation_chat_id].remove(client)
         if not active_connections[donation_chat_id]:  # Eliminar entrada si no hay conexiones
             del active_connections[donation_chat_id]
+            await broadcast.unsubscribe(chat_channel(donation_chat_id))
 
-# Función para enviar mensajes a todos los clientes conectados al mismo chat
+# Función para enviar mensajes a todos los clientes conectados al mismo chat, en cualquier worker.
+# El JSON se serializa una sola vez por mensaje, no una vez por destinatario.
 async def send_message_to_chat(donation_chat_id: int, message_data: dict):
-    if donation_chat_id in active_connections:
-        for connection in active_connections[donation_chat_id]:
-            await connection.send_json(message_data)
+    await broadcast.publish(chat_channel(donation_chat_id), json.dumps(message_data, default=str))
 
-# Función para almacenar el mensaje en la base de datos
+# Función que recibe los mensajes del backend y los encola en paralelo para los clientes de este proceso
+async def deliver_to_local_connections(channel: str, message: str):
+    donation_chat_id = int(channel.split(":", 1)[1])
+    clients = list(active_connections.get(donation_chat_id, []))
+    await asyncio.gather(*(client.send(message) for client in clients), return_exceptions=True)
+
+broadcast.set_handler(deliver_to_local_connections)
+
+# Función que difunde el cursor de lectura guardado (un evento por lector, no uno por mensaje)
+async def publish_read_cursor(donation_chat_id: int, reader_id: int, message_id: int):
+    await broadcast.publish(chat_channel(donation_chat_id), json.dumps({
+        "type": "read_cursor",
+        "donation_chat_id": donation_chat_id,
+        "reader_id": reader_id,
+        "message_id": message_id,
+    }))
+
+read_receipt_buffer.set_handler(publish_read_cursor)
+
+# Función que difunde los message_id asignados al guardar los mensajes enviados en vivo, para
+# que los clientes los usen en `since_message_id` y en las confirmaciones de lectura
+async def publish_message_ids(donation_chat_id: int, message_ids: list):
+    await broadcast.publish(chat_channel(donation_chat_id), json.dumps({
+        "type": "message_ids",
+        "donation_chat_id": donation_chat_id,
+        "ids": [
+            {"client_message_id": client_message_id, "message_id": message_id}
+            for client_message_id, message_id in message_ids
+        ],
+    }))
+
+chat_message_writer.set_handler(publish_message_ids)
+
+# Función para almacenar el mensaje en la base de datos: se agrega al próximo lote del
+# guardado diferido, que lo inserta junto con otros mensajes en un solo INSERT
 def save_message_to_db(message_data: dict):
+    chat_message_writer.add(message_data)
+    # Sin el contenido del mensaje: solo los IDs y su longitud
+    message_logger.debug(
+        "Mensaje del chat encolado para guardarlo",
+        extra={
+            "donation_chat_id": message_data["donation_chat_id"],
+            "sender_id": message_data["sender_id"],
+            "message_length": len(message_data["message_value"] or ""),
+        },
+    )
+
+# Función que consume una ficha de los límites del cliente por cada frame recibido.
+# Devuelve los segundos a esperar (0 si el frame se acepta).
+async def check_frame_rate(client: ChatClient) -> float:
+    connection_retry = await rate_limiter.hit(f"ws:connection:{client.connection_id}", *CHAT_WS_CONNECTION_BUDGET)
+    client_retry = await rate_limiter.hit(f"ws:{client.identity}", *CHAT_WS_CLIENT_BUDGET)
+    return max(connection_retry, client_retry)
+
+# ID con el que se reconoce un mensaje en vivo antes de tener message_id: el que envía el
+# cliente (hasta 36 caracteres, p. ej. un UUID) o uno asignado por el servidor
+def client_message_id_of(data: dict) -> str:
+    client_message_id = data.get("client_message_id")
+    if isinstance(client_message_id, str) and 0 < len(client_message_id) <= 36:
+        return client_message_id
+    return uuid.uuid4().hex
+
+# Función para reenviar los mensajes posteriores a `since_message_id` a un cliente que se reconecta.
+# El cliente ya está suscrito y retiene los mensajes en vivo, así no se pierde ninguno entre la
+# consulta y la suscripción; los que también aparecen en el historial no se envían dos veces.
+async def replay_missed_messages(client: ChatClient, since_message_id: int):
+    donation_chat_id = client.donation_chat_id
+    replayed = set()
     try:
-        # Log de depuración antes de intentar la inserción
-        print("Intentando guardar el mensaje en la base de datos...")
-        print(f"Datos del mensaje: {message_data}")
+        # Guardar antes los mensajes que aún esperan en el guardado diferido; flush() también
+        # espera al lote que se esté guardando en ese momento (ya fuera de la cola pendiente)
+        await chat_message_writer.flush()
 
-        # Ejecutar la inserción directamente
-        result = conn.execute(chat_messages.insert().values(message_data))
-        print(f"Resultado de la inserción: {result.rowcount} fila(s) afectada(s)")
+        query, _ = message_window_query(donation_chat_id, since_message_id, None, CHAT_REPLAY_LIMIT)
+        async with db_connection() as conn:
+            rows = (await conn.execute(query)).fetchall()
+        messages, has_more = split_message_window(rows, CHAT_REPLAY_LIMIT, False)
 
-        # Confirmar los cambios con commit si `conn` es una sesión
-        conn.commit()
-        print("Mensaje guardado correctamente en la base de datos")
+        for row in messages:
+            message_data = {
+                "message_id": row.message_id,
+                "donation_chat_id": row.donation_chat_id,
+                "sender_id": row.sender_id,
+                "receiver_id": row.receiver_id,
+                "message_value": row.message_value,
+                "sent_time": row.sent_time.strftime('%Y-%m-%d %H:%M:%S'),
+                "is_read": row.is_read,
+                "client_message_id": row.client_message_id,
+            }
+            if row.client_message_id:
+                replayed.add(row.client_message_id)
+            await asyncio.wait_for(
+                client.websocket.send_text(json.dumps(message_data, default=str)), timeout=CHAT_SEND_TIMEOUT
+            )
 
+        if has_more:
+            # Faltan mensajes: el cliente pide el resto con GET /get_donation_chat_messages/{id}?after=...
+            await asyncio.wait_for(client.websocket.send_text(json.dumps({
+                "type": "history_truncated",
+                "after": messages[-1].message_id,
+            })), timeout=CHAT_SEND_TIMEOUT)
     except SQLAlchemyError as e:
-        print("Error al intentar guardar el mensaje en la base de datos.")
-        print(f"Detalles del error: {e}")
-        conn.rollback()  # Revertir en caso de error
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error al guardar el mensaje en la base de datos: {str(e)}"
-        ) from e
+        logger.error("Error al reenviar el historial del chat %s: %s", donation_chat_id, e)
+    except (asyncio.TimeoutError, WebSocketDisconnect) as e:
+        # Cliente lento o desconectado durante el reenvío: se cierra como en el envío en vivo
+        logger.warning("No se pudo reenviar el historial al cliente del chat %s: %r", donation_chat_id, e)
+        await client.close(SLOW_CLIENT_CLOSE_CODE)
+    finally:
+        if not client.closed:
+            await client.release(replayed)
 
 @chat_websocket_router.websocket("/ws/chat/{donation_chat_id}")
-async def websocket_endpoint(websocket: WebSocket, donation_chat_id: int):
-    print(f"Intentando conectar al chat con ID: {donation_chat_id}")
-    await connect_to_chat(websocket, donation_chat_id)
-    print(f"Cliente conectado al chat con ID: {donation_chat_id}")
+async def websocket_endpoint(websocket: WebSocket, donation_chat_id: int, since_message_id: Optional[int] = None):
+    client = await connect_to_chat(websocket, donation_chat_id, hold=since_message_id is not None)
+    logger.info("Cliente conectado al chat %s", donation_chat_id, extra={"connection_id": client.connection_id})
     try:
+        # Reconexión: enviar solo los mensajes que el cliente no recibió
+        if since_message_id is not None:
+            await replay_missed_messages(client, since_message_id)
+            if client.closed:
+                return
+
         while True:
             data = await websocket.receive_json()
-            print(f"Mensaje recibido: {data}")
+
+            # Límite de frames: se descarta el frame y se avisa; si insiste, se cierra el socket
+            retry_after = await check_frame_rate(client)
+            if retry_after > 0:
+                client.rate_violations += 1
+                if client.rate_violations > CHAT_WS_MAX_VIOLATIONS:
+                    logger.warning(
+                        "Cliente del chat %s desconectado por exceder el límite de mensajes",
+                        donation_chat_id,
+                        extra={"client": client.identity},
+                    )
+                    await client.close(RATE_LIMIT_CLOSE_CODE)
+                    break
+                await client.send(json.dumps({"type": "rate_limited", "retry_after": round(retry_after, 2)}))
+                continue
+            client.rate_violations = 0
+
+            # Confirmación de lectura: {"type": "read", "reader_id": ..., "message_id": ...}, o con
+            # "client_message_id" para un mensaje recibido en vivo cuyo message_id aún no llegó
+            if data.get("type") == "read":
+                try:
+                    if data.get("message_id") is None and isinstance(data.get("client_message_id"), str):
+                        read_receipt_buffer.add_client_message(
+                            donation_chat_id, int(data["reader_id"]), data["client_message_id"]
+                        )
+                    else:
+                        read_receipt_buffer.add(donation_chat_id, int(data["reader_id"]), int(data["message_id"]))
+                except (KeyError, TypeError, ValueError):
+                    logger.warning("Confirmación de lectura inválida en el chat %s", donation_chat_id)
+                continue
+
             colombia_tz = pytz.timezone("America/Bogota")
             sent_time = data.get("sent_time") or datetime.now(colombia_tz)
 
-            # Quitar la zona horaria y formatear el datetime para la base de datos
-            sent_time_naive = sent_time.replace(tzinfo=None)
-            formatted_sent_time = sent_time_naive.strftime('%Y-%m-%d %H:%M:%S')
+            # Quitar la zona horaria y los microsegundos: se guarda como datetime (válido en
+            # cualquier motor) y se difunde como "YYYY-MM-DD HH:MM:SS" (json.dumps con default=str)
+            sent_time_naive = sent_time.replace(tzinfo=None, microsecond=0)
 
             message_data = {
                 "donation_chat_id": donation_chat_id,
                 "sender_id": data.get("sender_id"),
                 "receiver_id": data.get("receiver_id"),
                 "message_value": data.get("message_value"),
-                "sent_time": formatted_sent_time,  # Formato sin zona horaria
-                "is_read": False
+                "sent_time": sent_time_naive,  # Sin zona horaria
+                "is_read": False,
+                # Los clientes reciben el message_id de este ID en un evento `message_ids` al guardarse
+                "client_message_id": client_message_id_of(data),
             }
             
-            # Guardar el mensaje en la base de datos
-            print("llamando a save_message_to_db")
+            # Encolar el mensaje para guardarlo en lote y difundirlo de inmediato
             save_message_to_db(message_data)
-            print("Mensaje guardado en la base de datos")
 
             # Enviar el mensaje a todos los clientes conectados al chat
             await send_message_to_chat(donation_chat_id, message_data)
-            print("Mensaje enviado a los clientes conectados")
 
     except WebSocketDisconnect:
-        print(f"Cliente desconectado del chat con ID: {donation_chat_id}")
-        await disconnect_from_chat(websocket, donation_chat_id)
\ No newline at end of file
+        logger.info("Cliente desconectado del chat %s", donation_chat_id, extra={"connection_id": client.connection_id})
+    finally:
+        # Detener la tarea de envío y sacar al cliente del chat en cualquier caso
+        await client.close()
\ No newline at end of file
@@ -1,98 +1,240 @@
 # routes/donation.py
 
-from fastapi import APIRouter, HTTPException, status
-from config.db import conn
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status
+from config.db import DBConnection, get_conn
 from models.donation import donations
 from models.user import users
 from models.donated_food import donated_foods
 from schemas.donation import DonationCreate, DonationStatusUpdate
+from sqlalchemy import select, text
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
+from typing import List, Optional
+from utils.pagination import CursorParam, LimitParam, paginate_query, split_page
+from utils.rollups import add_donations_to_rollups, move_donation_in_rollups
+from utils.statistics_cache import (
+    record_donation_created,
+    record_donation_status_changed,
+    record_donations_created,
+)
 
 
 # Crear el router para las donaciones
 donation_router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+def build_donation_row(donation: DonationCreate, created_at: datetime) -> dict:
+    return {
+        "donor_id": donation.donor_id,
+        "receiver_id": donation.receiver_id,
+        "description": donation.description,
+        "status": donation.status or "pendiente",  # Asignar un estado predeterminado si no se proporciona
+        "created_at": created_at
+    }
+
+def build_donated_food_rows(donation_id: int, donation: DonationCreate) -> list:
+    return [
+        {
+            "donation_id": donation_id,
+            "category": food.category,
+            "quantity": food.quantity,
+            "unit_of_measure": food.unit_of_measure,
+            "expiration_date": food.expiration_date
+        }
+        for food in donation.donated_foods
+    ]
+
+async def insert_donations(conn: DBConnection, new_donations: list) -> list:
+    """
+    Insertar varias donaciones con una sola sentencia y devolver sus IDs en el mismo orden.
+    """
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        # El motor puede devolver los IDs generados (MariaDB, SQLite, PostgreSQL)
+        result = await conn.execute(
+            donations.insert().returning(donations.c.donation_id, sort_by_parameter_order=True),
+            new_donations,
+        )
+        return list(result.scalars().all())
+
+    # MySQL no soporta RETURNING: InnoDB reserva de una vez los IDs de un INSERT simple
+    # de varias filas a partir de `lastrowid` (el de la primera fila), avanzando de a
+    # `auto_increment_increment` (mayor a 1 en configuraciones multi-primario o Galera)
+    result = await conn.execute(donations.insert().values(new_donations))
+    first_id = result.lastrowid
+    step = (await conn.execute(text("SELECT @@auto_increment_increment"))).scalar() or 1
+    donation_ids = list(range(first_id, first_id + step * len(new_donations), step))
+
+    # Comprobar dentro de la transacción que esos IDs son las filas recién insertadas antes
+    # de usarlos para los alimentos: si no coinciden se cancela todo en lugar de guardar
+    # alimentos bajo otra donación
+    inserted = (await conn.execute(
+        select(donations.c.donation_id, donations.c.donor_id, donations.c.receiver_id, donations.c.description)
+        .where(donations.c.donation_id.in_(donation_ids))
+        .order_by(donations.c.donation_id)
+    )).fetchall()
+    expected = [
+        (donation_id, row["donor_id"], row["receiver_id"], row["description"])
+        for donation_id, row in zip(donation_ids, new_donations)
+    ]
+    if [tuple(row) for row in inserted] != expected:
+        logger.error(
+            "Los IDs de las donaciones en lote no son los esperados",
+            extra={"first_id": first_id, "step": step, "count": len(new_donations)},
+        )
+        await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se pudieron identificar las donaciones creadas; no se guardó ninguna"
+        )
+    return donation_ids
+
 @donation_router.post('/create_donation')
-def create_donation(donation: DonationCreate):
+async def create_donation(donation: DonationCreate, conn: DBConnection = Depends(get_conn)):
     """
     Crear una nueva donación con sus alimentos donados.
     """
     try:
-        print("Datos de la donación recibidos:", donation.dict())  # Depuración
-
-        # 1. Insertar la donación en la tabla `donation`
-        new_donation = {
-            "donor_id": donation.donor_id,
-            "receiver_id": donation.receiver_id,
-            "description": donation.description,
-            "status": donation.status or "pendiente",  # Asignar un estado predeterminado si no se proporciona
-            "created_at": datetime.now()  # Agregar la fecha y hora actuales
-        }
-        result = conn.execute(donations.insert().values(new_donation))
+        # 1. Insertar la donación en la tabla `donation` con la fecha y hora actuales
+        new_donation = build_donation_row(donation, datetime.now())
+        result = await conn.execute(donations.insert().values(new_donation))
 
         # Obtener el ID de la donación recién creada
         donation_id = result.inserted_primary_key[0]
 
-        # 2. Insertar los alimentos donados en la tabla `donated_food`
-        for food in donation.donated_foods:
-            new_donated_food = {
-                "donation_id": donation_id,
-                "category": food.category,
-                "quantity": food.quantity,
-                "unit_of_measure": food.unit_of_measure,
-                "expiration_date": food.expiration_date
-            }
-            conn.execute(donated_foods.insert().values(new_donated_food))
+        # 2. Insertar todos los alimentos donados con una sola sentencia (executemany)
+        new_donated_foods = build_donated_food_rows(donation_id, donation)
+        if new_donated_foods:
+            await conn.execute(donated_foods.insert(), new_donated_foods)
 
-        # Confirmar los cambios con un solo commit al final
-        conn.commit()
+        # 3. Sumar la donación a los resúmenes mensuales en la misma transacción
+        await add_donations_to_rollups(conn, [(new_donation, new_donated_foods)])
 
-        return {"message": "Donación creada exitosamente", "donation_id": donation_id}
+        # Confirmar los cambios con un solo commit al final
+        await conn.commit()
 
     except SQLAlchemyError as e:
-        print("Error al crear la donación:", str(e))  # Imprime el error en los logs para depuración
+        logger.error("Error al crear la donación: %s", e)
+        await conn.rollback()  # Ninguna fila de la donación queda guardada a medias
         # Manejar errores y lanzar excepción HTTP
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al crear la donación y los alimentos donados: {str(e)}"
         ) from e
 
+    # Actualizar las estadísticas en caché con la nueva donación (ya está confirmada:
+    # si falla, solo se invalida la caché)
+    await record_donation_created(conn, new_donation, new_donated_foods)
+
+    logger.info(
+        "Donación %s creada",
+        donation_id,
+        extra={"donor_id": donation.donor_id, "foods_count": len(new_donated_foods)},
+    )
+    return {"message": "Donación creada exitosamente", "donation_id": donation_id}
+
+@donation_router.post('/create_donations_bulk')
+async def create_donations_bulk(donations_payload: List[DonationCreate], conn: DBConnection = Depends(get_conn)):
+    """
+    Crear varias donaciones con sus alimentos en una sola transacción y con un número
+    fijo de sentencias (una para las donaciones y otra para todos los alimentos).
+    """
+    if not donations_payload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debe enviar al menos una donación"
+        )
+
+    try:
+        # 1. Insertar todas las donaciones con la misma fecha de creación
+        created_at = datetime.now()
+        new_donations = [build_donation_row(donation, created_at) for donation in donations_payload]
+        donation_ids = await insert_donations(conn, new_donations)
+
+        # 2. Insertar los alimentos de todas las donaciones con una sola sentencia
+        food_rows_by_donation = [
+            build_donated_food_rows(donation_id, donation)
+            for donation_id, donation in zip(donation_ids, donations_payload)
+        ]
+        new_donated_foods = [food_row for food_rows in food_rows_by_donation for food_row in food_rows]
+        if new_donated_foods:
+            await conn.execute(donated_foods.insert(), new_donated_foods)
+
+        # 3. Sumar las donaciones a los resúmenes mensuales con un upsert por tabla
+        await add_donations_to_rollups(conn, list(zip(new_donations, food_rows_by_donation)))
+
+        await conn.commit()
+
+    except SQLAlchemyError as e:
+        logger.error("Error al crear las donaciones en lote: %s", e)
+        await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al crear las donaciones y los alimentos donados: {str(e)}"
+        ) from e
+
+    # Actualizar las estadísticas en caché con todas las donaciones
+    await record_donations_created(conn, new_donations, new_donated_foods)
+
+    return {"message": "Donaciones creadas exitosamente", "donation_ids": donation_ids}
+
         
+async def fetch_donated_foods_by_donation(conn: DBConnection, donation_ids: list) -> dict:
+    """
+    Obtener los alimentos donados de varias donaciones en una sola consulta,
+    agrupados por `donation_id`.
+    """
+    foods_by_donation = {donation_id: [] for donation_id in donation_ids}
+    if not donation_ids:
+        return foods_by_donation
+
+    donated_food_query = donated_foods.select().where(donated_foods.c.donation_id.in_(donation_ids))
+    for food in (await conn.execute(donated_food_query)).fetchall():
+        food_data = dict(food._mapping)
+        foods_by_donation[food_data["donation_id"]].append(food_data)
+
+    return foods_by_donation
+
 @donation_router.get('/get_received_donations/{user_id}')
-def get_received_donations(user_id: int):
+async def get_received_donations(
+    user_id: int,
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    conn: DBConnection = Depends(get_conn),
+):
     """
     Obtener todas las donaciones recibidas por un usuario específico (charity).
+    Con `limit` se pagina por `donation_id` y se devuelve `next_cursor`.
     """
     try:
         # 1. Obtener las donaciones donde receiver_id es igual al user_id
         donation_query = donations.select().where(donations.c.receiver_id == user_id)
-        donation_results = conn.execute(donation_query).fetchall()
+        donation_query = paginate_query(donation_query, [donations.c.donation_id], limit, cursor)
+        donation_results, next_cursor = split_page(
+            (await conn.execute(donation_query)).fetchall(), limit, ["donation_id"]
+        )
+
+        # Al paginar, una página vacía (p. ej. tras el último cursor) mantiene la forma de las demás
+        if not donation_results and (limit or cursor):
+            return {"donations": [], "next_cursor": None}
 
         # Verificar si no hay donaciones recibidas
         if not donation_results:
             return {"donations": [], "message": "No se encontraron donaciones para este usuario"}
 
-        # 2. Preparar una lista para almacenar los resultados
-        received_donations = []
-
-        # 3. Iterar sobre cada donación recibida
-        for donation in donation_results:
-            donation_data = dict(donation._mapping)
-
-            # 4. Obtener los alimentos donados relacionados con esta donación
-            donated_food_query = donated_foods.select().where(donated_foods.c.donation_id == donation_data["donation_id"])
-            donated_food_results = conn.execute(donated_food_query).fetchall()
+        # 2. Obtener los alimentos donados de todas las donaciones en una sola consulta
+        received_donations = [dict(donation._mapping) for donation in donation_results]
+        foods_by_donation = await fetch_donated_foods_by_donation(
+            conn, [donation_data["donation_id"] for donation_data in received_donations]
+        )
 
-            # Convertir los alimentos donados en una lista de diccionarios
-            donated_food_list = [dict(food._mapping) for food in donated_food_results]
-
-            # 5. Agregar la lista de alimentos donados a la donación
-            donation_data["donated_foods"] = donated_food_list
-
-            # 6. Agregar la donación completa a la lista de resultados
-            received_donations.append(donation_data)
+        # 3. Agregar la lista de alimentos donados a cada donación
+        for donation_data in received_donations:
+            donation_data["donated_foods"] = foods_by_donation[donation_data["donation_id"]]
 
+        if limit:
+            return {"donations": received_donations, "next_cursor": next_cursor}
         return {"donations": received_donations}
 
     except SQLAlchemyError as e:
@@ -104,49 +246,58 @@ def get_received_donations(user_id: int):
         
 
 @donation_router.get('/get_my_donations/{user_id}')
-def get_my_donations(user_id: int):
+async def get_my_donations(
+    user_id: int,
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    conn: DBConnection = Depends(get_conn),
+):
     """
     Obtener todas las donaciones realizadas por un usuario específico, incluyendo el detalle de la organización benéfica a la que donó.
+    Con `limit` se pagina por `donation_id` y se devuelve `next_cursor`.
     """
     try:
         # 1. Obtener las donaciones realizadas por el usuario donde donor_id es igual al user_id
         donation_query = donations.select().where(donations.c.donor_id == user_id)
-        donation_results = conn.execute(donation_query).fetchall()
+        donation_query = paginate_query(donation_query, [donations.c.donation_id], limit, cursor)
+        donation_results, next_cursor = split_page(
+            (await conn.execute(donation_query)).fetchall(), limit, ["donation_id"]
+        )
+
+        # Una página vacía tras un cursor no es un error
+        if not donation_results and cursor:
+            return {"data": [], "next_cursor": None}
 
         if not donation_results:
             raise HTTPException(
                 status_code=404, detail="No se encontraron donaciones realizadas por este usuario"
             )
 
-        # 2. Preparar una lista para almacenar los resultados
-        user_donations = []
-
-        # 3. Iterar sobre cada donación realizada
-        for donation in donation_results:
-            donation_data = dict(donation._mapping)
-
-            # 4. Obtener los detalles de la organización benéfica (charity) a la que se realizó la donación
-            charity_query = users.select().where(users.c.user_id == donation_data["receiver_id"], users.c.role == "charity")
-            charity_result = conn.execute(charity_query).fetchone()
-
-            if charity_result:
-                charity_data = dict(charity_result._mapping)
-                donation_data["charity_name"] = charity_data["name"]
-                donation_data["charity_address"] = charity_data["address"]
+        user_donations = [dict(donation._mapping) for donation in donation_results]
 
-            # 5. Obtener los alimentos donados relacionados con esta donación
-            donated_food_query = donated_foods.select().where(donated_foods.c.donation_id == donation_data["donation_id"])
-            donated_food_results = conn.execute(donated_food_query).fetchall()
+        # 2. Obtener todas las organizaciones benéficas (charity) receptoras en una sola consulta
+        receiver_ids = {donation_data["receiver_id"] for donation_data in user_donations}
+        charity_query = users.select().where(users.c.user_id.in_(receiver_ids), users.c.role == "charity")
+        charities = {
+            charity.user_id: charity for charity in (await conn.execute(charity_query)).fetchall()
+        }
 
-            # Convertir los alimentos donados en una lista de diccionarios
-            donated_food_list = [dict(food._mapping) for food in donated_food_results]
+        # 3. Obtener los alimentos donados de todas las donaciones en una sola consulta
+        foods_by_donation = await fetch_donated_foods_by_donation(
+            conn, [donation_data["donation_id"] for donation_data in user_donations]
+        )
 
-            # 6. Agregar la lista de alimentos donados a la donación
-            donation_data["donated_foods"] = donated_food_list
+        # 4. Armar cada donación con los datos de la charity y sus alimentos donados
+        for donation_data in user_donations:
+            charity = charities.get(donation_data["receiver_id"])
+            if charity:
+                donation_data["charity_name"] = charity.name
+                donation_data["charity_address"] = charity.address
 
-            # 7. Agregar la donación completa a la lista de resultados
-            user_donations.append(donation_data)
+            donation_data["donated_foods"] = foods_by_donation[donation_data["donation_id"]]
 
+        if limit:
+            return {"data": user_donations, "next_cursor": next_cursor}
         return user_donations
 
     except SQLAlchemyError as e:
@@ -156,14 +307,15 @@ def get_my_donations(user_id: int):
         ) from e
 
 @donation_router.put('/update_donation_status/{donation_id}')
-def update_donation_status(donation_id: int, donation_update: DonationStatusUpdate):
+async def update_donation_status(donation_id: int, donation_update: DonationStatusUpdate, conn: DBConnection = Depends(get_conn)):
     """
     Actualizar el estado de una donación específica.
     """
     try:
-        # Verificar si la donación existe
-        donation_query = donations.select().where(donations.c.donation_id == donation_id)
-        donation = conn.execute(donation_query).fetchone()
+        # Verificar si la donación existe (bloqueándola hasta el commit para que el
+        # resumen mensual reste el estado anterior correcto)
+        donation_query = donations.select().where(donations.c.donation_id == donation_id).with_for_update()
+        donation = (await conn.execute(donation_query)).fetchone()
 
         if not donation:
             raise HTTPException(
@@ -173,14 +325,19 @@ def update_donation_status(donation_id: int, donation_update: DonationStatusUpda
 
         # Actualizar el estado de la donación
         update_query = donations.update().where(donations.c.donation_id == donation_id).values(status=donation_update.status)
-        conn.execute(update_query)
-        conn.commit()
-
-        return {"message": "Estado de la donación actualizado exitosamente"}
+        await conn.execute(update_query)
+        await move_donation_in_rollups(conn, dict(donation._mapping), donation_update.status)
+        await conn.commit()
 
     except SQLAlchemyError as e:
-        print("Error al actualizar el estado de la donación:", str(e))
+        logger.error("Error al actualizar el estado de la donación %s: %s", donation_id, e)
+        await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al actualizar el estado de la donación"
-        ) from e
\ No newline at end of file
+        ) from e
+
+    # Mover la donación al nuevo estado en las estadísticas en caché
+    await record_donation_status_changed(conn, dict(donation._mapping), donation_update.status)
+
+    return {"message": "Estado de la donación actualizado exitosamente"}
\ No newline at end of file
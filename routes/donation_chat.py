@@ -1,32 +1,44 @@
 # routes/donation_chat.py
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_, case, false, func, or_, select
 from sqlalchemy.exc import SQLAlchemyError
-from config.db import conn
+from config.db import DBConnection, get_conn
 from models.donation_chat import donation_chats
 from schemas.donation_chat import DonationChatCreate
 from models.chat_message import chat_messages
-from schemas.chat_message import ChatMessageCreate
+from schemas.chat_message import ChatMessageCreate, ChatReadReceipt
 from models.donation import donations
 from datetime import datetime
+from typing import Optional
+from utils.pagination import MAX_PAGE_SIZE, CursorParam, LimitParam, paginate_query, split_page
+from utils.read_receipts import read_receipt_buffer
+from utils.responses import rows_response
 import logging
 import pytz
 
 donation_chat_router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Columnas de cada mensaje en las respuestas de la API
+MESSAGE_COLUMNS = [
+    "message_id", "donation_chat_id", "sender_id", "receiver_id", "message_value", "sent_time", "client_message_id",
+]
+
 @donation_chat_router.post('/create_donation_chat')
-def create_donation_chat(donation_chat: DonationChatCreate):
+async def create_donation_chat(donation_chat: DonationChatCreate, conn: DBConnection = Depends(get_conn)):
     """
     Crear un nuevo chat de donación, si no existe ya uno con los mismos donation_id y creator_id.
     """
     try:
         # Verificar si ya existe un chat de donación con el mismo donation_id y creator_id
-        existing_chat = conn.execute(
+        existing_chat = (await conn.execute(
             donation_chats.select()
             .where(
                 donation_chats.c.donation_id == donation_chat.donation_id,
                 donation_chats.c.creator_id == donation_chat.creator_id
             )
-        ).fetchone()
+        )).fetchone()
 
         if existing_chat:
             return {"message": "El chat de donación ya existe", "donation_chat_id": existing_chat.donation_chat_id}
@@ -42,8 +54,8 @@ def create_donation_chat(donation_chat: DonationChatCreate):
             "creator_id": donation_chat.creator_id,
             "created_at": sent_time
         }
-        result = conn.execute(donation_chats.insert().values(new_chat))
-        conn.commit()
+        result = await conn.execute(donation_chats.insert().values(new_chat))
+        await conn.commit()
 
         # Obtener el ID del chat recién creado
         donation_chat_id = result.lastrowid
@@ -58,7 +70,7 @@ def create_donation_chat(donation_chat: DonationChatCreate):
         ) from e
 
 @donation_chat_router.get('/get_donation_chat/')
-def get_donation_chat(donation_id: int = None, donation_chat_id: int = None):
+async def get_donation_chat(donation_id: int = None, donation_chat_id: int = None, conn: DBConnection = Depends(get_conn)):
     """
     Obtener un chat de donación por `donation_chat_id` o `donation_id`.
     """
@@ -75,7 +87,7 @@ def get_donation_chat(donation_id: int = None, donation_chat_id: int = None):
                 detail="Debe proporcionar `donation_chat_id` o `donation_id` para la consulta"
             )
 
-        donation_chat_result = conn.execute(query).fetchone()
+        donation_chat_result = (await conn.execute(query)).fetchone()
 
         if donation_chat_result is None:
             raise HTTPException(
@@ -95,15 +107,15 @@ def get_donation_chat(donation_id: int = None, donation_chat_id: int = None):
 
         
 @donation_chat_router.post('/create_chat_message')
-def create_chat_message(chat_message: ChatMessageCreate):
+async def create_chat_message(chat_message: ChatMessageCreate, conn: DBConnection = Depends(get_conn)):
     """
     Crear un mensaje de chat, verificando que el chat de donación exista.
     """
     try:
         # Verificar si el chat de donación existe en la tabla `donation_chat`
-        donation_chat = conn.execute(
+        donation_chat = (await conn.execute(
             donation_chats.select().where(donation_chats.c.donation_chat_id == chat_message.donation_chat_id)
-        ).fetchone()
+        )).fetchone()
 
         if not donation_chat:
             raise HTTPException(
@@ -127,14 +139,14 @@ def create_chat_message(chat_message: ChatMessageCreate):
             "message_value": chat_message.message_value,
             "sent_time": sent_time
         }
-        result = conn.execute(chat_messages.insert().values(new_message))
-        conn.commit()  # Confirmar la transacción
+        result = await conn.execute(chat_messages.insert().values(new_message))
+        await conn.commit()  # Confirmar la transacción
 
         # Devolver la respuesta con el ID del mensaje recién creado
         return {"message": "Mensaje de chat creado exitosamente", "chat_message_id": result.lastrowid}
 
     except SQLAlchemyError as e:
-        logging.error(f"Error al crear el mensaje de chat: {str(e)}")
+        logger.error("Error al crear el mensaje de chat: %s", e)
         # Manejar errores y lanzar excepción HTTP
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -143,35 +155,96 @@ def create_chat_message(chat_message: ChatMessageCreate):
 
 
 
+@donation_chat_router.post('/mark_messages_read/{donation_chat_id}', status_code=status.HTTP_202_ACCEPTED)
+async def mark_messages_read(donation_chat_id: int, receipt: ChatReadReceipt):
+    """
+    Marcar como leídos los mensajes recibidos por `receiver_id` hasta `message_id` (o hasta
+    el mensaje `client_message_id`, si se recibió en vivo y aún no se conoce su message_id).
+    Las confirmaciones se agrupan y se guardan en segundo plano con un UPDATE por rango;
+    los clientes del chat reciben un evento `read_cursor` cuando quedan guardadas.
+    """
+    if receipt.message_id is not None:
+        read_receipt_buffer.add(donation_chat_id, receipt.receiver_id, receipt.message_id)
+    elif receipt.client_message_id:
+        read_receipt_buffer.add_client_message(donation_chat_id, receipt.receiver_id, receipt.client_message_id)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Debe proporcionar `message_id` o `client_message_id`"
+        )
+    return {"message": "Confirmación de lectura registrada"}
+
+def message_window_query(donation_chat_id: int, after: Optional[int], before: Optional[int], limit: int):
+    """
+    Mensajes de un chat con `message_id` entre `after` y `before` (exclusivos), en orden
+    de message_id y con una fila extra para saber si hay más. Con solo `before` se toman
+    los más cercanos a `before` (para desplazarse hacia atrás), en orden descendente.
+    """
+    query = chat_messages.select().where(chat_messages.c.donation_chat_id == donation_chat_id)
+    if after is not None:
+        query = query.where(chat_messages.c.message_id > after)
+    if before is not None:
+        query = query.where(chat_messages.c.message_id < before)
+    newest_first = after is None and before is not None
+    query = query.order_by(chat_messages.c.message_id.desc() if newest_first else chat_messages.c.message_id)
+    return query.limit(limit + 1), newest_first
+
+def split_message_window(rows: list, limit: int, newest_first: bool):
+    # Recortar la fila extra y devolver siempre los mensajes en orden ascendente
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return (rows[::-1] if newest_first else rows), has_more
+
 @donation_chat_router.get('/get_donation_chat_messages/{donation_chat_id}')
-def get_donation_chat_messages(donation_chat_id: int):
+async def get_donation_chat_messages(
+    donation_chat_id: int,
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    after: Optional[int] = Query(None, description="Solo mensajes con message_id mayor a este"),
+    before: Optional[int] = Query(None, description="Solo mensajes con message_id menor a este"),
+    conn: DBConnection = Depends(get_conn),
+):
     """
-    Obtener todos los mensajes de un chat de donación específico.
+    Obtener todos los mensajes de un chat de donación específico, ordenados.
+    Con `limit` se pagina por (`sent_time`, `message_id`) y se devuelve `next_cursor`.
+    Con `after`/`before` se devuelve solo esa ventana de message_id (como máximo `limit`
+    mensajes) y `has_more`, para sincronizar sin volver a descargar todo el chat.
     """
+    if (after is not None or before is not None) and cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="`cursor` no se puede combinar con `after` ni `before`"
+        )
+
     try:
+        # Ventana por message_id (usa el índice (donation_chat_id, message_id))
+        if after is not None or before is not None:
+            window_limit = limit or MAX_PAGE_SIZE
+            query, newest_first = message_window_query(donation_chat_id, after, before, window_limit)
+            rows = (await conn.execute(query)).fetchall()
+            messages, has_more = split_message_window(rows, window_limit, newest_first)
+            return {
+                "data": [{column: row._mapping[column] for column in MESSAGE_COLUMNS} for row in messages],
+                "has_more": has_more,
+            }
+
         # Consultar los mensajes del chat de donación especificado
         query = chat_messages.select().where(chat_messages.c.donation_chat_id == donation_chat_id)
-        result = conn.execute(query)
-        messages = result.fetchall()
+        query = paginate_query(query, [chat_messages.c.sent_time, chat_messages.c.message_id], limit, cursor)
+        if not limit and not cursor:
+            query = query.order_by(chat_messages.c.sent_time, chat_messages.c.message_id)
+        result = await conn.execute(query)
+        messages, next_cursor = split_page(result.fetchall(), limit, ["sent_time", "message_id"])
 
-        # Convertir los resultados en un formato serializable
-        messages_data = [
-            {
-                "message_id": row.message_id,
-                "donation_chat_id": row.donation_chat_id,
-                "sender_id": row.sender_id,
-                "receiver_id": row.receiver_id,
-                "message_value": row.message_value,
-                "sent_time": row.sent_time
-            }
-            for row in messages
-        ]
+        # Respuesta paginada solo si el cliente la pidió; las filas se serializan directamente
+        if limit:
+            return rows_response(messages, MESSAGE_COLUMNS, paginated=True, next_cursor=next_cursor)
 
         # Verificar si se encontraron mensajes
-        if not messages_data:
+        if not messages:
             return {"message": "No hay mensajes disponibles para este chat de donación"}
 
-        return messages_data
+        return rows_response(messages, MESSAGE_COLUMNS)
 
     except SQLAlchemyError as e:
         # Manejar errores de la base de datos y lanzar excepción HTTP
@@ -180,37 +253,24 @@ def get_donation_chat_messages(donation_chat_id: int):
             detail=f"Error al obtener los mensajes del chat de donación: {str(e)}"
         ) from e
 
+def user_chats_query(user_id: int, *extra_columns):
+    # Chats de las donaciones donde el usuario es donante o receptor, con un solo JOIN
+    return (
+        select(donation_chats, donations.c.donor_id, donations.c.receiver_id, *extra_columns)
+        .select_from(donation_chats.join(donations, donation_chats.c.donation_id == donations.c.donation_id))
+        .where(or_(donations.c.donor_id == user_id, donations.c.receiver_id == user_id))
+    )
+
 @donation_chat_router.get('/get_user_related_chats/{user_id}')
-def get_user_related_chats(user_id: int):
+async def get_user_related_chats(user_id: int, conn: DBConnection = Depends(get_conn)):
     """
     Obtener todos los chats relacionados con un usuario específico,
     donde el usuario sea el `donor` o `receiver` en la donación.
     """
     try:
-        # Consultar todas las donaciones en las que el usuario es donante o receptor
-        donation_query = donations.select().where(
-            (donations.c.donor_id == user_id) | (donations.c.receiver_id == user_id)
-        )
-        donations_list = conn.execute(donation_query).fetchall()
-
-        # Lista para almacenar chats relacionados
-        user_chats = []
-
-        # Procesar cada donación para obtener el chat de donación, si existe
-        for donation in donations_list:
-            donation_data = dict(donation._mapping)
-
-            # Obtener el chat de donación para esta donación si existe
-            chat_query = donation_chats.select().where(donation_chats.c.donation_id == donation_data["donation_id"])
-            chat = conn.execute(chat_query).fetchone()
-
-            if chat:
-                chat_data = dict(chat._mapping)
-                chat_data["donor_id"] = donation_data["donor_id"]
-                chat_data["receiver_id"] = donation_data["receiver_id"]
-
-                # Agregar el chat a la lista de chats relacionados
-                user_chats.append(chat_data)
+        # Consultar los chats y los datos de su donación en una sola consulta
+        chats = (await conn.execute(user_chats_query(user_id))).fetchall()
+        user_chats = [dict(chat._mapping) for chat in chats]
 
         # Devolver los chats relacionados o un mensaje si no hay chats
         if not user_chats:
@@ -219,12 +279,80 @@ def get_user_related_chats(user_id: int):
         return {"chats": user_chats}
 
     except SQLAlchemyError as e:
-        logging.error(f"Error al obtener los chats relacionados del usuario: {str(e)}")
+        logger.error("Error al obtener los chats relacionados del usuario: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener los chats relacionados del usuario"
         ) from e
 
+@donation_chat_router.get('/get_user_inbox/{user_id}')
+async def get_user_inbox(user_id: int, conn: DBConnection = Depends(get_conn)):
+    """
+    Obtener la bandeja de entrada del usuario: cada chat con su último mensaje y la
+    cantidad de mensajes no leídos por el usuario, todo en una sola consulta.
+    """
+    try:
+        # Agregado por chat (solo de los chats del usuario): último mensaje y no leídos
+        user_chat_ids = user_chats_query(user_id).with_only_columns(donation_chats.c.donation_chat_id)
+        message_stats = (
+            select(
+                chat_messages.c.donation_chat_id,
+                func.max(chat_messages.c.message_id).label("last_message_id"),
+                func.sum(
+                    case(
+                        (and_(chat_messages.c.receiver_id == user_id, chat_messages.c.is_read == false()), 1),
+                        else_=0,
+                    )
+                ).label("unread_count"),
+            )
+            .where(chat_messages.c.donation_chat_id.in_(user_chat_ids))
+            .group_by(chat_messages.c.donation_chat_id)
+            .subquery("message_stats")
+        )
+        last_message = chat_messages.alias("last_message")
+
+        query = (
+            user_chats_query(
+                user_id,
+                func.coalesce(message_stats.c.unread_count, 0).label("unread_count"),
+                last_message.c.message_id.label("last_message_id"),
+                last_message.c.sender_id.label("last_message_sender_id"),
+                last_message.c.message_value.label("last_message_value"),
+                last_message.c.sent_time.label("last_message_sent_time"),
+            )
+            .outerjoin(message_stats, message_stats.c.donation_chat_id == donation_chats.c.donation_chat_id)
+            .outerjoin(last_message, last_message.c.message_id == message_stats.c.last_message_id)
+            .order_by(func.coalesce(last_message.c.sent_time, donation_chats.c.created_at).desc())
+        )
+        rows = (await conn.execute(query)).fetchall()
 
+        # Armar cada chat con su último mensaje anidado
+        inbox = []
+        for row in rows:
+            chat_data = {
+                "donation_chat_id": row.donation_chat_id,
+                "donation_id": row.donation_id,
+                "creator_id": row.creator_id,
+                "created_at": row.created_at,
+                "donor_id": row.donor_id,
+                "receiver_id": row.receiver_id,
+                "unread_count": int(row.unread_count),
+                "last_message": None,
+            }
+            if row.last_message_id is not None:
+                chat_data["last_message"] = {
+                    "message_id": row.last_message_id,
+                    "sender_id": row.last_message_sender_id,
+                    "message_value": row.last_message_value,
+                    "sent_time": row.last_message_sent_time,
+                }
+            inbox.append(chat_data)
 
+        return {"chats": inbox}
 
+    except SQLAlchemyError as e:
+        logger.error("Error al obtener la bandeja de entrada del usuario: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener la bandeja de entrada del usuario"
+        ) from e
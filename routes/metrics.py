@@ -0,0 +1,15 @@
+# routes/metrics.py
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import metrics_registry
+
+metrics_router = APIRouter()
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Métricas de este worker en formato de texto de Prometheus.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
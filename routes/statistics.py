@@ -1,39 +1,152 @@
 # routes/statistics.py
 
-from fastapi import APIRouter, HTTPException, status
-from config.db import conn
-from models.donation import donations
-from models.donated_food import donated_foods
-from models.user import users
-from sqlalchemy import select, func, text
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status
+from config.db import DBConnection, get_read_conn
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import Query
 from datetime import date
+from collections import defaultdict
+from typing import Optional
+from utils.export import FormatParam, rows_export, streaming_export, validate_export_format
+from utils.pagination import CursorParam, LimitParam, decode_cursor, encode_cursor
+from utils.rollups import load_food_totals, load_monthly_donations
+from utils.statistics_cache import (
+    DONATIONS_KEY,
+    FOODS_KEY,
+    USERS_KEY,
+    get_aggregate_with_own_connection,
+    get_donation_buckets,
+    get_food_buckets,
+    get_user_buckets,
+)
+
+
+# Crear el router para las estadísticas (solo lecturas: usan las réplicas si están configuradas)
+statistics_router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Unidades de medida que se consideran en las estadísticas por categoría
+MEASURED_UNITS = ["kilogramos", "litros"]
+
+
+# Funciones que calculan cada estadística a partir de los agregados en caché
+
+def build_donation_status_distribution(donation_buckets: dict) -> list:
+    # Agrupar por estado los conteos (status, rol, mes)
+    counts = defaultdict(int)
+    for (donation_status, _, _), count in donation_buckets.items():
+        counts[donation_status] += count
+    return [
+        {"status": donation_status, "count": count} for donation_status, count in counts.items() if count > 0
+    ]
+
+def build_monthly_donations(donation_buckets: dict) -> list:
+    # Agrupar por mes (formato YYYY-MM); las donaciones sin fecha van primero, como en MySQL
+    counts = defaultdict(int)
+    for (_, _, month), count in donation_buckets.items():
+        counts[month] += count
+    return [
+        {"month": month, "total_donations": counts[month]}
+        for month in sorted(counts, key=lambda month: (month is not None, month or ""))
+        if counts[month] > 0
+    ]
+
+def build_donations_by_role(donation_buckets: dict) -> list:
+    # Agrupar por rol del donante (sin donantes inexistentes), de mayor a menor
+    counts = defaultdict(int)
+    for (_, role, _), count in donation_buckets.items():
+        if role is not None:
+            counts[role] += count
+    return [
+        {"role": role, "total_donations": total}
+        for role, total in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        if total > 0
+    ]
+
+def build_food_category_distribution(food_buckets: dict) -> list:
+    # Filtrar solo kg y litros
+    return [
+        {"category": category, "unit_of_measure": unit_of_measure, "total_quantity": total_quantity}
+        for (category, unit_of_measure), total_quantity in food_buckets.items()
+        if unit_of_measure in MEASURED_UNITS
+    ]
+
+def build_top_two_donated_foods(food_buckets: dict) -> list:
+    # Sumar por categoría (kg y litros) y quedarse con las dos de mayor cantidad
+    totals = defaultdict(int)
+    for (category, unit_of_measure), total_quantity in food_buckets.items():
+        if unit_of_measure in MEASURED_UNITS:
+            totals[category] += total_quantity
+    return [
+        {"category": category, "total_quantity": total_quantity}
+        for category, total_quantity in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:2]
+    ]
+
+def build_users_by_role(user_buckets: dict) -> list:
+    return [
+        {"role": role, "total_users": total}
+        for role, total in sorted(user_buckets.items(), key=lambda item: item[1], reverse=True)
+        if total > 0
+    ]
+
+
+# Campos del dashboard: nombre -> (agregado del que depende, función que lo calcula)
+DASHBOARD_FIELDS = {
+    "donation_status_distribution": (DONATIONS_KEY, build_donation_status_distribution),
+    "monthly_donations": (DONATIONS_KEY, build_monthly_donations),
+    "donations_by_role": (DONATIONS_KEY, build_donations_by_role),
+    "total_donations": (DONATIONS_KEY, lambda buckets: sum(buckets.values())),
+    "food_category_distribution": (FOODS_KEY, build_food_category_distribution),
+    "top_two_donated_foods": (FOODS_KEY, build_top_two_donated_foods),
+    "total_food": (FOODS_KEY, lambda buckets: sum(buckets.values())),
+    "users_by_role": (USERS_KEY, build_users_by_role),
+    "total_users": (USERS_KEY, lambda buckets: sum(buckets.values())),
+    "total_charities": (USERS_KEY, lambda buckets: buckets.get("charity", 0)),
+}
+
+@statistics_router.get('/statistics/dashboard')
+async def get_statistics_dashboard(fields: Optional[str] = Query(None, description="Campos separados por comas")):
+    """
+    Obtener todas las estadísticas del dashboard en una sola respuesta. Cada agregado
+    base (donaciones, alimentos, usuarios) se calcula con un solo recorrido y las
+    consultas independientes se ejecutan en paralelo, cada una con su conexión.
+    """
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(DASHBOARD_FIELDS)
+    unknown = [field for field in requested if field not in DASHBOARD_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos: {', '.join(unknown)}"
+        )
 
-# Crear el router para las estadísticas
-statistics_router = APIRouter()
+    try:
+        # Cargar solo los agregados necesarios para los campos pedidos
+        keys = list(dict.fromkeys(DASHBOARD_FIELDS[field][0] for field in requested))
+        aggregates = await asyncio.gather(*(get_aggregate_with_own_connection(key) for key in keys))
+        aggregates_by_key = dict(zip(keys, aggregates))
+
+        return {
+            field: DASHBOARD_FIELDS[field][1](aggregates_by_key[DASHBOARD_FIELDS[field][0]])
+            for field in requested
+        }
+
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener las estadísticas del dashboard"
+        ) from e
 
 @statistics_router.get('/donation_status_distribution')
-def get_donation_status_distribution():
+async def get_donation_status_distribution(conn: DBConnection = Depends(get_read_conn)):
     """
     Obtener la distribución de donaciones por estado.
     """
     try:
-        # Consulta para agrupar las donaciones por estado y contar la cantidad
-        donation_query = conn.execute(
-            select(
-                donations.c.status,  # Estado de la donación
-                func.count(donations.c.donation_id).label("count")  # Conteo por estado
-            ).group_by(donations.c.status)  # Agrupar por estado
-        ).mappings().fetchall()  # Usar mappings para devolver resultados como diccionarios
-
-        # Convertir los resultados en una lista de diccionarios
-        status_distribution = [
-            {"status": row["status"], "count": row["count"]} for row in donation_query
-        ]
-
-        return {"data": status_distribution}
+        return {"data": build_donation_status_distribution(await get_donation_buckets(conn))}
 
     except SQLAlchemyError as e:
         # Capturar y devolver errores de la base de datos
@@ -43,32 +156,12 @@ def get_donation_status_distribution():
         ) from e
 
 @statistics_router.get('/food_category_distribution')
-def get_food_category_distribution():
+async def get_food_category_distribution(conn: DBConnection = Depends(get_read_conn)):
     """
     Obtener la cantidad total de alimentos donados por categoría, considerando solo kg y litros.
     """
     try:
-        # Consulta para agrupar alimentos por categoría y unidad de medida, filtrando solo kg y litros
-        food_query = conn.execute(
-            select(
-                donated_foods.c.category,  # Categoría del alimento
-                donated_foods.c.unit_of_measure,  # Unidad de medida
-                func.sum(donated_foods.c.quantity).label("total_quantity")  # Suma total de cantidades
-            ).where(donated_foods.c.unit_of_measure.in_(["kilogramos", "litros"]))  # Filtrar por kg y litros
-            .group_by(donated_foods.c.category, donated_foods.c.unit_of_measure)  # Agrupar por categoría y unidad
-        ).mappings().fetchall()
-
-        # Convertir los resultados en una lista de diccionarios
-        category_distribution = [
-            {
-                "category": row["category"],
-                "unit_of_measure": row["unit_of_measure"],
-                "total_quantity": row["total_quantity"]
-            }
-            for row in food_query
-        ]
-
-        return {"data": category_distribution}
+        return {"data": build_food_category_distribution(await get_food_buckets(conn))}
 
     except SQLAlchemyError as e:
         # Capturar y devolver errores de la base de datos
@@ -78,59 +171,28 @@ def get_food_category_distribution():
         ) from e 
 
 @statistics_router.get('/monthly_donations')
-def get_monthly_donations():
+async def get_monthly_donations(conn: DBConnection = Depends(get_read_conn)):
     """
-    Obtener la cantidad de donaciones realizadas por mes.
+    Obtener la cantidad de donaciones realizadas por mes, desde el resumen mensual.
     """
     try:
-        # Usar DATE_FORMAT para obtener el formato YYYY-MM
-        query = text("""
-            SELECT DATE_FORMAT(created_at, '%Y-%m') AS month, COUNT(donation_id) AS total_donations
-            FROM donations
-            GROUP BY DATE_FORMAT(created_at, '%Y-%m')
-            ORDER BY DATE_FORMAT(created_at, '%Y-%m')
-        """)
-
-        # Ejecutar la consulta y obtener los resultados
-        result = conn.execute(query).fetchall()
-
-        # Convertir los resultados en una lista de diccionarios accediendo por índice
-        monthly_donations = [
-            {"month": row[0], "total_donations": row[1]} for row in result
-        ]
-
-        return {"data": monthly_donations}
+        monthly = await load_monthly_donations(conn)
+        return {"data": [{"month": month, "total_donations": total} for month, total in monthly]}
 
     except SQLAlchemyError as e:
-        print("Error al ejecutar la consulta de donaciones mensuales:", str(e))
+        logger.error("Error al ejecutar la consulta de donaciones mensuales: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al obtener las donaciones mensuales: {str(e)}"
         ) from e
 
 @statistics_router.get('/top_two_donated_foods')
-def get_top_two_donated_foods():
+async def get_top_two_donated_foods(conn: DBConnection = Depends(get_read_conn)):
     """
     Obtener las dos categorías más donadas por cantidad, considerando kilogramos y litros.
     """
     try:
-        # Consulta para agrupar alimentos por categoría y sumar las cantidades
-        food_query = conn.execute(
-            select(
-                donated_foods.c.category,  # Categoría del alimento
-                func.sum(donated_foods.c.quantity).label("total_quantity")  # Suma total de cantidades
-            ).where(donated_foods.c.unit_of_measure.in_(["kilogramos", "litros"]))  # Filtrar por kilogramos y litros
-            .group_by(donated_foods.c.category)  # Agrupar por categoría
-            .order_by(func.sum(donated_foods.c.quantity).desc())  # Ordenar por cantidad descendente
-            .limit(2)  # Limitar a las dos categorías más donadas
-        ).mappings().fetchall()
-
-        # Convertir los resultados en una lista de diccionarios
-        top_two_foods = [
-            {"category": row["category"], "total_quantity": row["total_quantity"]} for row in food_query
-        ]
-
-        return {"data": top_two_foods}
+        return {"data": build_top_two_donated_foods(await get_food_buckets(conn))}
 
     except SQLAlchemyError as e:
         # Capturar y devolver errores de la base de datos
@@ -141,31 +203,12 @@ def get_top_two_donated_foods():
         
 
 @statistics_router.get('/donations_by_role')
-def get_donations_by_role():
+async def get_donations_by_role(conn: DBConnection = Depends(get_read_conn)):
     """
     Obtener la cantidad de donaciones realizadas por rol (restaurante vs. usuario común).
     """
     try:
-        # Consulta para agrupar por rol y contar las donaciones realizadas
-        query = text("""
-            SELECT 
-                users.role, 
-                COUNT(donations.donation_id) AS total_donations
-            FROM donations
-            INNER JOIN users ON donations.donor_id = users.user_id
-            GROUP BY users.role
-            ORDER BY total_donations DESC
-        """)
-
-        # Ejecutar la consulta y procesar los resultados
-        result = conn.execute(query).fetchall()
-
-        # Convertir los resultados a una lista de diccionarios
-        donations_by_role = [
-            {"role": row[0], "total_donations": row[1]} for row in result
-        ]
-
-        return {"data": donations_by_role}
+        return {"data": build_donations_by_role(await get_donation_buckets(conn))}
 
     except SQLAlchemyError as e:
         # Capturar y manejar errores de la base de datos
@@ -176,30 +219,12 @@ def get_donations_by_role():
 
 
 @statistics_router.get('/users_by_role')
-def get_users_by_role():
+async def get_users_by_role(conn: DBConnection = Depends(get_read_conn)):
     """
     Obtener la cantidad de usuarios registrados en la plataforma por rol.
     """
     try:
-        # Consulta para agrupar usuarios por rol y contar
-        query = text("""
-            SELECT 
-                role, 
-                COUNT(user_id) AS total_users
-            FROM users
-            GROUP BY role
-            ORDER BY total_users DESC
-        """)
-
-        # Ejecutar la consulta y procesar los resultados
-        result = conn.execute(query).fetchall()
-
-        # Convertir los resultados en una lista de diccionarios
-        users_by_role = [
-            {"role": row[0], "total_users": row[1]} for row in result
-        ]
-
-        return {"data": users_by_role}
+        return {"data": build_users_by_role(await get_user_buckets(conn))}
 
     except SQLAlchemyError as e:
         # Capturar y manejar errores de la base de datos
@@ -209,17 +234,12 @@ def get_users_by_role():
         ) from e
 
 @statistics_router.get('/total_donations')
-def get_total_donations():
+async def get_total_donations(conn: DBConnection = Depends(get_read_conn)):
     """
     Devuelve el número total de donaciones realizadas.
     """
     try:
-        # Consulta para contar las donaciones realizadas
-        query = select(func.count(donations.c.donation_id).label("total_donations"))
-        result = conn.execute(query).fetchone()
-
-        # Devolver el resultado
-        return {"total_donations": result.total_donations}
+        return {"total_donations": sum((await get_donation_buckets(conn)).values())}
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -228,17 +248,12 @@ def get_total_donations():
         ) from e
 
 @statistics_router.get('/total_food')
-def get_total_food():
+async def get_total_food(conn: DBConnection = Depends(get_read_conn)):
     """
     Devuelve la cantidad total de alimentos donados (kilogramos y litros).
     """
     try:
-        # Consulta para sumar las cantidades de alimentos donados
-        query = select(func.sum(donated_foods.c.quantity).label("total_food_quantity"))
-        result = conn.execute(query).fetchone()
-
-        # Devolver el resultado con un valor por defecto de 0
-        return {"total_food_quantity": result.total_food_quantity or 0}
+        return {"total_food_quantity": sum((await get_food_buckets(conn)).values())}
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -247,17 +262,12 @@ def get_total_food():
         ) from e
 
 @statistics_router.get('/total_users')
-def get_total_users():
+async def get_total_users(conn: DBConnection = Depends(get_read_conn)):
     """
     Devuelve el número total de usuarios registrados en la plataforma.
     """
     try:
-        # Consulta para contar los usuarios registrados
-        query = select(func.count().label("total_users")).select_from(users)
-        result = conn.execute(query).fetchone()
-
-        # Devolver el resultado
-        return {"total_users": result.total_users}
+        return {"total_users": sum((await get_user_buckets(conn)).values())}
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -266,17 +276,12 @@ def get_total_users():
         ) from e
 
 @statistics_router.get('/total_charities')
-def get_total_charities():
+async def get_total_charities(conn: DBConnection = Depends(get_read_conn)):
     """
     Devuelve el número total de organizaciones benéficas registradas.
     """
     try:
-        # Consulta para contar los usuarios con rol de organización benéfica
-        query = select(func.count(users.c.user_id).label("total_charities")).where(users.c.role == "charity")
-        result = conn.execute(query).fetchone()
-
-        # Devolver el resultado
-        return {"total_charities": result.total_charities}
+        return {"total_charities": (await get_user_buckets(conn)).get("charity", 0)}
 
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -284,13 +289,52 @@ def get_total_charities():
             detail="Error al obtener el total de organizaciones benéficas"
         ) from e
 
+def donation_report_row(row) -> dict:
+    return {
+        "donation_id": row[0],
+        "donor_name": row[1],
+        "receiver_name": row[2],
+        "description": row[3],
+        "status": row[4],
+        "created_at": row[5].strftime("%Y-%m-%d %H:%M:%S")
+    }
+
 @statistics_router.get('/donations_report')
-def get_donations_report(start_date: date = Query(...), end_date: date = Query(...)):
+async def get_donations_report(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    export_format: str = FormatParam,
+    conn: DBConnection = Depends(get_read_conn),
+):
     """
     Obtener un reporte de donaciones realizadas en un rango de fechas, incluyendo los nombres de donantes y receptores.
+    Con `limit` se pagina por (`created_at`, `donation_id`) y se devuelve `next_cursor`.
+    Con `format=csv|ndjson` el reporte completo se envía por streaming.
     """
+    validate_export_format(export_format)
+    if export_format != "json" and (limit or cursor):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La paginación solo está disponible en formato json"
+        )
+
     try:
-        query = text("""
+        params = {"start_date": start_date, "end_date": end_date}
+        keyset_clause = ""
+        limit_clause = ""
+        if cursor:
+            cursor_created_at, cursor_donation_id = decode_cursor(cursor, 2)
+            keyset_clause = """
+              AND (d.created_at > :cursor_created_at
+                   OR (d.created_at = :cursor_created_at AND d.donation_id > :cursor_donation_id))"""
+            params.update(cursor_created_at=cursor_created_at, cursor_donation_id=cursor_donation_id)
+        if limit:
+            limit_clause = "LIMIT :page_size"
+            params["page_size"] = limit + 1
+
+        query = text(f"""
             SELECT 
                 d.donation_id,
                 u_donor.name AS donor_name,
@@ -301,24 +345,35 @@ def get_donations_report(start_date: date = Query(...), end_date: date = Query(.
             FROM donations d
             INNER JOIN users u_donor ON d.donor_id = u_donor.user_id
             INNER JOIN users u_receiver ON d.receiver_id = u_receiver.user_id
-            WHERE d.created_at BETWEEN :start_date AND :end_date
-            ORDER BY d.created_at
+            WHERE d.created_at BETWEEN :start_date AND :end_date{keyset_clause}
+            ORDER BY d.created_at, d.donation_id
+            {limit_clause}
         """)
-        result = conn.execute(query, {"start_date": start_date, "end_date": end_date}).fetchall()
+
+        # Exportación por streaming: no se materializa el rango completo en memoria
+        if export_format != "json":
+            return streaming_export(
+                query,
+                params,
+                ["donation_id", "donor_name", "receiver_name", "description", "status", "created_at"],
+                export_format,
+                "donations_report",
+                transform=donation_report_row,
+            )
+
+        result = (await conn.execute(query, params)).fetchall()
+
+        # Recortar la fila extra y calcular el cursor de la siguiente página
+        next_cursor = None
+        if limit and len(result) > limit:
+            result = result[:limit]
+            next_cursor = encode_cursor([result[-1][5], result[-1][0]])
 
         # Convertir resultados en una lista de diccionarios
-        donations_report = [
-            {
-                "donation_id": row[0],
-                "donor_name": row[1],
-                "receiver_name": row[2],
-                "description": row[3],
-                "status": row[4],
-                "created_at": row[5].strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for row in result
-        ]
+        donations_report = [donation_report_row(row) for row in result]
 
+        if limit:
+            return {"data": donations_report, "next_cursor": next_cursor}
         return {"data": donations_report}
 
     except SQLAlchemyError as e:
@@ -327,34 +382,42 @@ def get_donations_report(start_date: date = Query(...), end_date: date = Query(.
         ) from e
 
 @statistics_router.get('/food_donations_report')
-def get_food_donations_report(start_date: date = Query(...), end_date: date = Query(...)):
+async def get_food_donations_report(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    export_format: str = FormatParam,
+    conn: DBConnection = Depends(get_read_conn),
+):
     """
     Obtener un reporte de alimentos donados por categoría en un rango de fechas.
+    Los meses completos del rango se leen del resumen mensual y solo los días de los
+    extremos se suman desde las donaciones. Con `format=csv|ndjson` se envía como archivo.
     """
+    validate_export_format(export_format)
+
     try:
-        query = text("""
-            SELECT 
-                donated_food.category AS category,
-                donated_food.unit_of_measure AS unit_of_measure,
-                SUM(donated_food.quantity) AS total_quantity
-            FROM donated_food
-            INNER JOIN donations ON donated_food.donation_id = donations.donation_id
-            WHERE donations.created_at BETWEEN :start_date AND :end_date
-            GROUP BY donated_food.category, donated_food.unit_of_measure
-            ORDER BY total_quantity DESC
-        """)
-        result = conn.execute(query, {"start_date": start_date, "end_date": end_date}).fetchall()
+        totals = await load_food_totals(conn, start_date, end_date)
 
-        # Convertir resultados en una lista de diccionarios
+        # Convertir resultados en una lista de diccionarios, de mayor a menor cantidad
         food_donations_report = [
             {
-                "category": row[0],
-                "unit_of_measure": row[1],
-                "total_quantity": row[2]
+                "category": category,
+                "unit_of_measure": unit_of_measure,
+                "total_quantity": total_quantity
             }
-            for row in result
+            for (category, unit_of_measure), total_quantity in sorted(
+                totals.items(), key=lambda item: (-item[1], item[0])
+            )
         ]
 
+        if export_format != "json":
+            return rows_export(
+                food_donations_report,
+                ["category", "unit_of_measure", "total_quantity"],
+                export_format,
+                "food_donations_report",
+            )
+
         return {"data": food_donations_report}
 
     except SQLAlchemyError as e:
@@ -1,7 +1,9 @@
 # routes/user.py
 
-from fastapi import APIRouter, HTTPException, status
-from config.db import conn
+import logging
+import os
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from config.db import DBConnection, db_connection, get_conn
 from models.user import users
 from models.charity_profile import charity_profiles
 from models.donation import donations
@@ -9,16 +11,30 @@ from models.donated_food import donated_foods
 from models.donation_chat import donation_chats
 from models.chat_message import chat_messages
 from schemas.user import UserCreate, UserUpdate
+from sqlalchemy import or_, select
 from sqlalchemy.exc import SQLAlchemyError
+from typing import Optional
+from utils.pagination import CursorParam, LimitParam, paginate_query, split_page
+from utils.passwords import hash_password
+from utils.responses import rows_response
+from utils.rollups import remove_donations_from_rollups
+from utils.statistics_cache import record_user_created, record_users_changed
 
 user_router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 @user_router.get('/get_users')
-def get_users():
+async def get_users(
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    conn: DBConnection = Depends(get_conn),
+):
     try:
-        query_result = conn.execute(users.select()).fetchall()
-        users_list = [dict(row._mapping) for row in query_result]
-        return users_list
+        query = paginate_query(users.select(), [users.c.user_id], limit, cursor)
+        query_result, next_cursor = split_page((await conn.execute(query)).fetchall(), limit, ["user_id"])
+        # Las filas se serializan directamente, sin armar diccionarios para jsonable_encoder
+        return rows_response(query_result, paginated=bool(limit), next_cursor=next_cursor)
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -26,21 +42,21 @@ def get_users():
         ) from e
 
 @user_router.post('/create_user')
-def create_user(user: UserCreate):
+async def create_user(user: UserCreate, conn: DBConnection = Depends(get_conn)):
     try:
         new_user = {
             "name": user.name,
             "phone_number": user.phone_number,
             "email": user.email,
-            "password": user.password,
+            "password": await hash_password(user.password),
             "address": user.address,
             "role": user.role
         }
-        result = conn.execute(users.insert().values(new_user))
+        result = await conn.execute(users.insert().values(new_user))
         last_inserted_id = result.inserted_primary_key[0]
 
         # Confirmar la creación del usuario
-        conn.commit()
+        await conn.commit()
 
         # Si el usuario es 'charity', crear el perfil de caridad
         if user.role == "charity" and user.charity_profile:
@@ -49,8 +65,11 @@ def create_user(user: UserCreate):
                 "social_profile": user.charity_profile.social_profile,
                 "description": user.charity_profile.description
             }
-            conn.execute(charity_profiles.insert().values(charity_data))
-            conn.commit()
+            await conn.execute(charity_profiles.insert().values(charity_data))
+            await conn.commit()
+
+        # Sumar el usuario a las estadísticas en caché
+        record_user_created(user.role)
 
         return {
             "message": "Usuario creado exitosamente",
@@ -64,10 +83,10 @@ def create_user(user: UserCreate):
         ) from e
 
 @user_router.get('/get_user/{user_id}')
-def get_user(user_id: int):
+async def get_user(user_id: int, conn: DBConnection = Depends(get_conn)):
     try:
         query = users.select().where(users.c.user_id == user_id)
-        user_result = conn.execute(query).fetchone()
+        user_result = (await conn.execute(query)).fetchone()
 
         if user_result is None:
             raise HTTPException(
@@ -79,7 +98,7 @@ def get_user(user_id: int):
 
         if user_data["role"] == "charity":
             charity_query = charity_profiles.select().where(charity_profiles.c.user_id == user_id)
-            charity_result = conn.execute(charity_query).fetchone()
+            charity_result = (await conn.execute(charity_query)).fetchone()
             if charity_result:
                 user_data["charity_profile"] = dict(charity_result._mapping)
 
@@ -92,21 +111,28 @@ def get_user(user_id: int):
         ) from e
 
 @user_router.get('/get_charity_users')
-def get_charity_users():
+async def get_charity_users(
+    limit: Optional[int] = LimitParam,
+    cursor: Optional[str] = CursorParam,
+    conn: DBConnection = Depends(get_conn),
+):
     try:
-        query_result = conn.execute(users.select().where(users.c.role == 'charity')).fetchall()
+        query = paginate_query(users.select().where(users.c.role == 'charity'), [users.c.user_id], limit, cursor)
+        query_result, next_cursor = split_page((await conn.execute(query)).fetchall(), limit, ["user_id"])
         charity_users_list = []
 
         for user in query_result:
             user_data = dict(user._mapping)
             charity_profile_query = charity_profiles.select().where(charity_profiles.c.user_id == user_data["user_id"])
-            charity_profile_result = conn.execute(charity_profile_query).fetchone()
+            charity_profile_result = (await conn.execute(charity_profile_query)).fetchone()
             if charity_profile_result:
                 user_data["charity_profile"] = dict(charity_profile_result._mapping)
             else:
                 user_data["charity_profile"] = None
             charity_users_list.append(user_data)
 
+        if limit:
+            return {"data": charity_users_list, "next_cursor": next_cursor}
         return charity_users_list
 
     except SQLAlchemyError as e:
@@ -116,146 +142,202 @@ def get_charity_users():
         ) from e
 
 @user_router.put('/update_user/{user_id}')
-def update_user(user_id: int, user: UserUpdate):
+async def update_user(user_id: int, user: UserUpdate, conn: DBConnection = Depends(get_conn)):
     try:
-        # Depuración: Mostrar los datos que se intentan actualizar
-        print(f"Actualizando usuario con ID {user_id} con datos: {user}")
-
         # Actualizar los datos básicos del usuario
         update_data = {
             "name": user.name,
             "phone_number": user.phone_number,
             "email": user.email,
-            "password": user.password,
+            "password": await hash_password(user.password) if user.password else user.password,
             "address": user.address,
             "role": user.role
         }
-        conn.execute(users.update().where(users.c.user_id == user_id).values(update_data))
-        conn.commit()
-        print(f"Usuario con ID {user_id} actualizado en la tabla 'users'")
+        await conn.execute(users.update().where(users.c.user_id == user_id).values(update_data))
+        await conn.commit()
+        # Solo los nombres de los campos: los valores incluyen datos personales y la contraseña
+        logger.info(
+            "Usuario %s actualizado en la tabla 'users'",
+            user_id,
+            extra={"fields": sorted(user.model_fields_set)},
+        )
 
         # Si el rol es 'charity' y se proporciona el perfil de caridad, actualizar o crear el perfil
         if user.role == "charity" and user.charity_profile:
             # Revisar si existe un perfil de caridad para este usuario
             charity_profile_query = charity_profiles.select().where(charity_profiles.c.user_id == user_id)
-            existing_charity_profile = conn.execute(charity_profile_query).fetchone()
-            print(f"Perfil de caridad existente: {existing_charity_profile}")
+            existing_charity_profile = (await conn.execute(charity_profile_query)).fetchone()
 
             # Preparar los datos del perfil de caridad
             charity_data = {
                 "social_profile": user.charity_profile.social_profile,
                 "description": user.charity_profile.description
             }
-            print(f"Datos de charity_profile a actualizar: {charity_data}")
 
             if existing_charity_profile:
                 # Si el perfil existe, actualizarlo
-                conn.execute(
+                await conn.execute(
                     charity_profiles.update()
                     .where(charity_profiles.c.user_id == user_id)
                     .values(charity_data)
                 )
-                print(f"Perfil de caridad de usuario con ID {user_id} actualizado en 'charity_profiles'")
+                logger.info("Perfil de caridad del usuario %s actualizado en 'charity_profiles'", user_id)
             else:
                 # Si no existe, crearlo
                 charity_data["user_id"] = user_id
-                conn.execute(charity_profiles.insert().values(charity_data))
-                print(f"Perfil de caridad de usuario con ID {user_id} creado en 'charity_profiles'")
-            conn.commit()
+                await conn.execute(charity_profiles.insert().values(charity_data))
+                logger.info("Perfil de caridad del usuario %s creado en 'charity_profiles'", user_id)
+            await conn.commit()
+
+        # El rol pudo cambiar: recalcular las estadísticas que dependen de él
+        record_users_changed()
 
         return {"message": "Usuario actualizado exitosamente"}
 
     except SQLAlchemyError as e:
-        print(f"Error SQLAlchemy al actualizar usuario: {e}")
+        logger.error("Error SQLAlchemy al actualizar el usuario %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al actualizar el usuario y/o el perfil de caridad"
         ) from e
 
-@user_router.delete('/delete_user/{user_id}')
-def delete_user(user_id: int):
+# Tamaño de los bloques del borrado en segundo plano (filas por transacción)
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "500"))
+
+def user_donation_ids_query(user_id: int):
+    # Donaciones donde el usuario es donante o receptor
+    return select(donations.c.donation_id).where(
+        or_(donations.c.donor_id == user_id, donations.c.receiver_id == user_id)
+    )
+
+def user_chat_ids_query(user_id: int):
+    # Chats de esas donaciones o creados por el usuario
+    return select(donation_chats.c.donation_chat_id).where(
+        or_(
+            donation_chats.c.donation_id.in_(user_donation_ids_query(user_id)),
+            donation_chats.c.creator_id == user_id,
+        )
+    )
+
+async def delete_user_rows(conn: DBConnection, user_id: int):
     """
-    Eliminar un usuario específico por su ID, incluyendo registros relacionados.
+    Borrar el usuario y sus registros relacionados con sentencias por conjuntos
+    (`DELETE ... WHERE ... IN (subconsulta)`), sin traer IDs a Python.
     """
-    try:
-        print(f"Inicio de eliminación del usuario con ID: {user_id}")
-
-        # Eliminar mensajes de chat donde el usuario es sender o receiver
-        print("Eliminando mensajes de chat relacionados...")
-        conn.execute(
-            chat_messages.delete().where(
-                (chat_messages.c.sender_id == user_id) | (chat_messages.c.receiver_id == user_id)
+    await remove_donations_from_rollups(conn, user_donation_ids_query(user_id))
+    await conn.execute(
+        chat_messages.delete().where(
+            or_(
+                chat_messages.c.sender_id == user_id,
+                chat_messages.c.receiver_id == user_id,
+                chat_messages.c.donation_chat_id.in_(user_chat_ids_query(user_id)),
             )
         )
-        conn.commit()
-
-        # Obtener los IDs de las donaciones relacionadas
-        print("Obteniendo IDs de donaciones relacionadas...")
-        donation_ids = conn.execute(
-            donations.select().where(
-                (donations.c.donor_id == user_id) | (donations.c.receiver_id == user_id)
+    )
+    await conn.execute(
+        donation_chats.delete().where(
+            or_(
+                donation_chats.c.donation_id.in_(user_donation_ids_query(user_id)),
+                donation_chats.c.creator_id == user_id,
             )
-        ).scalars().all()
-        print(f"IDs de donaciones relacionadas: {donation_ids}")
-
-        # Eliminar mensajes de chat asociados a los donation_chats relacionados
-        if donation_ids:
-            print("Eliminando mensajes en chats de donación relacionados con las donaciones del usuario...")
-            related_donation_chat_ids = conn.execute(
-                donation_chats.select().where(donation_chats.c.donation_id.in_(donation_ids))
-            ).scalars().all()
-            
-            if related_donation_chat_ids:
-                conn.execute(
-                    chat_messages.delete().where(chat_messages.c.donation_chat_id.in_(related_donation_chat_ids))
+        )
+    )
+    await conn.execute(donated_foods.delete().where(donated_foods.c.donation_id.in_(user_donation_ids_query(user_id))))
+    await conn.execute(
+        donations.delete().where(or_(donations.c.donor_id == user_id, donations.c.receiver_id == user_id))
+    )
+    await conn.execute(charity_profiles.delete().where(charity_profiles.c.user_id == user_id))
+    await conn.execute(users.delete().where(users.c.user_id == user_id))
+
+async def delete_messages_in_chunks(conn: DBConnection, condition):
+    # Mensajes que cumplen `condition`, en bloques de DELETE_CHUNK_SIZE con un commit por bloque
+    while True:
+        message_ids = (await conn.execute(
+            select(chat_messages.c.message_id).where(condition).limit(DELETE_CHUNK_SIZE)
+        )).scalars().all()
+        if not message_ids:
+            break
+        await conn.execute(chat_messages.delete().where(chat_messages.c.message_id.in_(message_ids)))
+        await conn.commit()
+
+async def delete_user_in_chunks(user_id: int):
+    """
+    Borrado en segundo plano para usuarios con mucho historial: las donaciones y los
+    mensajes se borran en bloques de DELETE_CHUNK_SIZE, cada uno en su propia transacción,
+    para no mantener bloqueos largos; al final se borra el usuario en una transacción corta.
+    """
+    try:
+        async with db_connection() as conn:
+            # 1. Donaciones del usuario (con sus chats, mensajes y alimentos) por bloques
+            while True:
+                donation_ids = (await conn.execute(
+                    user_donation_ids_query(user_id).limit(DELETE_CHUNK_SIZE)
+                )).scalars().all()
+                if not donation_ids:
+                    break
+                chat_ids = select(donation_chats.c.donation_chat_id).where(
+                    donation_chats.c.donation_id.in_(donation_ids)
                 )
-                conn.commit()
+                # Un chat puede tener miles de mensajes: también van por bloques, antes de sus chats
+                await delete_messages_in_chunks(conn, chat_messages.c.donation_chat_id.in_(chat_ids))
+                await remove_donations_from_rollups(conn, donation_ids)
+                await conn.execute(donation_chats.delete().where(donation_chats.c.donation_id.in_(donation_ids)))
+                await conn.execute(donated_foods.delete().where(donated_foods.c.donation_id.in_(donation_ids)))
+                await conn.execute(donations.delete().where(donations.c.donation_id.in_(donation_ids)))
+                await conn.commit()
+
+            # 2. Mensajes restantes enviados o recibidos por el usuario, por bloques
+            await delete_messages_in_chunks(conn, or_(
+                chat_messages.c.sender_id == user_id,
+                chat_messages.c.receiver_id == user_id,
+                chat_messages.c.donation_chat_id.in_(user_chat_ids_query(user_id)),
+            ))
+
+            # 3. Lo que queda (chats creados, perfil y usuario) en una transacción corta
+            await delete_user_rows(conn, user_id)
+            await conn.commit()
+            logger.info("Eliminación en segundo plano del usuario %s completada", user_id)
 
-            # Eliminar chats de donación relacionados con las donaciones del usuario
-            print("Eliminando chats de donación relacionados...")
-            conn.execute(
-                donation_chats.delete().where(donation_chats.c.donation_id.in_(donation_ids))
-            )
-            conn.commit()
+    except SQLAlchemyError as e:
+        logger.error("Error en la eliminación en segundo plano del usuario %s: %s", user_id, e)
 
-            # Eliminar alimentos donados relacionados con estas donaciones
-            print("Eliminando alimentos donados relacionados...")
-            conn.execute(
-                donated_foods.delete().where(donated_foods.c.donation_id.in_(donation_ids))
-            )
-            conn.commit()
+    finally:
+        record_users_changed()
 
-            # Eliminar donaciones donde el usuario es donante o receptor
-            print("Eliminando donaciones donde el usuario es donante o receptor...")
-            conn.execute(
-                donations.delete().where(
-                    (donations.c.donor_id == user_id) | (donations.c.receiver_id == user_id)
-                )
-            )
-            conn.commit()
+@user_router.delete('/delete_user/{user_id}')
+async def delete_user(
+    user_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    conn: DBConnection = Depends(get_conn),
+):
+    """
+    Eliminar un usuario específico por su ID, incluyendo registros relacionados.
+    Todo se borra en una sola transacción; con `background=true` el borrado se hace
+    en segundo plano por bloques y se responde 202 de inmediato.
+    """
+    if background:
+        background_tasks.add_task(delete_user_in_chunks, user_id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "La eliminación del usuario y sus registros relacionados está en proceso"}
 
-        # Eliminar perfil de caridad si existe
-        print("Eliminando perfil de caridad si existe...")
-        conn.execute(
-            charity_profiles.delete().where(charity_profiles.c.user_id == user_id)
-        )
-        conn.commit()
+    try:
+        # Borrar todo en una transacción: si algo falla no queda nada borrado a medias
+        await delete_user_rows(conn, user_id)
+        await conn.commit()
 
-        # Finalmente, eliminar el usuario
-        print("Eliminando el usuario...")
-        conn.execute(users.delete().where(users.c.user_id == user_id))
-        conn.commit()
+        # Invalidar las estadísticas afectadas por el borrado en cascada
+        record_users_changed()
 
-        print("Eliminación completada con éxito.")
+        logger.info("Usuario %s y sus registros relacionados eliminados", user_id)
         return {"message": "Usuario y registros relacionados eliminados exitosamente"}
 
     except SQLAlchemyError as e:
+        await conn.rollback()
         error_message = f"Error al eliminar el usuario y los registros relacionados: {str(e)}"
-        print(error_message)
+        logger.error("Error al eliminar el usuario %s: %s", user_id, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_message
         ) from e
-
-
-
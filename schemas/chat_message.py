@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
 
@@ -11,6 +11,13 @@ class ChatMessageCreate(BaseModel):
     sent_time: Optional[datetime] = None  # Hora de envío del mensaje con valor predeterminado
     is_read: Optional[bool] = False # Estado de lectura del mensaje, predeterminado en False
 
+# Esquema para confirmar la lectura de los mensajes de un chat hasta `message_id`
+# (o hasta `client_message_id` para un mensaje recibido en vivo sin message_id todavía)
+class ChatReadReceipt(BaseModel):
+    receiver_id: int                # ID del usuario que leyó los mensajes
+    message_id: Optional[int] = None  # Último mensaje leído (incluido)
+    client_message_id: Optional[str] = Field(None, max_length=36)  # ID en vivo del último mensaje leído
+
 # Esquema para representar un mensaje de chat completo
 class ChatMessage(BaseModel):
     message_id: int                 # ID del mensaje
@@ -19,4 +26,5 @@ class ChatMessage(BaseModel):
     receiver_id: int                # ID del usuario que recibe el mensaje
     message_value: str              # Contenido del mensaje
     sent_time: datetime             # Hora de envío del mensaje
-    is_read: bool                   # Estado de lectura del mensaje
\ No newline at end of file
+    is_read: bool                   # Estado de lectura del mensaje
+    client_message_id: Optional[str] = None  # ID asignado al enviarlo por el websocket
\ No newline at end of file
@@ -8,7 +8,7 @@ class DonatedFoodCreate(BaseModel):
     category: str  # Nombre del alimento donado
     quantity: int  # Cantidad del alimento
     unit_of_measure: str  # Unidad de medida (ej. kg, litros, etc.)
-    expiration_date: str  # Fecha de vencimiento del alimento
+    expiration_date: date  # Fecha de vencimiento del alimento (AAAA-MM-DD)
 
 # Esquema completo para representar un alimento donado (en consultas)
 class DonatedFood(BaseModel):
@@ -0,0 +1,47 @@
+# tests/conftest.py
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import config.db as db
+from migrations import runner
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """
+    Base de datos SQLite temporal con todas las migraciones aplicadas.
+    """
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(db, "DB_ASYNC", False)
+    monkeypatch.setattr(db, "DB_READ_URLS", [])
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "_read_engines", None)
+    engine = db.get_engine()
+    runner.upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine):
+    from app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def queries(engine):
+    """
+    Sentencias SQL ejecutadas por el engine durante la prueba.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
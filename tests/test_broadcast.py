@@ -0,0 +1,171 @@
+# tests/test_broadcast.py
+
+import asyncio
+import types
+
+import pytest
+
+import utils.broadcast as broadcast_module
+from utils.broadcast import InMemoryBroadcast, RedisBroadcast, create_broadcast
+
+
+class FakeRedisServer:
+    """
+    Servidor pub/sub en memoria con la interfaz de redis.asyncio que usa RedisBroadcast.
+    """
+
+    def __init__(self):
+        self.pubsubs = []
+        self.failing_subscribes = 0  # Suscripciones que fallan, como con el servidor caído
+
+    def from_url(self, url):
+        return FakeRedis(self)
+
+
+class FakeRedis:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+    async def publish(self, channel: str, message: str):
+        for pubsub in self.server.pubsubs:
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": message.encode()})
+
+    async def aclose(self):
+        pass
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.channels = set()
+        self.queue = asyncio.Queue()
+        self.closed = False
+        server.pubsubs.append(self)
+
+    async def subscribe(self, *channels):
+        if self.server.failing_subscribes:
+            self.server.failing_subscribes -= 1
+            raise ConnectionError("Redis no disponible")
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    async def listen(self):
+        # Como redis-py: una suscripción cerrada termina de inmediato
+        while not self.closed:
+            message = await self.queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def aclose(self):
+        self.closed = True
+        self.server.pubsubs.remove(self)
+
+    def drop_connection(self):
+        self.queue.put_nowait(ConnectionError("conexión perdida"))
+
+
+async def wait_until(predicate, timeout: float = 5):
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = FakeRedisServer()
+    monkeypatch.setattr(broadcast_module, "aioredis", types.SimpleNamespace(from_url=server.from_url))
+    return server
+
+
+def collecting_handler(received: list):
+    async def handler(channel, message):
+        received.append((channel, message))
+
+    return handler
+
+
+def test_create_broadcast_by_url_scheme(redis_server):
+    assert isinstance(create_broadcast("memory://"), InMemoryBroadcast)
+    assert isinstance(create_broadcast("redis://localhost:6379/0"), RedisBroadcast)
+    with pytest.raises(ValueError):
+        create_broadcast("kafka://localhost")
+
+
+def test_in_memory_broadcast_delivers_to_subscribed_channels():
+    received = []
+    backend = InMemoryBroadcast()
+    backend.set_handler(collecting_handler(received))
+
+    async def scenario():
+        await backend.connect()
+        # Dos clientes del mismo chat: el canal sigue suscrito hasta que salen los dos
+        await backend.subscribe("chat:1")
+        await backend.subscribe("chat:1")
+        await backend.publish("chat:1", "uno")
+        await backend.publish("chat:2", "sin suscriptores")
+        await backend.unsubscribe("chat:1")
+        await backend.publish("chat:1", "dos")
+        await backend.unsubscribe("chat:1")
+        await backend.publish("chat:1", "tres")
+        await backend.disconnect()
+
+    asyncio.run(scenario())
+    assert received == [("chat:1", "uno"), ("chat:1", "dos")]
+
+
+def test_redis_broadcast_delivers_published_messages(redis_server):
+    received = []
+    backend = RedisBroadcast("redis://fake")
+    backend.set_handler(collecting_handler(received))
+
+    async def scenario():
+        await backend.connect()
+        await backend.subscribe("chat:1")
+        await backend.publish("chat:1", "hola")
+        await backend.publish("chat:2", "sin suscriptores")
+        await wait_until(lambda: received)
+        await backend.unsubscribe("chat:1")
+        await backend.publish("chat:1", "después de salir")
+        await asyncio.sleep(0.05)
+        await backend.disconnect()
+
+    asyncio.run(scenario())
+    assert received == [("chat:1", "hola")]
+    assert redis_server.pubsubs == []
+
+
+def test_redis_broadcast_resubscribes_after_losing_the_connection(redis_server):
+    received = []
+    backend = RedisBroadcast("redis://fake")
+    backend.set_handler(collecting_handler(received))
+
+    async def scenario():
+        await backend.connect()
+        await backend.subscribe("chat:1")
+        await backend.subscribe("chat:2")
+        lost = backend._pubsub
+
+        # El primer intento de reconexión también falla: se reintenta con espera exponencial
+        redis_server.failing_subscribes = 1
+        lost.drop_connection()
+        await wait_until(lambda: backend._pubsub is not lost and backend._pubsub.channels)
+
+        await backend.publish("chat:2", "de otro worker")
+        await wait_until(lambda: received)
+        channels = set(backend._pubsub.channels)
+        await backend.disconnect()
+        return lost, channels
+
+    lost, channels = asyncio.run(scenario())
+    assert lost.closed
+    assert channels == {"broadcast:control", "chat:1", "chat:2"}
+    assert received == [("chat:2", "de otro worker")]
@@ -0,0 +1,124 @@
+# tests/test_bulk_donations.py
+
+import asyncio
+import types
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.user import users
+from routes.donation import insert_donations
+
+DONOR_ID = 1
+CHARITY_ID = 2
+
+
+def new_donation(description: str, foods: list) -> dict:
+    return {
+        "donor_id": DONOR_ID,
+        "receiver_id": CHARITY_ID,
+        "description": description,
+        "donated_foods": [
+            {"category": category, "quantity": 1, "unit_of_measure": "kilogramos", "expiration_date": "2024-02-01"}
+            for category in foods
+        ],
+    }
+
+
+def test_bulk_create_links_each_food_to_its_donation(engine, client):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": DONOR_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+
+    response = client.post("/create_donations_bulk", json=[
+        new_donation("Pan", ["pan"]),
+        new_donation("Sin alimentos", []),
+        new_donation("Arroz y frijol", ["arroz", "frijol"]),
+    ])
+
+    assert response.status_code == 200
+    donation_ids = response.json()["donation_ids"]
+    with engine.connect() as conn:
+        saved = conn.execute(
+            select(donations.c.donation_id, donations.c.description).order_by(donations.c.donation_id)
+        ).fetchall()
+        foods = conn.execute(
+            select(donated_foods.c.donation_id, donated_foods.c.category).order_by(donated_foods.c.category)
+        ).fetchall()
+    assert [tuple(row) for row in saved] == list(zip(donation_ids, ["Pan", "Sin alimentos", "Arroz y frijol"]))
+    assert sorted(tuple(row) for row in foods) == sorted([
+        (donation_ids[0], "pan"), (donation_ids[2], "arroz"), (donation_ids[2], "frijol"),
+    ])
+
+
+def test_bulk_create_rejects_an_empty_list(client):
+    assert client.post("/create_donations_bulk", json=[]).status_code == 400
+
+
+class FakeResult:
+    def __init__(self, lastrowid=None, scalar=None, rows=()):
+        self.lastrowid = lastrowid
+        self._scalar = scalar
+        self._rows = list(rows)
+
+    def scalar(self):
+        return self._scalar
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeMySQLConnection:
+    """
+    Conexión de MySQL simulada: sin RETURNING, responde en orden el INSERT, el
+    `@@auto_increment_increment` y la consulta de verificación.
+    """
+
+    dialect = types.SimpleNamespace(insert_executemany_returning_sort_by_parameter_order=False)
+
+    def __init__(self, first_id: int, step: int, inserted: list):
+        self.results = [FakeResult(lastrowid=first_id), FakeResult(scalar=step), FakeResult(rows=inserted)]
+        self.statements = []
+        self.rolled_back = False
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+        return self.results.pop(0)
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+MYSQL_ROWS = [
+    {"donor_id": DONOR_ID, "receiver_id": CHARITY_ID, "description": "Pan"},
+    {"donor_id": DONOR_ID, "receiver_id": CHARITY_ID, "description": "Arroz"},
+]
+
+
+def test_mysql_ids_follow_auto_increment_increment():
+    # Réplica multi-primario: los IDs avanzan de 2 en 2 desde `lastrowid`
+    conn = FakeMySQLConnection(first_id=11, step=2, inserted=[
+        (11, DONOR_ID, CHARITY_ID, "Pan"), (13, DONOR_ID, CHARITY_ID, "Arroz"),
+    ])
+
+    assert asyncio.run(insert_donations(conn, MYSQL_ROWS)) == [11, 13]
+    assert not conn.rolled_back
+    verification = conn.statements[2].compile()
+    assert verification.params["donation_id_1"] == [11, 13]
+
+
+def test_mysql_ids_that_do_not_match_the_inserted_rows_cancel_everything():
+    # Otra sesión insertó entre medio: el ID 12 no es una de nuestras filas
+    conn = FakeMySQLConnection(first_id=11, step=1, inserted=[
+        (11, DONOR_ID, CHARITY_ID, "Pan"), (12, 7, CHARITY_ID, "De otro donante"),
+    ])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(insert_donations(conn, MYSQL_ROWS))
+    assert error.value.status_code == 500
+    assert conn.rolled_back
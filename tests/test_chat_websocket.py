@@ -0,0 +1,165 @@
+# tests/test_chat_websocket.py
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from starlette.websockets import WebSocketDisconnect
+
+import routes.chat_websocket as chat_websocket
+from models.chat_message import chat_messages
+from models.donation import donations
+from models.donation_chat import donation_chats
+from models.user import users
+from utils.chat_message_writer import ChatMessageWriter, chat_message_writer
+
+
+def add_chat(engine):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": 1, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": 2, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert().values(
+            donation_id=1, donor_id=1, receiver_id=2, description="Donación", status="pendiente",
+            created_at=datetime(2024, 1, 1),
+        ))
+        conn.execute(donation_chats.insert().values(
+            donation_chat_id=1, donation_id=1, creator_id=1, created_at=datetime(2024, 1, 1),
+        ))
+
+
+def send_message(websocket, client_message_id: str, text: str = "ok"):
+    websocket.send_json({
+        "sender_id": 1, "receiver_id": 2, "message_value": text, "client_message_id": client_message_id,
+    })
+
+
+def receive_until(websocket, frame_type: str) -> dict:
+    while True:
+        frame = websocket.receive_json()
+        if frame.get("type") == frame_type:
+            return frame
+
+
+def test_live_messages_are_acknowledged_with_their_message_id(engine, client):
+    add_chat(engine)
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        send_message(websocket, "a1")
+        send_message(websocket, "a2")
+        live = [websocket.receive_json(), websocket.receive_json()]
+        assert [frame["client_message_id"] for frame in live] == ["a1", "a2"]
+        assert all("message_id" not in frame for frame in live)
+
+        # El guardado diferido asigna los message_id y los difunde a los clientes del chat
+        acknowledged = {}
+        while len(acknowledged) < 2:
+            frame = receive_until(websocket, "message_ids")
+            acknowledged.update({ack["client_message_id"]: ack["message_id"] for ack in frame["ids"]})
+    assert acknowledged["a1"] < acknowledged["a2"]
+
+
+def test_reconnect_replays_identical_messages_by_id(engine, client):
+    add_chat(engine)
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        send_message(websocket, "b1")
+        send_message(websocket, "b2")
+        first_ack = receive_until(websocket, "message_ids")["ids"][0]["message_id"]
+
+    # Mensajes con el mismo texto en el mismo segundo se reenvían los dos
+    with client.websocket_connect(f"/ws/chat/1?since_message_id={first_ack - 1}") as websocket:
+        replayed = [websocket.receive_json(), websocket.receive_json()]
+    assert [frame["client_message_id"] for frame in replayed] == ["b1", "b2"]
+    assert [frame["message_value"] for frame in replayed] == ["ok", "ok"]
+    assert replayed[0]["message_id"] == first_ack
+
+
+def test_resending_a_client_message_id_does_not_duplicate_it(engine, client):
+    add_chat(engine)
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        send_message(websocket, "c1")
+        original = receive_until(websocket, "message_ids")["ids"][0]
+        send_message(websocket, "c1")
+        resent = receive_until(websocket, "message_ids")["ids"][0]
+    assert resent == original
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(chat_messages)).scalar() == 1
+
+
+def test_read_receipt_by_client_message_id(engine, client):
+    add_chat(engine)
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        send_message(websocket, "d1")
+        send_message(websocket, "d2")
+        # El receptor confirma antes de conocer los message_id de los mensajes en vivo
+        websocket.send_json({"type": "read", "reader_id": 2, "client_message_id": "d1"})
+        acknowledged = {}
+        while "d1" not in acknowledged:
+            frame = receive_until(websocket, "message_ids")
+            acknowledged.update({ack["client_message_id"]: ack["message_id"] for ack in frame["ids"]})
+        cursor = receive_until(websocket, "read_cursor")
+    assert (cursor["reader_id"], cursor["message_id"]) == (2, acknowledged["d1"])
+
+    with engine.connect() as conn:
+        read_flags = conn.execute(
+            select(chat_messages.c.client_message_id, chat_messages.c.is_read).order_by(chat_messages.c.message_id)
+        ).fetchall()
+    assert [tuple(row) for row in read_flags] == [("d1", True), ("d2", False)]
+
+
+def add_saved_message(engine, client_message_id: str):
+    with engine.begin() as conn:
+        conn.execute(chat_messages.insert().values(
+            donation_chat_id=1, sender_id=1, receiver_id=2, message_value="ok",
+            sent_time=datetime(2024, 1, 1), is_read=False, client_message_id=client_message_id,
+        ))
+
+
+def test_replay_waits_for_the_batch_being_saved(engine, client):
+    add_chat(engine)
+    flush_lock = chat_message_writer._flush_lock
+    # Un guardado en curso: el lote ya salió de la cola pendiente pero aún no se confirmó
+    client.portal.call(flush_lock.acquire)
+    try:
+        with client.websocket_connect("/ws/chat/1?since_message_id=0") as websocket:
+            add_saved_message(engine, "e1")
+            client.portal.call(flush_lock.release)
+            replayed = websocket.receive_json()
+    finally:
+        if flush_lock.locked():
+            client.portal.call(flush_lock.release)
+    assert replayed["client_message_id"] == "e1"
+
+
+def test_slow_client_is_closed_during_replay(engine, client, monkeypatch):
+    add_chat(engine)
+    add_saved_message(engine, "f1")
+    monkeypatch.setattr(chat_websocket, "CHAT_SEND_TIMEOUT", 0)
+
+    with client.websocket_connect("/ws/chat/1?since_message_id=0") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == chat_websocket.SLOW_CLIENT_CLOSE_CODE
+
+
+def test_stopping_the_writer_keeps_the_batch_being_saved(engine):
+    add_chat(engine)
+    writer = ChatMessageWriter(flush_size=5, flush_interval=60)
+
+    async def scenario():
+        await writer.start()
+        for index in range(5):
+            writer.add({
+                "donation_chat_id": 1, "sender_id": 1, "receiver_id": 2, "message_value": "ok",
+                "sent_time": datetime(2024, 1, 1), "is_read": False, "client_message_id": f"g{index}",
+            })
+        # La tarea de fondo ya sacó el lote de la cola y lo está guardando
+        while writer.pending_count():
+            await asyncio.sleep(0)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(chat_messages)).scalar() == 5
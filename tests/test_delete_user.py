@@ -0,0 +1,127 @@
+# tests/test_delete_user.py
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+import routes.user as user_routes
+from models.chat_message import chat_messages
+from models.charity_profile import charity_profiles
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.donation_chat import donation_chats
+from models.monthly_rollup import donation_monthly_rollup, food_monthly_rollup
+from models.user import users
+from utils.rollups import backfill_rollups
+
+USER_ID = 1  # Usuario que se elimina
+CHARITY_ID = 2
+OTHER_ID = 3
+
+
+def message(message_id: int, chat_id: int, sender_id: int, receiver_id: int) -> dict:
+    return {
+        "message_id": message_id, "donation_chat_id": chat_id, "sender_id": sender_id, "receiver_id": receiver_id,
+        "message_value": "ok", "sent_time": datetime(2024, 1, 1), "is_read": False,
+    }
+
+
+def add_history(engine):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": USER_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+            {"user_id": OTHER_ID, "name": "Mercado", "email": "other@example.com", "role": "restaurant"},
+        ])
+        conn.execute(charity_profiles.insert().values(user_id=CHARITY_ID, description="Comedor"))
+        # Donaciones 1-3 del usuario; la 4 y la 5 son entre otros dos usuarios
+        conn.execute(donations.insert(), [
+            {
+                "donation_id": donation_id, "donor_id": donor_id, "receiver_id": CHARITY_ID,
+                "description": f"Donación {donation_id}", "status": "pendiente", "created_at": datetime(2024, 1, 15),
+            }
+            for donation_id, donor_id in ((1, USER_ID), (2, USER_ID), (3, USER_ID), (4, OTHER_ID), (5, OTHER_ID))
+        ])
+        conn.execute(donated_foods.insert(), [
+            {
+                "donation_id": donation_id, "category": "arroz", "quantity": 2,
+                "unit_of_measure": "kilogramos", "expiration_date": date(2024, 2, 1),
+            }
+            for donation_id in (1, 2, 3, 4, 5)
+        ])
+        # Chat 1: de una donación del usuario. Chat 2: ajeno. Chat 3: creado por el usuario en una donación ajena
+        conn.execute(donation_chats.insert(), [
+            {"donation_chat_id": 1, "donation_id": 1, "creator_id": USER_ID, "created_at": datetime(2024, 1, 15)},
+            {"donation_chat_id": 2, "donation_id": 4, "creator_id": OTHER_ID, "created_at": datetime(2024, 1, 15)},
+            {"donation_chat_id": 3, "donation_id": 5, "creator_id": USER_ID, "created_at": datetime(2024, 1, 15)},
+        ])
+        conn.execute(chat_messages.insert(), [
+            *(message(message_id, 1, CHARITY_ID, USER_ID) for message_id in range(1, 6)),
+            message(6, 2, OTHER_ID, CHARITY_ID),
+            message(7, 2, USER_ID, CHARITY_ID),
+            message(8, 3, OTHER_ID, CHARITY_ID),
+        ])
+        backfill_rollups(conn)
+
+
+def rollup_rows(conn) -> dict:
+    return {
+        "donations": sorted(
+            tuple(row) for row in conn.execute(select(donation_monthly_rollup)) if row.donations_count
+        ),
+        "foods": sorted(tuple(row) for row in conn.execute(select(food_monthly_rollup)) if row.total_quantity),
+    }
+
+
+def assert_only_unrelated_rows_remain(engine):
+    with engine.connect() as conn:
+        user_ids = set(conn.execute(select(users.c.user_id)).scalars())
+        donation_ids = set(conn.execute(select(donations.c.donation_id)).scalars())
+        chat_ids = set(conn.execute(select(donation_chats.c.donation_chat_id)).scalars())
+        assert user_ids == {CHARITY_ID, OTHER_ID}
+        assert donation_ids == {4, 5}
+        assert chat_ids == {2}
+        assert set(conn.execute(select(chat_messages.c.message_id)).scalars()) == {6}
+
+        # Ninguna fila apunta a algo borrado
+        donors = conn.execute(select(donations.c.donor_id, donations.c.receiver_id)).fetchall()
+        assert all(donor_id in user_ids and receiver_id in user_ids for donor_id, receiver_id in donors)
+        assert set(conn.execute(select(donated_foods.c.donation_id)).scalars()) <= donation_ids
+        assert set(conn.execute(select(donation_chats.c.donation_id)).scalars()) <= donation_ids
+        assert set(conn.execute(select(donation_chats.c.creator_id)).scalars()) <= user_ids
+        assert set(conn.execute(select(chat_messages.c.donation_chat_id)).scalars()) <= chat_ids
+        assert set(conn.execute(select(charity_profiles.c.user_id)).scalars()) <= user_ids
+
+        # Los resúmenes mensuales coinciden con reconstruirlos desde lo que quedó
+        maintained = rollup_rows(conn)
+    with engine.begin() as conn:
+        backfill_rollups(conn)
+        assert maintained == rollup_rows(conn)
+
+
+def test_delete_user_removes_related_rows_in_one_transaction(engine, client):
+    add_history(engine)
+
+    response = client.delete(f"/delete_user/{USER_ID}")
+
+    assert response.status_code == 200
+    assert_only_unrelated_rows_remain(engine)
+
+
+def test_background_delete_removes_messages_in_bounded_chunks(engine, client, queries, monkeypatch):
+    add_history(engine)
+    monkeypatch.setattr(user_routes, "DELETE_CHUNK_SIZE", 2)
+
+    # TestClient ejecuta la tarea en segundo plano antes de devolver la respuesta
+    response = client.delete(f"/delete_user/{USER_ID}?background=true")
+
+    assert response.status_code == 202
+    assert_only_unrelated_rows_remain(engine)
+    message_deletes = [
+        statement for statement in queries
+        if statement.startswith("DELETE FROM chat_message") and "message_id IN" in statement
+    ]
+    # Los 5 mensajes del chat 1 salen en 3 bloques y los 2 restantes del usuario en otro
+    assert len(message_deletes) == 4
+    assert all(statement.count("?") <= 2 for statement in message_deletes)
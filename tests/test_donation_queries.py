@@ -0,0 +1,81 @@
+# tests/test_donation_queries.py
+
+from datetime import date, datetime
+
+import pytest
+
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.user import users
+
+DONOR_ID = 1
+CHARITY_ID = 2
+
+
+def add_donations(engine, count: int):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": DONOR_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert(), [
+            {
+                "donation_id": donation_id,
+                "donor_id": DONOR_ID,
+                "receiver_id": CHARITY_ID,
+                "description": f"Donación {donation_id}",
+                "status": "pendiente",
+                "created_at": datetime(2024, 1, 1),
+            }
+            for donation_id in range(1, count + 1)
+        ])
+        conn.execute(donated_foods.insert(), [
+            {
+                "donation_id": donation_id,
+                "category": category,
+                "quantity": 1,
+                "unit_of_measure": "kilogramos",
+                "expiration_date": date(2024, 2, 1),
+            }
+            for donation_id in range(1, count + 1)
+            for category in ("arroz", "frijol")
+        ])
+
+
+def count_route_queries(client, queries, url: str) -> int:
+    queries.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.parametrize("url", [
+    f"/get_my_donations/{DONOR_ID}",
+    f"/get_received_donations/{CHARITY_ID}",
+    f"/get_my_donations/{DONOR_ID}?limit=50",
+    f"/get_received_donations/{CHARITY_ID}?limit=50",
+])
+def test_query_count_does_not_grow_with_donations(engine, client, queries, url):
+    add_donations(engine, 1)
+    single = count_route_queries(client, queries, url)
+
+    with engine.begin() as conn:
+        conn.execute(donated_foods.delete())
+        conn.execute(donations.delete())
+        conn.execute(users.delete())
+    add_donations(engine, 40)
+    many = count_route_queries(client, queries, url)
+
+    assert many == single
+
+
+def test_donations_are_assembled_with_foods_and_charity(engine, client):
+    add_donations(engine, 3)
+
+    my_donations = client.get(f"/get_my_donations/{DONOR_ID}").json()
+    assert [donation["donation_id"] for donation in my_donations] == [1, 2, 3]
+    assert all(donation["charity_name"] == "Fundación" for donation in my_donations)
+    assert all(len(donation["donated_foods"]) == 2 for donation in my_donations)
+
+    received = client.get(f"/get_received_donations/{CHARITY_ID}").json()["donations"]
+    assert [len(donation["donated_foods"]) for donation in received] == [2, 2, 2]
@@ -0,0 +1,38 @@
+# tests/test_logging.py
+
+import io
+import json
+import logging
+import sys
+
+import config.log as log
+
+
+def test_records_are_formatted_by_the_listener(monkeypatch):
+    output = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", output)
+    monkeypatch.setattr(log, "LOG_FORMAT", "json")
+    log.configure_logging()
+    try:
+        enqueued = []
+        monkeypatch.setattr(log._queue_handler, "enqueue", enqueued.append)
+        logger = logging.getLogger("tests.logging")
+        try:
+            raise ValueError("fallo")
+        except ValueError:
+            logger.exception("Error en la donación %s", 7, extra={"donation_id": 7})
+
+        # En el hilo de la petición el registro se encola sin formatear
+        record = enqueued[0]
+        assert (record.msg, record.args) == ("Error en la donación %s", (7,))
+        assert record.exc_info is not None
+
+        log._listener.queue.put_nowait(record)
+    finally:
+        log.shutdown_logging()
+
+    entry = json.loads(output.getvalue())
+    assert entry["message"] == "Error en la donación 7"
+    assert entry["donation_id"] == 7
+    assert "ValueError: fallo" in entry["exception"]
+    assert "Traceback" not in entry["message"]
@@ -0,0 +1,64 @@
+# tests/test_metrics.py
+
+import time
+
+import pytest
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+
+import utils.metrics as metrics_module
+import utils.rate_limit as rate_limit_module
+from utils.metrics import MetricsRegistry, TimingMiddleware
+from utils.rate_limit import InMemoryRateLimiter, RateLimitMiddleware
+
+BACKGROUND_SECONDS = 0.3
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """
+    Registro de métricas y límites vacíos y propios de la prueba.
+    """
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics_registry", registry)
+    monkeypatch.setattr(rate_limit_module, "rate_limiter", InMemoryRateLimiter())
+    return registry
+
+
+@pytest.fixture
+def test_client(registry):
+    app = FastAPI()
+
+    @app.post("/limitada/{item_id}")
+    async def limited(item_id: int):
+        return {"item_id": item_id}
+
+    @app.get("/con_tarea")
+    async def with_background_task(background_tasks: BackgroundTasks):
+        background_tasks.add_task(time.sleep, BACKGROUND_SECONDS)
+        return {"ok": True}
+
+    # Mismo orden que app.py: la medición va por fuera del límite de solicitudes
+    app.add_middleware(RateLimitMiddleware, rules="/limitada=1/60")
+    app.add_middleware(TimingMiddleware)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_rejected_requests_are_labelled_with_the_rule_path(test_client, registry):
+    assert test_client.post("/limitada/1").status_code == 200
+    assert test_client.post("/limitada/2").status_code == 429
+
+    assert registry.responses == {
+        ("POST", "/limitada/{item_id}", "200"): 1,
+        ("POST", "/limitada", "429"): 1,
+    }
+    assert 'route="/limitada",status="429"' in registry.render()
+
+
+def test_background_tasks_are_not_counted_as_latency(test_client, registry):
+    assert test_client.get("/con_tarea").status_code == 200
+
+    histogram = registry.request_duration[("GET", "/con_tarea")]
+    assert histogram.count == 1
+    assert histogram.sum < BACKGROUND_SECONDS
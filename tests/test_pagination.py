@@ -0,0 +1,85 @@
+# tests/test_pagination.py
+
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from models.donation import donations
+from models.user import users
+from utils.pagination import decode_cursor, encode_cursor
+
+DONOR_ID = 1
+CHARITY_ID = 2
+
+
+def add_donations(engine, count: int):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": DONOR_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert(), [
+            {
+                "donation_id": donation_id, "donor_id": DONOR_ID, "receiver_id": CHARITY_ID,
+                "description": f"Donación {donation_id}", "status": "pendiente", "created_at": datetime(2024, 1, 1),
+            }
+            for donation_id in range(1, count + 1)
+        ])
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    values = [datetime(2024, 1, 31, 23, 59, 30), 42, "texto"]
+
+    cursor = encode_cursor(values)
+
+    assert decode_cursor(cursor) == values
+    assert decode_cursor(cursor, 3) == values
+
+
+@pytest.mark.parametrize("cursor, size", [
+    ("no-es-base64!", None),
+    (base64.urlsafe_b64encode(b"sin json").decode(), None),
+    (encode_cursor([{"sin_dt": 1}]), None),
+    (encode_cursor([1, 2]), 1),  # Cursor de otro endpoint, con otra clave de ordenamiento
+])
+def test_invalid_cursor_is_rejected(cursor, size):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, size)
+    assert error.value.status_code == 400
+
+
+def test_bad_cursor_returns_400(engine, client):
+    response = client.get(f"/get_received_donations/{CHARITY_ID}?limit=2&cursor=basura")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor de paginación inválido"
+
+
+def test_received_donations_pages_end_with_a_null_cursor(engine, client):
+    add_donations(engine, 4)
+
+    pages = []
+    url = f"/get_received_donations/{CHARITY_ID}?limit=2"
+    cursor = None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        page = response.json()
+        pages.append([donation["donation_id"] for donation in page["donations"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # La última página está llena y aun así no devuelve otro cursor
+    assert pages == [[1, 2], [3, 4]]
+
+
+def test_empty_page_after_a_cursor_keeps_the_page_shape(engine, client):
+    add_donations(engine, 2)
+
+    response = client.get(f"/get_received_donations/{CHARITY_ID}?limit=2&cursor={encode_cursor([2])}")
+
+    assert response.status_code == 200
+    assert response.json() == {"donations": [], "next_cursor": None}
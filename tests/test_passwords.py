@@ -0,0 +1,55 @@
+# tests/test_passwords.py
+
+import asyncio
+
+from passlib.hash import bcrypt
+from sqlalchemy import select
+
+from models.user import users
+from utils.passwords import BCRYPT_ROUNDS, pwd_context, verify_password
+
+PASSWORD = "secreta"
+
+
+def verify(password: str, stored):
+    return asyncio.run(verify_password(password, stored))
+
+
+def test_plaintext_row_is_rehashed_on_login():
+    password_ok, new_hash = verify(PASSWORD, PASSWORD)
+
+    assert password_ok
+    assert pwd_context.identify(new_hash) == "bcrypt"
+    assert not pwd_context.needs_update(new_hash)
+    # Con el hash nuevo guardado, el siguiente inicio de sesión ya no lo cambia
+    assert verify(PASSWORD, new_hash) == (True, None)
+
+
+def test_wrong_password_against_plaintext_row_is_rejected():
+    assert verify("otra", PASSWORD) == (False, None)
+    assert verify(PASSWORD, None) == (False, None)
+
+
+def test_low_round_hash_is_upgraded_on_login():
+    low_round_hash = bcrypt.using(rounds=4).hash(PASSWORD)
+
+    password_ok, new_hash = verify(PASSWORD, low_round_hash)
+
+    assert password_ok
+    assert bcrypt.from_string(new_hash).rounds == BCRYPT_ROUNDS
+    assert verify("otra", low_round_hash) == (False, None)
+
+
+def test_login_replaces_a_plaintext_password(engine, client):
+    with engine.begin() as conn:
+        conn.execute(users.insert().values(
+            user_id=1, name="Usuario", email="user@example.com", password=PASSWORD, role="user",
+        ))
+
+    response = client.post("/generate_token", json={"email": "user@example.com", "password": PASSWORD})
+
+    assert response.status_code == 200
+    with engine.connect() as conn:
+        stored = conn.execute(select(users.c.password).where(users.c.user_id == 1)).scalar()
+    assert pwd_context.identify(stored) == "bcrypt"
+    assert pwd_context.verify(PASSWORD, stored)
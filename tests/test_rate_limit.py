@@ -0,0 +1,132 @@
+# tests/test_rate_limit.py
+
+import asyncio
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import routes.chat_websocket as chat_websocket
+import utils.rate_limit as rate_limit_module
+from utils.auth import create_access_token
+from utils.rate_limit import InMemoryRateLimiter, RateLimitMiddleware, parse_budget
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit_module, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """
+    Baldes vacíos y propios de la prueba (los del middleware de la app se comparten).
+    """
+    limiter = InMemoryRateLimiter()
+    monkeypatch.setattr(rate_limit_module, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def test_client(limiter):
+    app = FastAPI()
+
+    @app.post("/limitada")
+    async def limited():
+        return {"ok": True}
+
+    @app.post("/libre")
+    async def unlimited():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, rules="/limitada=2/60")
+    with TestClient(app) as client:
+        yield client
+
+
+def hit(limiter, key: str = "clave", budget: str = "2/10") -> float:
+    return asyncio.run(limiter.hit(key, *parse_budget(budget)))
+
+
+def bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': f'user{user_id}', 'user_id': user_id})}"}
+
+
+def test_token_bucket_allows_the_burst_and_then_refills(clock):
+    limiter = InMemoryRateLimiter()
+
+    # Capacidad de 2 fichas que se recargan a 0.2 por segundo
+    assert hit(limiter) == 0
+    assert hit(limiter) == 0
+    assert hit(limiter) == pytest.approx(5)
+
+    clock.now += 2.5  # Media ficha recargada
+    assert hit(limiter) == pytest.approx(2.5)
+
+    clock.now += 2.5
+    assert hit(limiter) == 0
+    assert hit(limiter) > 0
+
+
+def test_rejected_request_gets_429_with_retry_after(test_client):
+    assert [test_client.post("/limitada").status_code for _ in range(2)] == [200, 200]
+
+    response = test_client.post("/limitada")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"  # Una ficha cada 30 segundos, redondeado hacia arriba
+    # Las rutas sin regla no se limitan
+    assert test_client.post("/libre").status_code == 200
+
+
+def test_each_user_has_its_own_bucket(test_client):
+    for _ in range(2):
+        assert test_client.post("/limitada", headers=bearer(1)).status_code == 200
+    assert test_client.post("/limitada", headers=bearer(1)).status_code == 429
+
+    # Otro usuario y la IP sin token tienen sus propios baldes
+    assert test_client.post("/limitada", headers=bearer(2)).status_code == 200
+    assert test_client.post("/limitada").status_code == 200
+    # Un token inválido se limita por IP, no por el usuario que dice ser
+    assert test_client.post("/limitada", headers={"Authorization": "Bearer no-es-un-token"}).status_code == 200
+    assert test_client.post("/limitada").status_code == 429
+
+
+def test_forwarded_ip_is_used_only_behind_a_trusted_proxy(test_client, monkeypatch):
+    forwarded = [{"X-Forwarded-For": f"203.0.113.{index}, 10.0.0.1"} for index in range(3)]
+    # Sin proxy de confianza todos comparten la IP de la conexión
+    assert [test_client.post("/limitada", headers=headers).status_code for headers in forwarded] == [200, 200, 429]
+
+    monkeypatch.setattr(rate_limit_module, "RATE_LIMIT_TRUST_FORWARDED", True)
+    assert [test_client.post("/limitada", headers=headers).status_code for headers in forwarded] == [200, 200, 200]
+
+
+def test_websocket_flood_is_closed_with_policy_violation(engine, client, monkeypatch):
+    monkeypatch.setattr(chat_websocket, "rate_limiter", InMemoryRateLimiter())
+    monkeypatch.setattr(chat_websocket, "CHAT_WS_CONNECTION_BUDGET", parse_budget("1/60"))
+    monkeypatch.setattr(chat_websocket, "CHAT_WS_MAX_VIOLATIONS", 2)
+    # Frames que no escriben nada: confirmaciones de lectura incompletas
+    frame = {"type": "read"}
+
+    with client.websocket_connect("/ws/chat/1") as websocket:
+        websocket.send_json(frame)
+        for _ in range(2):
+            websocket.send_json(frame)
+            warning = websocket.receive_json()
+            assert warning["type"] == "rate_limited"
+            assert warning["retry_after"] > 0
+        websocket.send_json(frame)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == chat_websocket.RATE_LIMIT_CLOSE_CODE
@@ -0,0 +1,91 @@
+# tests/test_read_replicas.py
+
+import asyncio
+import itertools
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+import config.db as db
+
+
+@pytest.fixture
+def replica_paths(engine, tmp_path, monkeypatch):
+    """
+    Dos réplicas de lectura SQLite (archivos aparte de la base principal).
+    """
+    paths = [tmp_path / "replica1.db", tmp_path / "replica2.db"]
+    monkeypatch.setattr(db, "DB_READ_URLS", [f"sqlite:///{path}" for path in paths])
+    monkeypatch.setattr(db, "_read_engines", None)
+    monkeypatch.setattr(db, "_read_counter", itertools.count())
+    monkeypatch.setattr(db, "_last_write_at", float("-inf"))
+    yield paths
+    for read_engine in db._read_engines or []:
+        read_engine.dispose()
+
+
+def served_by(times: int = 1) -> list:
+    """
+    Archivo de la base que atendió cada una de `times` lecturas seguidas.
+    """
+    async def read():
+        databases = []
+        for _ in range(times):
+            async with db.db_read_connection() as conn:
+                await conn.execute(text("SELECT 1"))
+                databases.append(Path(conn.sync_connection.engine.url.database).name)
+        return databases
+
+    return asyncio.run(read())
+
+
+def write_to_primary(record_writes: bool = True):
+    async def write():
+        async with db.db_connection(record_writes=record_writes) as conn:
+            await conn.execute(text("CREATE TABLE IF NOT EXISTS write_marker (id INTEGER)"))
+            await conn.commit()
+
+    asyncio.run(write())
+
+
+def test_reads_rotate_across_replicas(replica_paths):
+    assert served_by(4) == ["replica1.db", "replica2.db", "replica1.db", "replica2.db"]
+
+
+def test_reads_use_primary_without_replicas(engine, monkeypatch):
+    monkeypatch.setattr(db, "_read_engines", None)
+    assert served_by(2) == ["test.db", "test.db"]
+
+
+def test_unreachable_replica_falls_back(replica_paths, tmp_path, monkeypatch):
+    # Un directorio inexistente hace fallar la conexión de SQLite como una réplica caída
+    missing = tmp_path / "missing" / "replica.db"
+    monkeypatch.setattr(db, "DB_READ_URLS", [f"sqlite:///{missing}", f"sqlite:///{replica_paths[1]}"])
+    assert served_by(2) == ["replica2.db", "replica2.db"]
+
+    monkeypatch.setattr(db, "DB_READ_URLS", [f"sqlite:///{missing}"])
+    monkeypatch.setattr(db, "_read_engines", None)
+    assert served_by(1) == ["test.db"]
+
+
+def test_commit_pins_reads_to_primary_during_window(replica_paths, monkeypatch):
+    monkeypatch.setattr(db, "DB_READ_AFTER_WRITE_WINDOW", 60)
+    write_to_primary()
+    assert served_by(2) == ["test.db", "test.db"]
+
+    # Pasada la ventana las lecturas vuelven a las réplicas
+    monkeypatch.setattr(db, "_last_write_at", db._last_write_at - 61)
+    assert served_by(1) == ["replica1.db"]
+
+
+def test_zero_window_tolerates_replication_lag(replica_paths, monkeypatch):
+    monkeypatch.setattr(db, "DB_READ_AFTER_WRITE_WINDOW", 0)
+    write_to_primary()
+    assert served_by(1) == ["replica1.db"]
+
+
+def test_writes_without_record_writes_do_not_pin_reads(replica_paths, monkeypatch):
+    monkeypatch.setattr(db, "DB_READ_AFTER_WRITE_WINDOW", 60)
+    write_to_primary(record_writes=False)
+    assert served_by(2) == ["replica1.db", "replica2.db"]
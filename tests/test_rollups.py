@@ -0,0 +1,131 @@
+# tests/test_rollups.py
+
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, select
+
+import config.db as db
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.monthly_rollup import donation_monthly_rollup, food_monthly_rollup
+from models.user import users
+from utils.rollups import backfill_rollups, full_months_between, load_food_totals
+
+DONOR_ID = 1
+CHARITY_ID = 2
+
+# Donaciones justo en los bordes de los meses (la cantidad identifica a cada una)
+EDGE_DONATIONS = [
+    datetime(2023, 12, 31, 23, 59),
+    datetime(2024, 1, 1),
+    datetime(2024, 1, 15, 12),
+    datetime(2024, 1, 31, 23, 59),
+    datetime(2024, 2, 1),
+    datetime(2024, 2, 29, 18),
+    datetime(2024, 3, 1),
+    datetime(2024, 3, 10),
+    datetime(2024, 3, 31, 23, 59),
+    datetime(2024, 4, 1),
+]
+
+
+def add_donations(engine, rows: list):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": DONOR_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert(), [
+            {
+                "donation_id": donation_id, "donor_id": DONOR_ID, "receiver_id": CHARITY_ID,
+                "description": f"Donación {donation_id}", "status": donation_status, "created_at": created_at,
+            }
+            for donation_id, (created_at, donation_status) in enumerate(rows, start=1)
+        ])
+        conn.execute(donated_foods.insert(), [
+            {
+                "donation_id": donation_id, "category": "arroz", "quantity": 2 ** donation_id,
+                "unit_of_measure": "kilogramos", "expiration_date": date(2024, 6, 1),
+            }
+            for donation_id in range(1, len(rows) + 1)
+        ])
+        backfill_rollups(conn)
+
+
+def raw_food_totals(engine, start_date: date, end_date: date) -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(donated_foods.c.category, donated_foods.c.unit_of_measure, func.sum(donated_foods.c.quantity))
+            .select_from(donated_foods.join(donations, donated_foods.c.donation_id == donations.c.donation_id))
+            .where(donations.c.created_at.between(start_date, end_date))
+            .group_by(donated_foods.c.category, donated_foods.c.unit_of_measure)
+        ).fetchall()
+    return {(row[0], row[1]): row[2] for row in rows}
+
+
+def food_totals(start_date: date, end_date: date) -> dict:
+    async def load():
+        async with db.db_connection() as conn:
+            return await load_food_totals(conn, start_date, end_date)
+
+    return dict(asyncio.run(load()))
+
+
+@pytest.mark.parametrize("start_date, end_date, expected", [
+    (date(2024, 1, 1), date(2024, 3, 31), (date(2024, 1, 1), date(2024, 3, 1))),
+    (date(2024, 1, 15), date(2024, 3, 10), (date(2024, 2, 1), date(2024, 3, 1))),
+    (date(2023, 12, 2), date(2024, 1, 1), None),  # Solo el primer día de enero, sin su horario
+    (date(2024, 1, 15), date(2024, 2, 10), None),
+    (date(2024, 2, 1), date(2024, 2, 29), None),
+    (date(2024, 3, 10), date(2024, 1, 1), None),
+])
+def test_full_months_between(start_date, end_date, expected):
+    assert full_months_between(start_date, end_date) == expected
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    (date(2024, 1, 1), date(2024, 3, 31)),  # Meses completos y el último día sin su horario
+    (date(2024, 1, 15), date(2024, 3, 10)),  # Extremos parciales en los dos lados
+    (date(2023, 12, 31), date(2024, 4, 1)),  # Un día suelto antes y después
+    (date(2024, 1, 15), date(2024, 2, 10)),  # Sin meses completos
+    (date(2024, 2, 1), date(2024, 2, 29)),
+    (date(2024, 1, 31), date(2024, 2, 1)),
+])
+def test_food_totals_match_a_raw_between_at_month_edges(engine, start_date, end_date):
+    add_donations(engine, [(created_at, "pendiente") for created_at in EDGE_DONATIONS])
+
+    assert food_totals(start_date, end_date) == raw_food_totals(engine, start_date, end_date)
+
+
+def rollup_rows(conn) -> dict:
+    return {
+        "donations": sorted(tuple(row) for row in conn.execute(select(donation_monthly_rollup)) if row[2]),
+        "foods": sorted(tuple(row) for row in conn.execute(select(food_monthly_rollup)) if row[3]),
+    }
+
+
+def test_donations_without_status_or_date_are_still_counted(engine, client):
+    add_donations(engine, [
+        (datetime(2024, 1, 10), "pendiente"),
+        (datetime(2024, 1, 20), None),
+        (None, "pendiente"),
+    ])
+
+    response = client.get("/monthly_donations")
+    assert response.status_code == 200
+    assert response.json()["data"] == [
+        {"month": None, "total_donations": 1},
+        {"month": "2024-01", "total_donations": 2},
+    ]
+
+    # Cambiar el estado de la donación sin estado mueve su conteo sin perderlo
+    response = client.put("/update_donation_status/2", json={"status": "entregada"})
+    assert response.status_code == 200
+    with engine.begin() as conn:
+        maintained = rollup_rows(conn)
+        backfill_rollups(conn)
+        assert maintained == rollup_rows(conn)
+    assert client.get("/monthly_donations").json()["data"][1] == {"month": "2024-01", "total_donations": 2}
@@ -0,0 +1,112 @@
+# tests/test_route_indexes.py
+
+import re
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event, inspect
+
+from models.chat_message import chat_messages
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.donation_chat import donation_chats
+from models.user import users
+
+# Rutas cuyas consultas deben resolverse con índices (ver los índices de models/)
+ROUTE_URLS = [
+    "/get_my_donations/1",
+    "/get_my_donations/1?limit=5",
+    "/get_received_donations/2",
+    "/get_received_donations/2?limit=5",
+    "/get_donation_chat/?donation_id=1",
+    "/get_donation_chat/?donation_chat_id=1",
+    "/get_donation_chat_messages/1",
+    "/get_donation_chat_messages/1?limit=5",
+    "/get_donation_chat_messages/1?after=3&limit=5",
+    "/get_donation_chat_messages/1?before=8&limit=5",
+    "/get_user_related_chats/1",
+    "/get_user_inbox/2",
+    "/food_donations_report?start_date=2024-01-15&end_date=2024-03-10",
+    "/delete_user/1",
+]
+
+# Una línea "SCAN <tabla>" sin "USING ... INDEX" es un recorrido completo de la tabla
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def add_rows(engine):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": 1, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": 2, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+        conn.execute(donations.insert(), [
+            {
+                "donation_id": donation_id,
+                "donor_id": 1,
+                "receiver_id": 2,
+                "description": f"Donación {donation_id}",
+                "status": "pendiente",
+                "created_at": datetime(2024, 1 + donation_id % 3, 1 + donation_id),
+            }
+            for donation_id in range(1, 11)
+        ])
+        conn.execute(donated_foods.insert(), [
+            {
+                "donation_id": donation_id,
+                "category": "arroz",
+                "quantity": 2,
+                "unit_of_measure": "kilogramos",
+                "expiration_date": date(2024, 6, 1),
+            }
+            for donation_id in range(1, 11)
+        ])
+        conn.execute(donation_chats.insert(), [
+            {"donation_chat_id": 1, "donation_id": 1, "creator_id": 1, "created_at": datetime(2024, 1, 2)},
+        ])
+        conn.execute(chat_messages.insert(), [
+            {
+                "donation_chat_id": 1,
+                "sender_id": 1 + message % 2,
+                "receiver_id": 2 - message % 2,
+                "message_value": f"Mensaje {message}",
+                "sent_time": datetime(2024, 1, 2, 10, message),
+                "is_read": False,
+            }
+            for message in range(10)
+        ])
+
+
+def full_scans(conn, statement: str, parameters) -> list:
+    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in plan if FULL_SCAN.match(row[-1])]
+
+
+@pytest.mark.parametrize("url", ROUTE_URLS)
+def test_route_queries_use_indexes(engine, client, url):
+    add_rows(engine)
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            executed.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.delete(url) if url.startswith("/delete_user") else client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.text
+    assert executed
+
+    with engine.connect() as conn:
+        for statement, parameters in executed:
+            assert full_scans(conn, statement, parameters) == [], statement
+
+
+def test_migrations_create_the_model_indexes(engine):
+    inspector = inspect(engine)
+    for table in (donations, donated_foods, donation_chats, chat_messages):
+        migrated = {index["name"]: index["column_names"] for index in inspector.get_indexes(table.name)}
+        declared = {index.name: [column.name for column in index.columns] for index in table.indexes}
+        assert migrated == declared, table.name
@@ -0,0 +1,134 @@
+# tests/test_statistics_cache.py
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+import utils.statistics_cache as statistics_cache_module
+from models.donation import donations
+from models.user import users
+from utils.statistics_cache import AGGREGATE_KEYS, DONATIONS_KEY, StatisticsCache
+
+DONOR_ID = 1
+CHARITY_ID = 2
+BUCKET = ("pendiente", "restaurant", "2024-01")
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """
+    Caché de estadísticas vacía y propia de la prueba.
+    """
+    cache = StatisticsCache(ttl=60)
+    monkeypatch.setattr(statistics_cache_module, "statistics_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def donor(engine):
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {"user_id": DONOR_ID, "name": "Restaurante", "email": "donor@example.com", "role": "restaurant"},
+            {"user_id": CHARITY_ID, "name": "Fundación", "email": "charity@example.com", "role": "charity"},
+        ])
+
+
+def donation_row(status: str = "pendiente") -> dict:
+    return {"donor_id": DONOR_ID, "status": status, "created_at": datetime(2024, 1, 15)}
+
+
+def new_donation(description: str = "Pan del día") -> dict:
+    return {"donor_id": DONOR_ID, "receiver_id": CHARITY_ID, "description": description, "donated_foods": []}
+
+
+def status_counts(client) -> dict:
+    response = client.get("/donation_status_distribution")
+    assert response.status_code == 200
+    return {item["status"]: item["count"] for item in response.json()["data"]}
+
+
+def test_invalidate_discards_computations_of_uncached_keys(cache):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return defaultdict(int, {"antes del borrado": 1})
+
+        tasks = [asyncio.create_task(cache.get_or_compute(key, compute)) for key in AGGREGATE_KEYS]
+        await asyncio.sleep(0)  # Los tres cálculos quedan en curso, sin nada en caché
+        cache.invalidate()
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert all(cache.get(key) is None for key in AGGREGATE_KEYS)
+
+
+def test_created_donation_is_not_counted_twice_after_a_recompute(cache, monkeypatch):
+    cache.set(DONATIONS_KEY, defaultdict(int, {BUCKET: 1}))
+
+    async def get_user_roles(conn, user_ids):
+        # Un recálculo que ya incluye la donación termina mientras se consultan los roles
+        cache.set(DONATIONS_KEY, defaultdict(int, {BUCKET: 2}))
+        return {DONOR_ID: "restaurant"}
+
+    monkeypatch.setattr(statistics_cache_module, "get_user_roles", get_user_roles)
+    asyncio.run(statistics_cache_module.record_donation_created(None, donation_row(), []))
+
+    assert cache.get(DONATIONS_KEY)[BUCKET] == 2
+
+
+def test_status_change_discards_a_computation_started_before_it(cache, monkeypatch):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return defaultdict(int, {BUCKET: 1})
+
+        task = asyncio.create_task(cache.get_or_compute(DONATIONS_KEY, compute))
+        await asyncio.sleep(0)
+        await statistics_cache_module.record_donation_status_changed(None, donation_row(), "entregada")
+        release.set()
+        await task
+
+    asyncio.run(scenario())
+    assert cache.get(DONATIONS_KEY) is None
+
+
+def test_cached_statistics_follow_created_and_updated_donations(engine, client, cache, donor, queries):
+    assert status_counts(client) == {}
+
+    response = client.post("/create_donation", json=new_donation())
+    assert response.status_code == 200
+    donation_id = response.json()["donation_id"]
+
+    queries.clear()
+    assert status_counts(client) == {"pendiente": 1}
+    assert queries == []  # Se actualizó la caché, no se volvió a calcular
+
+    response = client.put(f"/update_donation_status/{donation_id}", json={"status": "entregada"})
+    assert response.status_code == 200
+    assert status_counts(client) == {"entregada": 1}
+
+
+def test_cache_update_failure_does_not_fail_the_saved_donation(engine, client, cache, donor, monkeypatch):
+    assert status_counts(client) == {}
+
+    async def get_user_roles(conn, user_ids):
+        raise OperationalError("SELECT role FROM users", {}, Exception("conexión perdida"))
+
+    monkeypatch.setattr(statistics_cache_module, "get_user_roles", get_user_roles)
+    response = client.post("/create_donation", json=new_donation())
+
+    assert response.status_code == 200
+    with engine.connect() as conn:
+        assert conn.execute(select(donations.c.donation_id)).fetchall() == [(response.json()["donation_id"],)]
+    # La caché se invalidó: la siguiente lectura recalcula e incluye la donación
+    assert cache.get(DONATIONS_KEY) is None
+    assert status_counts(client) == {"pendiente": 1}
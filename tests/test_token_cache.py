@@ -0,0 +1,110 @@
+# tests/test_token_cache.py
+
+import base64
+import hashlib
+import json
+import types
+from datetime import timedelta
+
+import jwt
+import pytest
+
+import utils.auth as auth_module
+from utils.auth import ALGORITHM, SECRET_KEY, TokenCache, create_access_token, decode_token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(auth_module, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    """
+    Caché de tokens vacía y propia de la prueba.
+    """
+    cache = TokenCache(max_size=10, ttl=300)
+    monkeypatch.setattr(auth_module, "token_cache", cache)
+    return cache
+
+
+def cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def test_entries_expire_with_the_token(clock):
+    cache = TokenCache(max_size=10, ttl=300)
+    cache.set(b"con_exp", {"user_id": 1, "exp": clock.now + 10})
+    cache.set(b"sin_exp", {"user_id": 2})
+
+    clock.now += 9
+    assert cache.get(b"con_exp") == {"user_id": 1, "exp": clock.now + 1}
+
+    clock.now += 1  # Vence justo en `exp`, aunque falte para el ttl
+    assert cache.get(b"con_exp") is None
+    assert cache.get(b"sin_exp") == {"user_id": 2}
+
+    clock.now += 290  # Sin `exp` solo dura `ttl` segundos
+    assert cache.get(b"sin_exp") is None
+    assert len(cache._entries) == 0
+
+
+def test_least_recently_used_token_is_evicted_first(clock):
+    cache = TokenCache(max_size=2, ttl=300)
+    cache.set(b"a", {"user_id": 1})
+    cache.set(b"b", {"user_id": 2})
+    cache.get(b"a")  # "a" pasa a ser el más reciente
+
+    cache.set(b"c", {"user_id": 3})
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == {"user_id": 1}
+    assert cache.get(b"c") == {"user_id": 3}
+
+
+def test_verified_token_is_served_from_the_cache(token_cache, monkeypatch):
+    token = create_access_token({"sub": "user@example.com", "user_id": 1}, timedelta(minutes=5))
+    claims = decode_token(token)
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("se volvió a verificar la firma")
+
+    monkeypatch.setattr(auth_module.jwt, "decode", fail_decode)
+    assert decode_token(token) == claims
+
+
+def test_tampered_token_is_rejected_even_if_the_original_is_cached(token_cache):
+    token = create_access_token({"sub": "user@example.com", "user_id": 1}, timedelta(minutes=5))
+    decode_token(token)
+
+    # Mismo encabezado y firma, con otro user_id en los claims
+    header, payload, signature = token.split(".")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    claims["user_id"] = 2
+    forged_payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    forged = f"{header}.{forged_payload}.{signature}"
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        decode_token(forged)
+    assert token_cache.get(cache_key(forged)) is None
+
+
+def test_expired_token_is_rejected_even_if_it_is_cached(token_cache):
+    token = create_access_token({"sub": "user@example.com", "user_id": 1}, timedelta(seconds=-10))
+    # Una entrada que quedó en caché de cuando el token aún era válido
+    stale_claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    token_cache.set(cache_key(token), stale_claims)
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        decode_token(token)
+    assert token_cache.get(cache_key(token)) is None
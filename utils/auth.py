@@ -0,0 +1,126 @@
+# utils/auth.py
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+SECRET_KEY = os.getenv("SECRET_KEY", "fsdfsdfsdfsdfs")
+ALGORITHM = "HS256"
+
+# Caché de tokens ya verificados (se puede ajustar con variables de entorno)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))  # Tokens en caché por worker
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))  # Máximo para tokens sin `exp`
+
+
+# Crear un token JWT
+def create_access_token(data: dict, expires_delta: timedelta = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+        to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+class TokenCache:
+    """
+    Caché LRU de tokens con firma ya verificada, indexada por el hash del token.
+    Cada entrada vence junto con el token (`exp`), así un token expirado nunca
+    se acepta desde la caché.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # hash del token -> (vence_en, claims)
+
+    def get(self, key: bytes) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: bytes, claims: dict):
+        # Los tokens sin `exp` solo se guardan durante `ttl` segundos
+        expires_at = claims.get("exp", time.time() + self.ttl)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)  # Sacar el token usado hace más tiempo
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Validar el token solo con sus claims (firma y vencimiento), sin consultar la base de
+    datos. Los tokens ya verificados se resuelven desde la caché con un hash SHA-256.
+    Lanza jwt.ExpiredSignatureError o jwt.InvalidTokenError si el token no es válido.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(key, claims)
+    return claims
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> dict:
+    """
+    Dependencia de FastAPI para rutas protegidas: devuelve los claims del token
+    `Authorization: Bearer <token>` (`sub`, `user_id`, `role`).
+    """
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token no proporcionado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        return decode_token(credentials.credentials)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def require_role(*roles: str):
+    """
+    Dependencia que además exige que el rol del token sea uno de `roles`.
+    Uso: `claims: dict = Depends(require_role("restaurant"))`.
+    """
+    async def check_role(claims: dict = Depends(get_current_user)) -> dict:
+        if claims.get("role") not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tiene permisos para realizar esta acción"
+            )
+        return claims
+
+    return check_role
@@ -0,0 +1,166 @@
+# utils/broadcast.py
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Dependencia opcional: solo se necesita con BROADCAST_URL=redis://...
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Backend de difusión de mensajes entre workers: "memory://" (un solo proceso)
+# o "redis://host:6379/0" (varios procesos y nodos)
+BROADCAST_URL = os.getenv("BROADCAST_URL", "memory://")
+# Espera máxima (segundos) entre reintentos de reconexión con Redis
+BROADCAST_RECONNECT_MAX_BACKOFF = float(os.getenv("BROADCAST_RECONNECT_MAX_BACKOFF", "30"))
+
+
+class InMemoryBroadcast:
+    """
+    Backend local: los mensajes publicados solo llegan a los suscriptores del mismo proceso.
+    """
+
+    def __init__(self):
+        self._handler = None
+        self._subscriptions = defaultdict(int)
+
+    def set_handler(self, handler):
+        # `handler(channel, message)` recibe cada mensaje publicado en un canal suscrito
+        self._handler = handler
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        self._subscriptions.clear()
+
+    async def subscribe(self, channel: str):
+        self._subscriptions[channel] += 1
+
+    async def unsubscribe(self, channel: str):
+        self._subscriptions[channel] -= 1
+        if self._subscriptions[channel] <= 0:
+            del self._subscriptions[channel]
+
+    async def publish(self, channel: str, message: str):
+        if channel in self._subscriptions and self._handler:
+            await self._handler(channel, message)
+
+
+class RedisBroadcast:
+    """
+    Backend con pub/sub de Redis (o cualquier servidor compatible con el protocolo):
+    cada worker se suscribe a los canales de los chats que tiene abiertos y recibe
+    los mensajes publicados por cualquier otro worker o nodo.
+    """
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("BROADCAST_URL usa Redis pero el paquete `redis` no está instalado")
+        self.url = url
+        self._handler = None
+        self._client = None
+        self._pubsub = None
+        self._reader_task = None
+        self._subscriptions = defaultdict(int)
+        self._lock = asyncio.Lock()
+
+    def set_handler(self, handler):
+        self._handler = handler
+
+    async def connect(self):
+        self._client = aioredis.from_url(self.url)
+        await self._open_pubsub()
+        self._reader_task = asyncio.create_task(self._read_messages())
+
+    async def _open_pubsub(self):
+        # Canal de control para que el lector tenga siempre una suscripción activa,
+        # más los canales de los chats abiertos en este worker (al reconectar)
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe("broadcast:control", *self._subscriptions)
+        self._pubsub = pubsub
+
+    async def _reconnect(self):
+        async with self._lock:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass  # La conexión anterior ya estaba caída
+            await self._open_pubsub()
+
+    async def disconnect(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._client:
+            await self._client.aclose()
+        self._subscriptions.clear()
+
+    async def subscribe(self, channel: str):
+        async with self._lock:
+            self._subscriptions[channel] += 1
+            if self._subscriptions[channel] == 1:
+                await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str):
+        async with self._lock:
+            self._subscriptions[channel] -= 1
+            if self._subscriptions[channel] <= 0:
+                del self._subscriptions[channel]
+                await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, message: str):
+        await self._client.publish(channel, message)
+
+    async def _read_messages(self):
+        # Si se cae la conexión con Redis se vuelve a suscribir a todos los canales
+        # con espera exponencial; mientras tanto este worker no recibe mensajes de los demás
+        backoff = 0.5
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "message" or not self._handler:
+                        continue
+                    channel = message["channel"].decode()
+                    data = message["data"].decode()
+                    try:
+                        await self._handler(channel, data)
+                    except Exception as e:  # Un error al entregar no debe detener al lector
+                        logger.error("Error al entregar el mensaje del canal %s: %s", channel, e)
+                logger.error("La suscripción de difusión con Redis terminó, se reconecta en %.1f s", backoff)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Se perdió la conexión de difusión con Redis, se reconecta en %.1f s: %s", backoff, e)
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, BROADCAST_RECONNECT_MAX_BACKOFF)
+            try:
+                await self._reconnect()
+                logger.info("Difusión con Redis reconectada (%s canales)", len(self._subscriptions))
+                backoff = 0.5
+            except Exception as e:
+                logger.error("No se pudo reconectar la difusión con Redis: %s", e)
+
+
+def create_broadcast(url: str):
+    """
+    Crear el backend de difusión según el esquema de la URL.
+    """
+    if url.startswith("memory://"):
+        return InMemoryBroadcast()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroadcast(url)
+    raise ValueError(f"Backend de difusión no soportado: {url}")
+
+
+broadcast = create_broadcast(BROADCAST_URL)
@@ -0,0 +1,197 @@
+# utils/chat_message_writer.py
+
+import asyncio
+import logging
+import os
+
+from collections import defaultdict
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+
+from config.db import db_connection
+from models.chat_message import chat_messages
+
+logger = logging.getLogger(__name__)
+
+# Configuración del guardado diferido de mensajes (se puede ajustar con variables de entorno)
+CHAT_FLUSH_SIZE = int(os.getenv("CHAT_FLUSH_SIZE", "200"))  # Mensajes que disparan un guardado inmediato
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "0.5"))  # Segundos máximos entre guardados
+CHAT_FLUSH_MAX_BACKOFF = float(os.getenv("CHAT_FLUSH_MAX_BACKOFF", "30"))  # Espera máxima entre reintentos
+CHAT_SHUTDOWN_FLUSH_ATTEMPTS = int(os.getenv("CHAT_SHUTDOWN_FLUSH_ATTEMPTS", "5"))
+
+
+def is_transient_error(error: SQLAlchemyError) -> bool:
+    """
+    Errores de conexión o de disponibilidad de la base de datos, que vale la pena reintentar.
+    """
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+def saved_message_ids_query(client_ids_by_chat: dict):
+    """
+    message_id de los mensajes guardados con los `client_message_id` dados
+    ({donation_chat_id: {client_message_id, ...}}), usando el índice único por chat.
+    """
+    return select(
+        chat_messages.c.donation_chat_id, chat_messages.c.client_message_id, chat_messages.c.message_id
+    ).where(or_(*(
+        and_(chat_messages.c.donation_chat_id == donation_chat_id, chat_messages.c.client_message_id.in_(ids))
+        for donation_chat_id, ids in client_ids_by_chat.items()
+    )))
+
+
+class ChatMessageWriter:
+    """
+    Acumula los mensajes del chat y los guarda en lotes con un INSERT de varias filas,
+    al alcanzar `flush_size` mensajes o cada `flush_interval` segundos. Si la base de
+    datos no está disponible, los mensajes se conservan y se reintenta con espera
+    exponencial; los mensajes con datos inválidos se descartan sin detener al resto.
+    Al apagar el worker se guarda todo lo pendiente. Tras cada guardado llama al
+    handler con los message_id asignados a cada `client_message_id`.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._handler = None
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def set_handler(self, handler):
+        # `handler(donation_chat_id, [(client_message_id, message_id), ...])` se llama por cada chat guardado
+        self._handler = handler
+
+    def add(self, message_data: dict):
+        """
+        Encolar un mensaje para guardarlo en el próximo lote (no bloquea).
+        """
+        self._pending.append(message_data)
+        if len(self._pending) >= self.flush_size:
+            self._wakeup.set()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self):
+        """
+        Guardar los mensajes pendientes en una sola transacción; si falla, vuelven a la cola.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            try:
+                async with db_connection(record_writes=False) as conn:
+                    await conn.execute(chat_messages.insert(), rows)
+                    await conn.commit()
+            except SQLAlchemyError as e:
+                if is_transient_error(e):
+                    # Conservar el orden: los mensajes fallidos van antes que los nuevos
+                    self._pending = rows + self._pending
+                    raise
+                # Alguna fila es inválida: se guardan una por una para no bloquear el lote
+                await self._insert_one_by_one(rows)
+            except Exception:
+                self._pending = rows + self._pending
+                raise
+            await self._acknowledge(rows)
+
+    async def _acknowledge(self, rows: list):
+        """
+        Buscar con una sola consulta los message_id de las filas guardadas (por su
+        `client_message_id`) y pasarlos al handler, agrupados por chat.
+        """
+        client_ids = defaultdict(set)
+        for row in rows:
+            if row.get("client_message_id"):
+                client_ids[row["donation_chat_id"]].add(row["client_message_id"])
+        if not client_ids or not self._handler:
+            return
+
+        try:
+            async with db_connection(record_writes=False) as conn:
+                saved = (await conn.execute(saved_message_ids_query(client_ids))).fetchall()
+        except SQLAlchemyError as e:
+            # Los mensajes ya están guardados: los clientes obtienen su message_id por REST o al reconectar
+            logger.warning("No se pudieron obtener los message_id de los mensajes guardados: %s", e)
+            return
+
+        acknowledged = defaultdict(list)
+        for row in sorted(saved, key=lambda row: row.message_id):
+            acknowledged[row.donation_chat_id].append((row.client_message_id, row.message_id))
+        for donation_chat_id, message_ids in acknowledged.items():
+            try:
+                await self._handler(donation_chat_id, message_ids)
+            except Exception as e:
+                logger.error("Error al difundir los message_id del chat %s: %s", donation_chat_id, e)
+
+    async def _insert_one_by_one(self, rows: list):
+        for index, row in enumerate(rows):
+            try:
+                async with db_connection(record_writes=False) as conn:
+                    await conn.execute(chat_messages.insert(), row)
+                    await conn.commit()
+            except SQLAlchemyError as e:
+                if is_transient_error(e):
+                    self._pending = rows[index:] + self._pending
+                    raise
+                logger.error(
+                    "Mensaje del chat descartado por datos inválidos: %s",
+                    e,
+                    extra={"donation_chat_id": row.get("donation_chat_id"), "sender_id": row.get("sender_id")},
+                )
+
+    async def start(self):
+        if self._task is None:
+            # El Event queda ligado al event loop que lo espera: uno nuevo por cada arranque
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Detener la tarea de fondo y guardar lo pendiente, con varios intentos.
+        """
+        if self._task is not None:
+            # Pedir a la tarea que termine en vez de cancelarla: cancelada a mitad de un
+            # guardado se perderían las filas que ya salieron de la cola
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        for attempt in range(1, CHAT_SHUTDOWN_FLUSH_ATTEMPTS + 1):
+            try:
+                await self.flush()
+                return
+            except SQLAlchemyError as e:
+                logger.warning("Error al guardar los mensajes pendientes al apagar (intento %s): %s", attempt, e)
+                await asyncio.sleep(min(2 ** attempt, CHAT_FLUSH_MAX_BACKOFF))
+        logger.error("No se pudieron guardar %s mensajes pendientes del chat", len(self._pending))
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break  # stop() guarda lo pendiente con sus propios reintentos
+
+            try:
+                await self.flush()
+                backoff = self.flush_interval
+            except SQLAlchemyError as e:
+                logger.warning("Error al guardar un lote de mensajes del chat, se reintentará: %s", e)
+                backoff = min(max(backoff * 2, 1), CHAT_FLUSH_MAX_BACKOFF)
+
+
+chat_message_writer = ChatMessageWriter(CHAT_FLUSH_SIZE, CHAT_FLUSH_INTERVAL)
@@ -0,0 +1,95 @@
+# utils/export.py
+
+import csv
+import io
+import json
+from decimal import Decimal
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from config.db import db_read_connection, stream_partitions
+
+# Formatos de exportación disponibles en los reportes
+EXPORT_FORMATS = ("json", "csv", "ndjson")
+FormatParam = Query("json", alias="format", description="Formato de salida: json, csv o ndjson")
+
+# Filas leídas de la base de datos por cada bloque enviado al cliente
+EXPORT_CHUNK_SIZE = 1000
+
+
+def json_default(value):
+    # SUM() de MySQL devuelve Decimal; las fechas se envían en formato ISO
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def validate_export_format(export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato no soportado: {export_format}. Use json, csv o ndjson"
+        )
+
+
+def streaming_export(query, params: dict, columns: list, export_format: str, filename: str, transform=None):
+    """
+    Devolver un StreamingResponse que recorre la consulta con un cursor del lado del
+    servidor y envía cada bloque de filas en CSV o NDJSON en cuanto se lee. Usa su propia
+    conexión de lectura (réplica si hay) porque el cuerpo se genera después de que
+    termina la función de la ruta.
+    """
+    async def generate():
+        async with db_read_connection() as conn:
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+                yield buffer.getvalue()
+
+            async for partition in stream_partitions(conn, query, params, EXPORT_CHUNK_SIZE):
+                rows = [transform(row) if transform else dict(zip(columns, row)) for row in partition]
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerows([[row[column] for column in columns] for row in rows])
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(row, default=json_default) + "\n" for row in rows)
+
+    return export_response(generate(), export_format, filename)
+
+
+def rows_export(rows: list, columns: list, export_format: str, filename: str):
+    """
+    Exportar en CSV o NDJSON filas ya calculadas (por ejemplo, un reporte agregado).
+    """
+    async def generate():
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            writer.writerows([[row[column] for column in columns] for row in rows])
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(row, default=json_default) + "\n" for row in rows)
+
+    return export_response(generate(), export_format, filename)
+
+
+def export_response(body, export_format: str, filename: str):
+    if export_format == "csv":
+        media_type = "text/csv"
+        extension = "csv"
+    else:
+        media_type = "application/x-ndjson"
+        extension = "ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+    )
@@ -0,0 +1,183 @@
+# utils/metrics.py
+
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Encabezado Server-Timing en cada respuesta (se puede desactivar en producción)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Consultas más lentas que este umbral (en segundos) se reportan con su SQL
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.5"))
+
+# Clave del scope ASGI con la etiqueta de ruta de una petición respondida antes de llegar
+# al router (p. ej. un 429 del límite de solicitudes, que usa la ruta de su regla)
+ROUTE_LABEL_KEY = "metrics_route"
+
+# Límites de los buckets de los histogramas (segundos y cantidad de consultas)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """
+    Consultas de la petición en curso: cantidad, tiempo total en la base de datos
+    y la sentencia más lenta.
+    """
+
+    __slots__ = ("queries", "db_time", "slowest_time", "slowest_statement")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement: str, duration: float):
+        self.queries += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def snapshot(self) -> "RequestStats":
+        copy = RequestStats()
+        copy.queries, copy.db_time = self.queries, self.db_time
+        copy.slowest_time, copy.slowest_statement = self.slowest_time, self.slowest_statement
+        return copy
+
+
+# Estadísticas de la petición actual; el threadpool y los greenlets de SQLAlchemy copian el
+# contexto, así que las consultas hechas en otro hilo se suman a la misma petición
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if duration >= SLOW_QUERY_THRESHOLD:
+        # Solo el SQL con marcadores de posición, sin los parámetros (pueden tener datos personales)
+        logger.warning("Consulta lenta (%.1f ms): %s", duration * 1000, " ".join(statement.split())[:500])
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Métricas por ruta de este worker, en formato de texto de Prometheus.
+    """
+
+    def __init__(self):
+        self.request_duration = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_duration = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.responses = defaultdict(int)
+
+    def observe(self, method: str, route: str, status_code: int, duration: float, stats: RequestStats):
+        labels = (method, route)
+        self.request_duration[labels].observe(duration)
+        self.db_duration[labels].observe(stats.db_time)
+        self.db_queries[labels].observe(stats.queries)
+        self.responses[(method, route, str(status_code))] += 1
+
+    def render(self) -> str:
+        lines = []
+        self._render_histogram(lines, "http_request_duration_seconds", "Latencia total por ruta", self.request_duration)
+        self._render_histogram(lines, "db_query_duration_seconds", "Tiempo en la base de datos por petición", self.db_duration)
+        self._render_histogram(lines, "db_queries_per_request", "Consultas SQL por petición", self.db_queries)
+        lines.append("# HELP http_responses_total Respuestas por ruta y código de estado")
+        lines.append("# TYPE http_responses_total counter")
+        for (method, route, status_code), count in sorted(self.responses.items()):
+            lines.append(f'http_responses_total{{method="{method}",route="{route}",status="{status_code}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(lines: list, name: str, help_text: str, histograms: dict):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (method, route), histogram in sorted(histograms.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+metrics_registry = MetricsRegistry()
+
+
+class TimingMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP (latencia, consultas y tiempo en la
+    base de datos), agrega el encabezado `Server-Timing` y alimenta /metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        # Fin de la respuesta: las BackgroundTasks corren después y no cuentan como latencia
+        end = None
+        measured = stats
+
+        async def send_with_timing(message):
+            nonlocal status_code, end, measured
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    total = (time.perf_counter() - start) * 1000
+                    server_timing = (
+                        f'app;dur={total:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} consultas", '
+                        f"db-slowest;dur={stats.slowest_time * 1000:.1f}"
+                    )
+                    message.setdefault("headers", []).append((b"server-timing", server_timing.encode("latin-1")))
+            elif message["type"] == "http.response.body" and not message.get("more_body", False) and end is None:
+                end = time.perf_counter()
+                measured = stats.snapshot()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request_stats.reset(token)
+            # Se usa la plantilla de la ruta (no la URL) para no crear una serie por cada ID
+            route = getattr(scope.get("route"), "path", None) or scope.get(ROUTE_LABEL_KEY, "sin_ruta")
+            duration = (end if end is not None else time.perf_counter()) - start
+            metrics_registry.observe(scope["method"], route, status_code, duration, measured)
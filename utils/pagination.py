@@ -0,0 +1,86 @@
+# utils/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import and_, or_
+
+# Tamaño máximo de página permitido en los endpoints paginados
+MAX_PAGE_SIZE = 500
+
+# Parámetros opcionales comunes: si `limit` no se envía, el endpoint responde como antes
+LimitParam = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Cantidad máxima de elementos por página")
+CursorParam = Query(None, description="Cursor opaco devuelto como `next_cursor` en la página anterior")
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Codificar los valores de la clave de ordenamiento de la última fila en un cursor opaco.
+    """
+    payload = [{"dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: Optional[int] = None) -> list:
+    """
+    Decodificar un cursor generado por `encode_cursor` (opcionalmente validando su tamaño).
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values = [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        ) from e
+
+    if size is not None and len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+    return values
+
+
+def keyset_condition(columns: list, values: list):
+    """
+    Construir la condición `(a > x) OR (a = x AND b > y) ...` que selecciona las filas
+    posteriores al cursor; así cada página usa el índice en lugar de un OFFSET.
+    """
+    conditions = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        conditions.append(and_(*equal_prefix, column > values[i]))
+    return or_(*conditions)
+
+
+def paginate_query(query, columns: list, limit: Optional[int], cursor: Optional[str]):
+    """
+    Aplicar orden, cursor y límite (se pide una fila extra para saber si hay otra página).
+    Sin `limit` ni `cursor` la consulta se devuelve sin cambios.
+    """
+    if not limit and not cursor:
+        return query
+    query = query.order_by(*columns)
+    if cursor:
+        query = query.where(keyset_condition(columns, decode_cursor(cursor, len(columns))))
+    if limit:
+        query = query.limit(limit + 1)
+    return query
+
+
+def split_page(rows: list, limit: Optional[int], keys: list):
+    """
+    Recortar la fila extra y calcular `next_cursor` a partir de la última fila de la página.
+    """
+    if not limit or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last_row = page[-1]._mapping
+    return page, encode_cursor([last_row[key] for key in keys])
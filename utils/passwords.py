@@ -0,0 +1,56 @@
+# utils/passwords.py
+
+import asyncio
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Costo de bcrypt (2^rounds iteraciones) y tamaño del pool dedicado a los hashes
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Los hashes con menos rondas que BCRYPT_ROUNDS se marcan para volver a calcularse al iniciar sesión
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt libera el GIL: un pool de hilos acotado calcula los hashes en paralelo sin
+# bloquear el event loop ni acaparar el threadpool que usan las consultas
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+async def run_in_password_executor(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, function, *args)
+
+
+async def hash_password(password: str) -> str:
+    """
+    Calcular el hash bcrypt de una contraseña fuera del event loop.
+    """
+    return await run_in_password_executor(pwd_context.hash, password)
+
+
+def _verify_and_update(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if not stored:
+        return False, None
+    if pwd_context.identify(stored) is None:
+        # Fila antigua con la contraseña en texto plano: se valida y se convierte a hash
+        if hmac.compare_digest(password.encode(), stored.encode()):
+            return True, pwd_context.hash(password)
+        return False, None
+    return pwd_context.verify_and_update(password, stored)
+
+
+async def verify_password(password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verificar una contraseña contra lo guardado en `users.password` fuera del event loop.
+    Devuelve (válida, hash nuevo): el hash nuevo no es None cuando la fila guardaba texto
+    plano o un hash con menos rondas, y debe guardarse en lugar del anterior.
+    """
+    return await run_in_password_executor(_verify_and_update, password, stored)
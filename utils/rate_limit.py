@@ -0,0 +1,214 @@
+# utils/rate_limit.py
+
+import logging
+import math
+import os
+import time
+
+from fastapi.responses import JSONResponse
+
+from utils.auth import decode_token
+from utils.metrics import ROUTE_LABEL_KEY
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Dependencia opcional: solo se necesita con RATE_LIMIT_URL=redis://...
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Backend de los contadores: "memory://" (por worker) o "redis://host:6379/0" (compartido)
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "memory://")
+
+# Presupuestos por ruta como "ruta=solicitudes/segundos", separados por comas. Cada cliente
+# (usuario del token o IP) tiene su propio balde de fichas por ruta.
+RATE_LIMIT_RULES = os.getenv(
+    "RATE_LIMIT_RULES",
+    "/generate_token=10/60,/create_user=5/60,/create_donation=10/60,/create_donations_bulk=5/60,"
+    "/create_chat_message=30/10,/mark_messages_read=60/10",
+)
+# Tomar la IP del cliente de X-Forwarded-For (solo detrás de un proxy de confianza)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+
+def parse_budget(budget: str):
+    """
+    Convertir "solicitudes/segundos" en (fichas por segundo, capacidad del balde).
+    """
+    requests, seconds = budget.split("/")
+    return int(requests) / float(seconds), int(requests)
+
+
+def parse_rules(rules: str) -> dict:
+    parsed = {}
+    for rule in rules.split(","):
+        if rule.strip():
+            path, budget = rule.strip().split("=")
+            parsed[path] = parse_budget(budget)
+    return parsed
+
+
+class InMemoryRateLimiter:
+    """
+    Baldes de fichas en memoria: cada clave se recarga a `rate` fichas por segundo
+    hasta `burst`, y cada solicitud consume una.
+    """
+
+    SWEEP_EVERY = 1000  # Solicitudes entre limpiezas de baldes llenos (equivalen a no tener balde)
+
+    def __init__(self):
+        self._buckets = {}  # clave -> (fichas, instante de la última recarga, segundos hasta llenarse)
+        self._hits = 0
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        self._buckets.clear()
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        """
+        Consumir una ficha; devuelve 0 si se permite o los segundos a esperar si no.
+        """
+        now = time.monotonic()
+        tokens, last, _ = self._buckets.get(key, (burst, now, 0))
+        tokens = min(burst, tokens + (now - last) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now, (burst - tokens) / rate)
+
+        self._hits += 1
+        if self._hits % self.SWEEP_EVERY == 0:
+            self._buckets = {
+                bucket_key: bucket for bucket_key, bucket in self._buckets.items() if bucket[1] + bucket[2] > now
+            }
+        return retry_after
+
+
+# Balde de fichas atómico en Redis; usa la hora del servidor para que todos los workers coincidan
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+local tokens = tonumber(bucket[1]) or burst
+local last = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - last) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'last', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimiter:
+    """
+    Baldes de fichas compartidos entre workers y nodos. Si Redis no responde, se
+    permite la solicitud (mejor no limitar que rechazar a todos).
+    """
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_URL usa Redis pero el paquete `redis` no está instalado")
+        self.url = url
+        self._client = None
+        self._script = None
+
+    async def connect(self):
+        self._client = aioredis.from_url(self.url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def disconnect(self):
+        if self._client:
+            await self._client.aclose()
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        try:
+            return float(await self._script(keys=[f"rate_limit:{key}"], args=[rate, burst]))
+        except Exception as e:
+            logger.warning("Error al consultar el límite de solicitudes en Redis: %s", e)
+            return 0.0
+
+
+def create_rate_limiter(url: str):
+    """
+    Crear el backend de límites según el esquema de la URL.
+    """
+    if url.startswith("memory://"):
+        return InMemoryRateLimiter()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisRateLimiter(url)
+    raise ValueError(f"Backend de límites no soportado: {url}")
+
+
+rate_limiter = create_rate_limiter(RATE_LIMIT_URL)
+
+
+def client_identity(scope) -> str:
+    """
+    Identificar al cliente de una solicitud HTTP o websocket: el usuario del token
+    Bearer si es válido (sin consultar la base de datos) o, si no, su IP.
+    """
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization.lower().startswith("bearer "):
+        try:
+            claims = decode_token(authorization[7:].strip())
+            if claims.get("user_id") is not None:
+                return f"user:{claims['user_id']}"
+        except Exception:
+            pass  # Token inválido: se limita por IP
+    if RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'desconocido'}"
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que aplica los presupuestos de RATE_LIMIT_RULES a las rutas HTTP
+    y responde 429 con `Retry-After` cuando un cliente los agota.
+    """
+
+    def __init__(self, app, rules: str = RATE_LIMIT_RULES):
+        self.app = app
+        self.rules = parse_rules(rules)
+
+    def match_rule(self, path: str):
+        for rule_path, budget in self.rules.items():
+            if path == rule_path or path.startswith(rule_path + "/"):
+                return rule_path, budget
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.match_rule(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule_path, (rate, burst) = rule
+        retry_after = await rate_limiter.hit(f"{rule_path}:{client_identity(scope)}", rate, burst)
+        if retry_after > 0:
+            scope[ROUTE_LABEL_KEY] = rule_path  # El router no llega a asignar la ruta
+            response = JSONResponse(
+                {"detail": "Demasiadas solicitudes, intente de nuevo más tarde"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
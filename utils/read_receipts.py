@@ -0,0 +1,154 @@
+# utils/read_receipts.py
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+
+from sqlalchemy import bindparam, false
+from sqlalchemy.exc import SQLAlchemyError
+
+from config.db import db_connection
+from models.chat_message import chat_messages
+from utils.chat_message_writer import is_transient_error, saved_message_ids_query
+
+logger = logging.getLogger(__name__)
+
+# Segundos durante los que se acumulan las confirmaciones de lectura antes de guardarlas
+READ_RECEIPT_FLUSH_INTERVAL = float(os.getenv("READ_RECEIPT_FLUSH_INTERVAL", "1"))
+# Intervalos que se espera a que se guarde un mensaje confirmado por su client_message_id
+READ_RECEIPT_RESOLVE_ATTEMPTS = int(os.getenv("READ_RECEIPT_RESOLVE_ATTEMPTS", "5"))
+
+# Marca como leídos todos los mensajes de un chat hasta `up_to` para un receptor:
+# una sola sentencia (executemany) para todas las confirmaciones del intervalo
+mark_read_statement = (
+    chat_messages.update()
+    .where(
+        chat_messages.c.donation_chat_id == bindparam("chat_id"),
+        chat_messages.c.receiver_id == bindparam("reader_id"),
+        chat_messages.c.message_id <= bindparam("up_to"),
+        chat_messages.c.is_read == false(),
+    )
+    .values(is_read=True)
+)
+
+
+class ReadReceiptBuffer:
+    """
+    Acumula las confirmaciones de lectura y guarda solo el último message_id leído
+    por cada (chat, receptor) con un UPDATE por rango. Tras guardarlas llama al
+    handler con los cursores de lectura para difundirlos a los clientes del chat.
+    Las confirmaciones de mensajes que aún no tienen message_id (recibidos en vivo)
+    usan su `client_message_id` y se resuelven al guardarse el mensaje.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending = {}  # (donation_chat_id, reader_id) -> message_id máximo leído
+        self._unresolved = {}  # (donation_chat_id, reader_id, client_message_id) -> intentos restantes
+        self._handler = None
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def set_handler(self, handler):
+        # `handler(donation_chat_id, reader_id, message_id)` se llama por cada cursor guardado
+        self._handler = handler
+
+    def add(self, donation_chat_id: int, reader_id: int, message_id: int):
+        """
+        Registrar que `reader_id` leyó el chat hasta `message_id` (no bloquea).
+        """
+        key = (donation_chat_id, reader_id)
+        if message_id > self._pending.get(key, 0):
+            self._pending[key] = message_id
+
+    def add_client_message(self, donation_chat_id: int, reader_id: int, client_message_id: str):
+        """
+        Registrar que `reader_id` leyó el chat hasta el mensaje `client_message_id`,
+        cuyo message_id se busca en el próximo guardado (no bloquea).
+        """
+        self._unresolved.setdefault((donation_chat_id, reader_id, client_message_id), READ_RECEIPT_RESOLVE_ATTEMPTS)
+
+    async def _resolve_client_messages(self):
+        # Convertir en cursores las confirmaciones por client_message_id con una sola consulta;
+        # las de mensajes que siguen en el guardado diferido se reintentan en el próximo intervalo
+        if not self._unresolved:
+            return
+        unresolved, self._unresolved = self._unresolved, {}
+        client_ids = defaultdict(set)
+        for donation_chat_id, _, client_message_id in unresolved:
+            client_ids[donation_chat_id].add(client_message_id)
+        try:
+            async with db_connection(record_writes=False) as conn:
+                rows = (await conn.execute(saved_message_ids_query(client_ids))).fetchall()
+        except SQLAlchemyError:
+            for key, attempts in unresolved.items():
+                self._unresolved.setdefault(key, attempts)
+            raise
+
+        saved = {(row.donation_chat_id, row.client_message_id): row.message_id for row in rows}
+        for (donation_chat_id, reader_id, client_message_id), attempts in unresolved.items():
+            message_id = saved.get((donation_chat_id, client_message_id))
+            if message_id is not None:
+                self.add(donation_chat_id, reader_id, message_id)
+            elif attempts > 1:
+                self._unresolved.setdefault((donation_chat_id, reader_id, client_message_id), attempts - 1)
+            else:
+                logger.warning(
+                    "Confirmación de lectura descartada: el mensaje no se guardó",
+                    extra={"donation_chat_id": donation_chat_id, "client_message_id": client_message_id},
+                )
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._resolve_client_messages()
+            if not self._pending:
+                return
+            cursors, self._pending = self._pending, {}
+            try:
+                async with db_connection(record_writes=False) as conn:
+                    await conn.execute(mark_read_statement, [
+                        {"chat_id": chat_id, "reader_id": reader_id, "up_to": message_id}
+                        for (chat_id, reader_id), message_id in sorted(cursors.items())
+                    ])
+                    await conn.commit()
+            except SQLAlchemyError as e:
+                if is_transient_error(e):
+                    # Volver a la cola sin retroceder cursores que hayan avanzado mientras tanto
+                    for key, message_id in cursors.items():
+                        self._pending[key] = max(message_id, self._pending.get(key, 0))
+                raise
+
+        if self._handler:
+            for (chat_id, reader_id), message_id in cursors.items():
+                await self._handler(chat_id, reader_id, message_id)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except SQLAlchemyError as e:
+            logger.error("No se pudieron guardar las confirmaciones de lectura pendientes: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except SQLAlchemyError as e:
+                logger.warning("Error al guardar las confirmaciones de lectura: %s", e)
+            except Exception as e:  # Un error al difundir no debe detener el worker
+                logger.error("Error al difundir los cursores de lectura: %s", e)
+
+
+read_receipt_buffer = ReadReceiptBuffer(READ_RECEIPT_FLUSH_INTERVAL)
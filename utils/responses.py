@@ -0,0 +1,33 @@
+# utils/responses.py
+
+from typing import Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from utils.export import json_default
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    Respuesta JSON serializada con orjson (fechas, UUID y listas en C); los Decimal
+    de MySQL se convierten con el mismo criterio que en las exportaciones.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def rows_response(rows, columns: Optional[list] = None, paginated: bool = False, next_cursor: Optional[str] = None):
+    """
+    Serializar filas de SQLAlchemy directamente a bytes, sin pasar por `jsonable_encoder`.
+    `columns` permite elegir y ordenar las columnas; por defecto se usan todas las de la consulta.
+    """
+    if columns:
+        data = [{column: row._mapping[column] for column in columns} for row in rows]
+    else:
+        keys = list(rows[0]._fields) if rows else []
+        data = [dict(zip(keys, row)) for row in rows]
+    if paginated:
+        return FastJSONResponse({"data": data, "next_cursor": next_cursor})
+    return FastJSONResponse(data)
@@ -0,0 +1,253 @@
+# utils/rollups.py
+
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import String, func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from models.donated_food import donated_foods
+from models.donation import donations
+from models.monthly_rollup import donation_monthly_rollup, food_monthly_rollup
+
+# INSERT con "upsert" de cada motor soportado (MariaDB usa el dialecto mysql)
+UPSERT_INSERTS = {
+    "mysql": mysql.insert,
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+# Las claves de los resúmenes no admiten NULL: las donaciones sin fecha o sin estado se
+# cuentan bajo una cadena vacía (como antes en /monthly_donations, que las incluía)
+MISSING_KEY = ""
+
+
+def rollup_month(created_at) -> str:
+    return created_at.strftime("%Y-%m") if created_at else MISSING_KEY
+
+
+def rollup_status(donation_status) -> str:
+    return donation_status if donation_status is not None else MISSING_KEY
+
+
+def rollup_month_column():
+    # Mes de `donations.created_at` en SQL, con la misma clave que rollup_month
+    return func.coalesce(year_month(donations.c.created_at), MISSING_KEY)
+
+
+def rollup_status_column():
+    return func.coalesce(donations.c.status, MISSING_KEY)
+
+
+class year_month(FunctionElement):
+    """
+    Mes "YYYY-MM" de una columna de fecha, con la función de cada motor.
+    """
+
+    type = String()
+    name = "year_month"
+    inherit_cache = True
+
+
+@compiles(year_month)
+def _year_month_mysql(element, compiler, **kw):
+    return compiler.process(func.date_format(*element.clauses, "%Y-%m"), **kw)
+
+
+@compiles(year_month, "sqlite")
+def _year_month_sqlite(element, compiler, **kw):
+    return compiler.process(func.strftime("%Y-%m", *element.clauses), **kw)
+
+
+@compiles(year_month, "postgresql")
+def _year_month_postgresql(element, compiler, **kw):
+    return compiler.process(func.to_char(*element.clauses, "YYYY-MM"), **kw)
+
+
+def next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def full_months_between(start_date: date, end_date: date):
+    """
+    Meses completos dentro de `created_at BETWEEN start_date AND end_date`, como
+    (primer día del primer mes, primer día del mes siguiente al último), o None.
+    """
+    first = start_date if start_date.day == 1 else next_month(start_date)
+    end = end_date.replace(day=1)
+    if first >= end:
+        return None
+    return first, end
+
+
+async def apply_rollup_deltas(conn, table, key_columns: list, value_column: str, deltas: dict):
+    """
+    Sumar `deltas` ({clave: cantidad}) a las filas del resumen con un solo upsert (executemany).
+    Las claves se ordenan para que transacciones concurrentes bloqueen las filas en el mismo orden.
+    """
+    rows = [
+        {**dict(zip(key_columns, key)), value_column: delta}
+        for key, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+
+    statement = UPSERT_INSERTS[conn.dialect.name](table)
+    if conn.dialect.name == "mysql":
+        statement = statement.on_duplicate_key_update(
+            {value_column: table.c[value_column] + statement.inserted[value_column]}
+        )
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={value_column: table.c[value_column] + statement.excluded[value_column]},
+        )
+    await conn.execute(statement, rows)
+
+
+async def apply_donation_deltas(conn, deltas: dict):
+    # deltas: {(month, status): cantidad de donaciones}
+    await apply_rollup_deltas(conn, donation_monthly_rollup, ["month", "status"], "donations_count", deltas)
+
+
+async def apply_food_deltas(conn, deltas: dict):
+    # deltas: {(month, category, unit_of_measure): cantidad de alimento}
+    await apply_rollup_deltas(
+        conn, food_monthly_rollup, ["month", "category", "unit_of_measure"], "total_quantity", deltas
+    )
+
+
+async def add_donations_to_rollups(conn, donations_with_foods: list):
+    """
+    Sumar a los resúmenes mensuales las donaciones nuevas, dadas como pares
+    (fila de la donación, filas de sus alimentos). Se llama antes del commit.
+    """
+    donation_deltas = defaultdict(int)
+    food_deltas = defaultdict(int)
+    for donation_data, food_rows in donations_with_foods:
+        month = rollup_month(donation_data["created_at"])
+        donation_deltas[(month, rollup_status(donation_data["status"]))] += 1
+        for food in food_rows:
+            food_deltas[(month, food["category"], food["unit_of_measure"])] += food["quantity"]
+
+    await apply_donation_deltas(conn, donation_deltas)
+    await apply_food_deltas(conn, food_deltas)
+
+
+async def move_donation_in_rollups(conn, donation_data: dict, new_status: str):
+    """
+    Pasar la donación de su estado actual a `new_status` en el resumen mensual.
+    """
+    if donation_data["status"] == new_status:
+        return
+    month = rollup_month(donation_data["created_at"])
+    await apply_donation_deltas(
+        conn, {(month, rollup_status(donation_data["status"])): -1, (month, rollup_status(new_status)): 1}
+    )
+
+
+async def remove_donations_from_rollups(conn, donation_ids):
+    """
+    Restar de los resúmenes las donaciones de `donation_ids` (lista o subconsulta) y sus
+    alimentos. Se llama antes de borrarlas, dentro de la misma transacción.
+    """
+    month = rollup_month_column()
+    donation_status = rollup_status_column()
+    donation_rows = (await conn.execute(
+        select(month, donation_status, func.count(donations.c.donation_id))
+        .where(donations.c.donation_id.in_(donation_ids))
+        .group_by(month, donation_status)
+    )).fetchall()
+    food_rows = (await conn.execute(
+        select(month, donated_foods.c.category, donated_foods.c.unit_of_measure, func.sum(donated_foods.c.quantity))
+        .select_from(donated_foods.join(donations, donated_foods.c.donation_id == donations.c.donation_id))
+        .where(donations.c.donation_id.in_(donation_ids))
+        .group_by(month, donated_foods.c.category, donated_foods.c.unit_of_measure)
+    )).fetchall()
+
+    await apply_donation_deltas(conn, {(row[0], row[1]): -row[2] for row in donation_rows})
+    await apply_food_deltas(conn, {(row[0], row[1], row[2]): -int(row[3] or 0) for row in food_rows})
+
+
+def backfill_rollups(conn):
+    """
+    Reconstruir los resúmenes mensuales desde las tablas de origen (conexión síncrona,
+    usada por la migración y por `python -m migrations backfill-rollups`).
+    """
+    month = rollup_month_column()
+    donation_status = rollup_status_column()
+    conn.execute(donation_monthly_rollup.delete())
+    conn.execute(food_monthly_rollup.delete())
+    conn.execute(
+        donation_monthly_rollup.insert().from_select(
+            ["month", "status", "donations_count"],
+            select(month, donation_status, func.count(donations.c.donation_id))
+            .group_by(month, donation_status),
+        )
+    )
+    conn.execute(
+        food_monthly_rollup.insert().from_select(
+            ["month", "category", "unit_of_measure", "total_quantity"],
+            select(month, donated_foods.c.category, donated_foods.c.unit_of_measure, func.sum(donated_foods.c.quantity))
+            .select_from(donated_foods.join(donations, donated_foods.c.donation_id == donations.c.donation_id))
+            .group_by(month, donated_foods.c.category, donated_foods.c.unit_of_measure),
+        )
+    )
+
+
+async def load_monthly_donations(conn) -> list:
+    """
+    Donaciones por mes leídas del resumen (unas pocas filas por mes, no todo el historial).
+    Las donaciones sin fecha van primero con mes None, como en MySQL.
+    """
+    total = func.sum(donation_monthly_rollup.c.donations_count)
+    query = (
+        select(donation_monthly_rollup.c.month, total)
+        .group_by(donation_monthly_rollup.c.month)
+        .having(total > 0)
+        .order_by(donation_monthly_rollup.c.month)
+    )
+    return [(row[0] or None, int(row[1])) for row in (await conn.execute(query)).fetchall()]
+
+
+async def load_food_totals(conn, start_date: date, end_date: date) -> dict:
+    """
+    Cantidad de alimentos por (categoría, unidad) para `created_at BETWEEN start_date AND end_date`:
+    los meses completos se leen del resumen y solo los extremos parciales de las tablas de origen.
+    """
+    totals = defaultdict(int)
+
+    async def add_raw(*conditions):
+        query = (
+            select(donated_foods.c.category, donated_foods.c.unit_of_measure, func.sum(donated_foods.c.quantity))
+            .select_from(donated_foods.join(donations, donated_foods.c.donation_id == donations.c.donation_id))
+            .where(*conditions)
+            .group_by(donated_foods.c.category, donated_foods.c.unit_of_measure)
+        )
+        for row in (await conn.execute(query)).fetchall():
+            totals[(row[0], row[1])] += int(row[2] or 0)
+
+    full_months = full_months_between(start_date, end_date)
+    if full_months is None:
+        await add_raw(donations.c.created_at.between(start_date, end_date))
+        return totals
+
+    first, end = full_months
+    rollup_query = (
+        select(food_monthly_rollup.c.category, food_monthly_rollup.c.unit_of_measure, func.sum(food_monthly_rollup.c.total_quantity))
+        .where(food_monthly_rollup.c.month >= rollup_month(first), food_monthly_rollup.c.month < rollup_month(end))
+        .group_by(food_monthly_rollup.c.category, food_monthly_rollup.c.unit_of_measure)
+        .having(func.sum(food_monthly_rollup.c.total_quantity) > 0)
+    )
+    for row in (await conn.execute(rollup_query)).fetchall():
+        totals[(row[0], row[1])] += int(row[2] or 0)
+
+    if start_date < first:
+        await add_raw(donations.c.created_at >= start_date, donations.c.created_at < first)
+    await add_raw(donations.c.created_at >= end, donations.c.created_at <= end_date)
+    return totals
+
@@ -0,0 +1,273 @@
+# utils/statistics_cache.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from config.db import db_read_connection
+from models.donation import donations
+from models.donated_food import donated_foods
+from models.user import users
+from utils.rollups import year_month
+
+# Segundos que un agregado permanece en caché; acota lo desactualizado que puede
+# quedar un worker frente a escrituras hechas por otros procesos
+STATISTICS_CACHE_TTL = float(os.getenv("STATISTICS_CACHE_TTL", "60"))
+
+# Claves de los agregados base a partir de los cuales se calculan todas las estadísticas
+DONATIONS_KEY = "donations"  # {(status, rol del donante, "YYYY-MM"): cantidad}
+FOODS_KEY = "foods"  # {(category, unit_of_measure): cantidad total}
+USERS_KEY = "users"  # {role: cantidad}
+AGGREGATE_KEYS = (DONATIONS_KEY, FOODS_KEY, USERS_KEY)
+
+logger = logging.getLogger(__name__)
+
+
+class StatisticsCache:
+    """
+    Caché en memoria con TTL para los agregados de estadísticas. Las escrituras
+    pueden actualizar un agregado en caché de forma incremental o invalidarlo.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}  # clave -> (expira_en, valor)
+        self._generations = defaultdict(int)  # cambia en cada escritura sobre la clave
+        self._locks = defaultdict(asyncio.Lock)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def begin_update(self, key):
+        """
+        Registrar una escritura sobre la clave y devolver el agregado en caché (o None).
+        Los cálculos que ya estaban en curso no guardarán su resultado.
+        """
+        self._generations[key] += 1
+        return self.get(key)
+
+    def apply_update(self, key, cached, apply):
+        """
+        Aplicar `apply(cached)` solo si `cached` sigue siendo el agregado en caché. Si se
+        recalculó después de `begin_update`, el nuevo valor ya incluye la escritura.
+        """
+        if cached is not None and self.get(key) is cached:
+            apply(cached)
+
+    def update(self, key, apply):
+        """
+        Aplicar `apply(valor)` al agregado si está en caché; si no, la próxima lectura lo recalcula.
+        """
+        self.apply_update(key, self.begin_update(key), apply)
+
+    def invalidate(self, *keys):
+        # Sin claves se invalidan todos los agregados, estén o no en caché, para que un
+        # cálculo en curso tampoco guarde su resultado
+        for key in keys or AGGREGATE_KEYS:
+            self._generations[key] += 1
+            self._entries.pop(key, None)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Devolver el agregado en caché o calcularlo con `compute()` (una sola vez
+        aunque lleguen varias peticiones simultáneas).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async with self._locks[key]:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            generation = self._generations[key]
+            value = await compute()
+            # Si hubo una escritura mientras se calculaba, no se guarda un valor desactualizado
+            if generation == self._generations[key]:
+                self.set(key, value)
+            return value
+
+
+statistics_cache = StatisticsCache(STATISTICS_CACHE_TTL)
+
+
+def donation_month(created_at) -> str:
+    return created_at.strftime("%Y-%m") if created_at else None
+
+
+async def load_donation_buckets(conn) -> dict:
+    """
+    Contar las donaciones por estado, rol del donante y mes en un solo recorrido.
+    """
+    month = year_month(donations.c.created_at)
+    query = (
+        select(donations.c.status, users.c.role, month.label("month"), func.count(donations.c.donation_id))
+        .select_from(donations.outerjoin(users, donations.c.donor_id == users.c.user_id))
+        .group_by(donations.c.status, users.c.role, month)
+    )
+    result = (await conn.execute(query)).fetchall()
+    return defaultdict(int, {(row[0], row[1], row[2]): row[3] for row in result})
+
+
+async def load_food_buckets(conn) -> dict:
+    """
+    Sumar las cantidades de alimentos donados por categoría y unidad de medida.
+    """
+    query = select(
+        donated_foods.c.category,
+        donated_foods.c.unit_of_measure,
+        func.sum(donated_foods.c.quantity),
+    ).group_by(donated_foods.c.category, donated_foods.c.unit_of_measure)
+    result = (await conn.execute(query)).fetchall()
+    return defaultdict(int, {(row[0], row[1]): int(row[2] or 0) for row in result})
+
+
+async def load_user_buckets(conn) -> dict:
+    """
+    Contar los usuarios registrados por rol.
+    """
+    query = select(users.c.role, func.count(users.c.user_id)).group_by(users.c.role)
+    result = (await conn.execute(query)).fetchall()
+    return defaultdict(int, {row[0]: row[1] for row in result})
+
+
+async def get_donation_buckets(conn) -> dict:
+    return await statistics_cache.get_or_compute(DONATIONS_KEY, lambda: load_donation_buckets(conn))
+
+
+async def get_food_buckets(conn) -> dict:
+    return await statistics_cache.get_or_compute(FOODS_KEY, lambda: load_food_buckets(conn))
+
+
+async def get_user_buckets(conn) -> dict:
+    return await statistics_cache.get_or_compute(USERS_KEY, lambda: load_user_buckets(conn))
+
+
+# Funciones de carga de cada agregado base
+AGGREGATE_LOADERS = {
+    DONATIONS_KEY: load_donation_buckets,
+    FOODS_KEY: load_food_buckets,
+    USERS_KEY: load_user_buckets,
+}
+
+
+async def get_aggregate_with_own_connection(key: str) -> dict:
+    """
+    Obtener un agregado usando una conexión propia, para poder cargar varios en paralelo.
+    """
+    async def compute():
+        async with db_read_connection() as conn:
+            return await AGGREGATE_LOADERS[key](conn)
+
+    return await statistics_cache.get_or_compute(key, compute)
+
+
+async def get_user_role(conn, user_id: int):
+    result = (await conn.execute(select(users.c.role).where(users.c.user_id == user_id))).fetchone()
+    return result.role if result else None
+
+
+async def get_user_roles(conn, user_ids) -> dict:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    query = select(users.c.user_id, users.c.role).where(users.c.user_id.in_(user_ids))
+    return {row.user_id: row.role for row in (await conn.execute(query)).fetchall()}
+
+
+async def record_donations_created(conn, donations_data: list, foods: list):
+    """
+    Actualizar los agregados en caché tras confirmar una o varias donaciones nuevas
+    (los roles de los donantes se consultan todos juntos).
+    """
+    cached = statistics_cache.begin_update(DONATIONS_KEY)
+    donor_roles = None
+    if cached is not None:
+        try:
+            donor_roles = await get_user_roles(conn, [donation_data["donor_id"] for donation_data in donations_data])
+        except SQLAlchemyError as e:
+            logger.warning("No se pudo actualizar la caché de estadísticas, se invalida: %s", e)
+
+    if donor_roles is None:
+        statistics_cache.invalidate(DONATIONS_KEY)
+    else:
+        new_buckets = [
+            (
+                donation_data["status"],
+                donor_roles.get(donation_data["donor_id"]),
+                donation_month(donation_data["created_at"]),
+            )
+            for donation_data in donations_data
+        ]
+
+        def add_donations(buckets):
+            for bucket in new_buckets:
+                buckets[bucket] += 1
+
+        statistics_cache.apply_update(DONATIONS_KEY, cached, add_donations)
+
+    def add_foods(buckets):
+        for food in foods:
+            buckets[(food["category"], food["unit_of_measure"])] += food["quantity"]
+
+    statistics_cache.update(FOODS_KEY, add_foods)
+
+
+async def record_donation_created(conn, donation_data: dict, foods: list):
+    """
+    Actualizar los agregados en caché tras confirmar una nueva donación.
+    """
+    await record_donations_created(conn, [donation_data], foods)
+
+
+async def record_donation_status_changed(conn, donation_data: dict, new_status: str):
+    """
+    Mover la donación al nuevo estado en los agregados en caché tras confirmar el cambio.
+    """
+    cached = statistics_cache.begin_update(DONATIONS_KEY)
+    if cached is None:
+        statistics_cache.invalidate(DONATIONS_KEY)
+        return
+
+    try:
+        donor_role = await get_user_role(conn, donation_data["donor_id"])
+    except SQLAlchemyError as e:
+        logger.warning("No se pudo actualizar la caché de estadísticas, se invalida: %s", e)
+        statistics_cache.invalidate(DONATIONS_KEY)
+        return
+    month = donation_month(donation_data["created_at"])
+
+    def move_donation(buckets):
+        buckets[(donation_data["status"], donor_role, month)] -= 1
+        buckets[(new_status, donor_role, month)] += 1
+
+    statistics_cache.apply_update(DONATIONS_KEY, cached, move_donation)
+
+
+def record_user_created(role: str):
+    """
+    Sumar el nuevo usuario a los agregados en caché tras confirmar su creación.
+    """
+    def add_user(buckets):
+        buckets[role] += 1
+
+    statistics_cache.update(USERS_KEY, add_user)
+
+
+def record_users_changed():
+    """
+    Invalidar los agregados que dependen de usuarios (actualizaciones y borrados en cascada).
+    """
+    statistics_cache.invalidate()